@@ -0,0 +1,82 @@
+# bench_market_standin.py
+#
+# end-to-end load test of the real binance network path (http client, signing, sockets, frames decoding)
+# against the local stand-in: one session in binance mode for a while, then latencies & throughput reported
+#   $> python -m benchmarks.bench_market_standin --duration 30 --tick-rate 50 --rest-latency 0.005
+#
+# run in its own process: the twisted reactor used by the socket manager can not be restarted
+
+import argparse
+import json
+import time
+
+from src.pp_market import TickerStreamMode
+from src.pp_session import Session, QuitMode
+from src.sockets.binance_standin import BinanceStandin
+from benchmarks.bench_session import silence, get_git_commit
+
+K_STAGES = ['tick.total', 'tick.book_fast_path', 'fill.total', 'rest.place_order', 'rest.cancel_order',
+            'rest.get_avg_price', 'rest.get_asset_balance']
+
+
+def run(duration: float,
+        tick_rate: float,
+        rest_latency: float,
+        stream_latency: float,
+        ticker_stream_mode: TickerStreamMode) -> dict:
+    standin = BinanceStandin(port=0, rest_latency=rest_latency, stream_latency=stream_latency,
+                             tick_rate=tick_rate, seed=7)
+    standin.start()
+    with silence():
+        session = Session(client_mode='binance', ticker_stream_mode=ticker_stream_mode,
+                          api_url=standin.api_url, stream_url=standin.stream_url, archive_file=':memory:')
+        time.sleep(duration)
+        ticks_sent = standin.messages_sent
+        session.loop.call(session.quit, quit_mode=QuitMode.CANCEL_ALL_PLACED)
+    standin.stop()
+    return dict(
+        git_commit=get_git_commit(),
+        params=dict(duration=duration, tick_rate=tick_rate, rest_latency=rest_latency,
+                    stream_latency=stream_latency, ticker_stream_mode=ticker_stream_mode.name.lower()),
+        stream_messages_sent=ticks_sent,
+        ticks_processed=session.ticker_count,
+        tick_intake=session.market.tick_intake.get_stats(),
+        request_weight=session.market.request_weight.get_stats(),
+        standin=standin.get_stats(),
+        stages=[s for s in session.metrics.get_summary() if s['stage'] in K_STAGES]
+    )
+
+
+def report(result: dict) -> None:
+    print(f'params: {result["params"]}')
+    print(f'stream messages sent: {result["stream_messages_sent"]:,} - ticks processed: {result["ticks_processed"]:,}')
+    print(f'tick intake: {result["tick_intake"]}')
+    print(f'request weight: {result["request_weight"]}')
+    for s in result['stages']:
+        print(f'{s["stage"]:25} {s["count"]:8,}  p50 {s["p50"]:10,.1f} us  p99 {s["p99"]:10,.1f} us  '
+              f'max {s["max"]:10,.1f} us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='market load test against the local binance stand-in')
+    parser.add_argument('--duration', type=float, default=10.0, help='secs')
+    parser.add_argument('--tick-rate', type=float, default=20.0, help='ticker messages per second')
+    parser.add_argument('--rest-latency', type=float, default=0.0, help='secs added to each REST response')
+    parser.add_argument('--stream-latency', type=float, default=0.0, help='secs added to each stream message')
+    parser.add_argument('--book-ticker', action='store_true', help='bookTicker stream instead of 24hrTicker')
+    parser.add_argument('--output', help='results json file')
+    args = parser.parse_args()
+
+    result = run(duration=args.duration,
+                 tick_rate=args.tick_rate,
+                 rest_latency=args.rest_latency,
+                 stream_latency=args.stream_latency,
+                 ticker_stream_mode=TickerStreamMode.BOOK_TICKER if args.book_ticker else TickerStreamMode.LAST_PRICE)
+    report(result=result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
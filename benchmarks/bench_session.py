@@ -0,0 +1,344 @@
+# bench_session.py
+#
+# benchmarks for the session hot paths, run offline on the simulated client
+#   $> python -m benchmarks.bench_session                  (results saved to benchmarks/results/)
+#   $> python -m benchmarks.bench_session --quick          (smaller workloads)
+#   $> python -m benchmarks.bench_session --compare old.json new.json
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from binance import enums as k_binance
+
+from src.pp_order import Order, OrderStatus
+from src.pp_session import Session
+
+K_PROJECT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+K_RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+K_BOOK_SIZES = [10, 100, 1_000, 10_000]
+K_SEED = 7
+
+# the engine must be importable without these (only dashboards and live sockets need them)
+K_HEAVY_MODULES = ['pandas', 'twisted', 'binance.client', 'dash', 'icecream', 'pyarrow']
+K_IMPORT_TIME_BUDGET = 0.150  # secs, cold import of src.pp_session in a fresh interpreter
+
+
+class BenchmarkResult:
+    def __init__(self, name: str, params: dict, ops: int, seconds: float, peak_memory_kb: float):
+        self.name = name
+        self.params = params
+        self.ops = ops
+        self.seconds = seconds
+        self.peak_memory_kb = peak_memory_kb
+
+    def get_key(self) -> str:
+        params = ','.join(f'{k}={v}' for k, v in sorted(self.params.items()))
+        return f'{self.name}[{params}]'
+
+    def to_dict(self) -> dict:
+        return dict(
+            name=self.name,
+            params=self.params,
+            ops=self.ops,
+            seconds=self.seconds,
+            ops_per_sec=self.ops / self.seconds if self.seconds > 0 else 0.0,
+            us_per_op=self.seconds / self.ops * 1e6 if self.ops else 0.0,
+            peak_memory_kb=self.peak_memory_kb
+        )
+
+
+def measure(name: str, params: dict, setup: Callable[[], object], run: Callable[[object], int]) -> BenchmarkResult:
+    # time is measured without tracemalloc (it slows down allocations), then the same
+    # workload is repeated on a fresh setup to get the peak memory
+    with silence():
+        state = setup()
+        t0 = time.perf_counter()
+        ops = run(state)
+        seconds = time.perf_counter() - t0
+
+        state = setup()
+        tracemalloc.start()
+        run(state)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    result = BenchmarkResult(name=name, params=params, ops=ops, seconds=seconds, peak_memory_kb=peak / 1024)
+    report(result=result)
+    return result
+
+
+def report(result: BenchmarkResult) -> None:
+    d = result.to_dict()
+    print(f'{result.get_key():55} {d["ops_per_sec"]:14,.1f} ops/s  {d["us_per_op"]:12,.1f} us/op  '
+          f'{d["peak_memory_kb"]:12,.1f} KiB peak')
+
+
+@contextlib.contextmanager
+def silence():
+    # the session prints and logs a lot, which would be measured too
+    log = logging.getLogger('log')
+    previous_level = log.level
+    log.setLevel(logging.CRITICAL + 1)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            yield
+        finally:
+            log.setLevel(previous_level)
+
+
+# ********** fixtures **********
+
+def create_session() -> Session:
+    # manual fake client and inline loop: no thread is started, everything runs in this thread
+    return Session(client_mode='simulated', threaded=False, archive_file=':memory:')
+
+
+def create_far_orders(session: Session, count: int, cmp: float) -> List[Order]:
+    # orders far enough from cmp to stay in the monitor list (neither placed nor traded)
+    rnd = random.Random(K_SEED)
+    orders = []
+    for i in range(count):
+        k_side = k_binance.SIDE_BUY if i % 2 == 0 else k_binance.SIDE_SELL
+        distance = rnd.uniform(500.0, 5_000.0)
+        price = cmp - distance if k_side == k_binance.SIDE_BUY else cmp + distance
+        orders.append(Order(
+            session_id=session.session_id,
+            order_id='BENCH',
+            pt_id=f'{i // 2:05}',
+            k_side=k_side,
+            price=price,
+            amount=rnd.uniform(0.001, 0.03),
+            name='bench'
+        ))
+    return orders
+
+
+def get_random_walk(start: float, steps: int) -> List[float]:
+    rnd = random.Random(K_SEED)
+    cmps = []
+    cmp = start
+    for _ in range(steps):
+        cmp += rnd.choice([-20, -10, -5, 0, 5, 10, 20])
+        cmps.append(cmp)
+    return cmps
+
+
+# ********** benchmarks **********
+
+def bench_ticks(book_size: int, ticks: int) -> BenchmarkResult:
+    def setup():
+        session = create_session()
+        cmp = session.market.client.cmp
+        for order in create_far_orders(session=session, count=book_size, cmp=cmp):
+            session.pob.add_order(order)
+        return session, get_random_walk(start=cmp, steps=ticks)
+
+    def run(state) -> int:
+        session, cmps = state
+        client = session.market.client
+        for cmp in cmps:
+            # same path as a generator tick: fills check in the fake client, then the ticker message
+            client.cmp = cmp
+            client._process_cmp_change()
+        return len(cmps)
+
+    return measure(name='session_ticks', params=dict(book_size=book_size), setup=setup, run=run)
+
+
+def bench_fills(book_size: int) -> BenchmarkResult:
+    def setup():
+        session = create_session()
+        cmp = session.market.client.cmp
+        orders = create_far_orders(session=session, count=book_size, cmp=cmp)
+        for order in orders:
+            session.pob.add_order(order)
+            session.pob.place_order(order)
+            order.set_status(OrderStatus.PLACED)
+        return session, orders
+
+    def run(state) -> int:
+        session, orders = state
+        for order in orders:
+            session.loop.call(session.order_traded_callback, order.uid, order.price, 0.0001)
+        return len(orders)
+
+    return measure(name='session_fills', params=dict(book_size=book_size), setup=setup, run=run)
+
+
+def bench_concentrate_orders(book_size: int, repeat: int) -> BenchmarkResult:
+    def setup():
+        session = create_session()
+        cmp = session.market.client.cmp
+        for order in create_far_orders(session=session, count=book_size, cmp=cmp):
+            session.pob.add_order(order)
+        return session, cmp
+
+    def run(state) -> int:
+        session, cmp = state
+        count = 0
+        for _ in range(repeat):
+            # concentrate one buy and one sell (the first ones in the monitor list)
+            buy = next(o for o in session.pob.monitor if o.k_side == k_binance.SIDE_BUY)
+            sell = next(o for o in session.pob.monitor if o.k_side == k_binance.SIDE_SELL)
+            if session.cm.concentrate_orders(orders=[buy, sell], ref_mp=cmp, ref_gap=100.0):
+                count += 1
+        return max(count, 1)
+
+    return measure(name='concentrate_orders', params=dict(book_size=book_size), setup=setup, run=run)
+
+
+def bench_split_n_order(book_size: int, repeat: int) -> BenchmarkResult:
+    def setup():
+        session = create_session()
+        cmp = session.market.client.cmp
+        for order in create_far_orders(session=session, count=book_size, cmp=cmp):
+            session.pob.add_order(order)
+        return session
+
+    def run(session) -> int:
+        for i in range(repeat):
+            session.cm.split_n_order(order=session.pob.monitor[i % 10], inter_distance=25.0, child_count=2)
+        return repeat
+
+    return measure(name='split_n_order', params=dict(book_size=book_size), setup=setup, run=run)
+
+
+def bench_snapshot(book_size: int, repeat: int) -> BenchmarkResult:
+    def setup():
+        session = create_session()
+        cmp = session.market.client.cmp
+        for order in create_far_orders(session=session, count=book_size, cmp=cmp):
+            session.pob.add_order(order)
+        return session
+
+    def run(session) -> int:
+        for _ in range(repeat):
+            # force the rebuild, as after a tick, and build the dataframe used by the tables
+            session.loop.submit(lambda: None)
+            session.get_all_orders_dataframe_with_cmp()
+        return repeat
+
+    return measure(name='dashboard_snapshot', params=dict(book_size=book_size), setup=setup, run=run)
+
+
+def bench_grid_screener(ticks: int) -> BenchmarkResult:
+    # same grid as the session ticks benchmark, simulated on arrays (one config, one path)
+    from src.pp_grid_screener import GridScreener, PricePath
+
+    def setup():
+        return PricePath(prices=get_random_walk(start=45_000.0, steps=ticks))
+
+    def run(path) -> int:
+        GridScreener(path=path).run()
+        return len(path)
+
+    return measure(name='grid_screener_ticks', params=dict(ticks=ticks), setup=setup, run=run)
+
+
+def get_import_stats(module: str) -> dict:
+    # cold import in a fresh interpreter: elapsed secs and heavy modules loaded by it
+    code = (f'import json, sys, time; t0 = time.perf_counter(); import {module}; '
+            f'elapsed = time.perf_counter() - t0; '
+            f'print(json.dumps(dict(seconds=elapsed, '
+            f'heavy=[m for m in {K_HEAVY_MODULES!r} if m in sys.modules])))')
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=K_PROJECT_FOLDER, text=True)
+    return json.loads(output.splitlines()[-1])
+
+
+def bench_import_time(module: str, repeat: int) -> BenchmarkResult:
+    # best of n (the first run may include the bytecode compilation)
+    runs = [get_import_stats(module=module) for _ in range(repeat)]
+    seconds = min(run['seconds'] for run in runs)
+    result = BenchmarkResult(name='import_time', params=dict(module=module), ops=1, seconds=seconds, peak_memory_kb=0.0)
+    report(result=result)
+    if seconds > K_IMPORT_TIME_BUDGET:
+        print(f'  import of {module} over budget: {seconds * 1_000:,.1f} ms > {K_IMPORT_TIME_BUDGET * 1_000:,.1f} ms')
+    if runs[-1]['heavy']:
+        print(f'  heavy modules imported by {module}: {runs[-1]["heavy"]}')
+    return result
+
+
+# ********** runner **********
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(quick: bool) -> List[BenchmarkResult]:
+    book_sizes = K_BOOK_SIZES[:3] if quick else K_BOOK_SIZES
+    ticks = 200 if quick else 1_000
+    results = [bench_import_time(module='src.pp_session', repeat=3 if quick else 10)]
+    for book_size in book_sizes:
+        results.append(bench_ticks(book_size=book_size, ticks=ticks))
+    for book_size in book_sizes[:3]:
+        results.append(bench_fills(book_size=book_size))
+    for book_size in book_sizes:
+        results.append(bench_concentrate_orders(book_size=book_size, repeat=20))
+        results.append(bench_split_n_order(book_size=book_size, repeat=20))
+        results.append(bench_snapshot(book_size=book_size, repeat=5))
+    results.append(bench_grid_screener(ticks=100_000 if quick else 1_000_000))
+    return results
+
+
+def save_results(results: List[BenchmarkResult], file_name: Optional[str] = None) -> str:
+    os.makedirs(K_RESULTS_FOLDER, exist_ok=True)
+    if file_name is None:
+        file_name = os.path.join(K_RESULTS_FOLDER, f'bench_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    data = dict(
+        created=datetime.now().isoformat(timespec='seconds'),
+        git_commit=get_git_commit(),
+        python=sys.version.split()[0],
+        platform=platform.platform(),
+        results=[r.to_dict() for r in results]
+    )
+    with open(file_name, 'w') as f:
+        json.dump(data, f, indent=2)
+    return file_name
+
+
+def compare(old_file: str, new_file: str) -> None:
+    def load(file_name: str) -> dict:
+        with open(file_name) as f:
+            data = json.load(f)
+        return {BenchmarkResult(r['name'], r['params'], r['ops'], r['seconds'], r['peak_memory_kb']).get_key(): r
+                for r in data['results']}
+
+    old = load(old_file)
+    new = load(new_file)
+    print(f'{"benchmark":55} {"old us/op":>12} {"new us/op":>12} {"speedup":>8} {"mem ratio":>10}')
+    for key in sorted(old.keys() & new.keys()):
+        o, n = old[key], new[key]
+        speedup = o['us_per_op'] / n['us_per_op'] if n['us_per_op'] else 0.0
+        mem_ratio = n['peak_memory_kb'] / o['peak_memory_kb'] if o['peak_memory_kb'] else 0.0
+        print(f'{key:55} {o["us_per_op"]:12,.1f} {n["us_per_op"]:12,.1f} {speedup:8.2f} {mem_ratio:10.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='session hot paths benchmarks')
+    parser.add_argument('--quick', action='store_true', help='smaller workloads (up to 1k orders)')
+    parser.add_argument('--output', help='results json file (default: benchmarks/results/bench_<date>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run_all(quick=args.quick)
+    print(f'results saved to {save_results(results=results, file_name=args.output)}')
+
+
+if __name__ == '__main__':
+    main()
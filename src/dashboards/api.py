@@ -0,0 +1,128 @@
+# api.py
+
+import gzip
+import hashlib
+import json
+import math
+import threading
+import time
+from typing import Optional
+
+from binance import enums as k_binance
+from flask import Flask, Response, jsonify, request
+
+from src.pp_session import Session, SessionSnapshot
+from src.sockets.server import get_snapshot_summary
+from src.xb_prometheus import get_exposition, K_CONTENT_TYPE
+
+K_STATE_TTL = 0.25  # secs, state body rebuilt at most once per ttl whatever the polling rate
+K_MIN_COMPRESS_SIZE = 512  # bytes
+K_COMPRESS_LEVEL = 6
+
+
+class CachedState:
+    def __init__(self, body: bytes, built_at: float):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.gzip_body = gzip.compress(body, compresslevel=K_COMPRESS_LEVEL) \
+            if len(body) >= K_MIN_COMPRESS_SIZE else None
+        self.built_at = built_at
+
+
+class StateCache:
+    """Compact session state (json) for external monitoring, shared by all the requests.
+
+    The body, its etag and compressed copy are built once per ttl, from the session snapshot and metrics.
+    """
+    def __init__(self, session: Session, ttl: float = K_STATE_TTL):
+        self.session = session
+        self.ttl = ttl
+        self._cached: Optional[CachedState] = None
+        self._lock = threading.Lock()
+        self.build_count = 0
+
+    def get(self) -> CachedState:
+        cached = self._cached
+        now = time.monotonic()
+        if cached is None or now - cached.built_at >= self.ttl:
+            with self._lock:
+                # built by another request meanwhile
+                cached = self._cached
+                if cached is None or now - cached.built_at >= self.ttl:
+                    cached = self._build(now=now)
+        return cached
+
+    def _build(self, now: float) -> CachedState:
+        state = get_state(session=self.session, snapshot=self.session.get_snapshot())
+        body = json.dumps(state, separators=(',', ':')).encode('utf-8')
+        cached = CachedState(body=body, built_at=now)
+        old = self._cached
+        if old is not None and old.etag == cached.etag:
+            # nothing changed: same entry (and time) kept, a 304 for the clients already having it
+            old.built_at = now
+            cached = old
+        self._cached = cached
+        self.build_count += 1
+        return cached
+
+
+def get_state(session: Session, snapshot: SessionSnapshot) -> dict:
+    ab = snapshot.current_ab
+    return dict(
+        session_id=session.session_id,
+        session=get_snapshot_summary(snapshot=snapshot),
+        balances=dict(
+            btc=dict(free=ab.s1.free, locked=ab.s1.locked),
+            eur=dict(free=ab.s2.free, locked=ab.s2.locked),
+            bnb=dict(free=ab.bnb.free, locked=ab.bnb.locked)
+        ),
+        pending=get_pending_summary(snapshot=snapshot),
+        metrics=session.metrics.get_summary(),
+        tick_intake=session.market.tick_intake.get_stats(),
+        # placement & request_weight, read in the session loop
+        **session.get_limit_stats()
+    )
+
+
+def get_pending_summary(snapshot: SessionSnapshot) -> dict:
+    # monitor + placed per side, from the running band aggregates (no order list traversal)
+    summary = {}
+    for k_side in [k_binance.SIDE_BUY, k_binance.SIDE_SELL]:
+        bands = [band for (side, _), band in snapshot.pending_bands.items() if side == k_side]
+        summary[k_side] = dict(
+            count=sum(len(band.orders) for band in bands),
+            amount=abs(math.fsum(x for band in bands for x in band.amount)),
+            total=abs(math.fsum(x for band in bands for x in band.total))
+        )
+    return summary
+
+
+# ********** local http endpoints (registered on the dash flask server) **********
+def register_routes(server: Flask, session: Session, state_ttl: float = K_STATE_TTL) -> None:
+    state_cache = StateCache(session=session, ttl=state_ttl)
+
+    @server.route('/api/metrics')
+    def get_metrics():
+        # p50/p99/max/mean in microseconds for each instrumented stage
+        return jsonify(
+            stages=session.metrics.get_summary(),
+            tick_intake=session.market.tick_intake.get_stats(),
+            **session.get_limit_stats()
+        )
+
+    @server.route('/metrics')
+    def get_prometheus_metrics():
+        # counters, gauges & histograms of the session registry (nothing computed from the order lists)
+        return Response(get_exposition(metrics=session.metrics), content_type=K_CONTENT_TYPE)
+
+    @server.route('/api/state')
+    def get_state_endpoint():
+        # cheap to poll: conditional requests answered with 304, body compressed once per build
+        cached = state_cache.get()
+        headers = {'ETag': f'"{cached.etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if request.if_none_match.contains(cached.etag):
+            return Response(status=304, headers=headers)
+        if cached.gzip_body is not None and request.accept_encodings['gzip']:
+            headers['Content-Encoding'] = 'gzip'
+            return Response(cached.gzip_body, mimetype='application/json', headers=headers)
+        return Response(cached.body, mimetype='application/json', headers=headers)
@@ -1,8 +1,10 @@
 # dashboard_aux.py
 
-from typing import List
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Tuple
 import pandas as pd
 import plotly.express as px
+from dash import no_update
 from plotly.graph_objects import Figure, Indicator
 from dash_daq.LEDDisplay import LEDDisplay
 from dash_table import DataTable
@@ -10,6 +12,85 @@ from dash_table.Format import Format, Scheme
 from dash_bootstrap_components import Row, Col
 from dash_html_components import P as p_text
 
+K_FIGURE_CACHE_SIZE = 32  # figures kept (a few per chart)
+
+
+# ********** figure memoization **********
+
+class FigureCache:
+    """Figures built by content key (LRU), so that an unchanged chart is never rebuilt."""
+    def __init__(self, max_size: int = K_FIGURE_CACHE_SIZE):
+        self.max_size = max_size
+        self._figures: 'OrderedDict[Hashable, Figure]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, key: tuple, build: Callable[[], Figure]) -> Figure:
+        cache_key = (name, key)
+        fig = self._figures.get(cache_key)
+        if fig is not None:
+            self._figures.move_to_end(cache_key)
+            self.hits += 1
+            return fig
+        self.misses += 1
+        fig = build()
+        self._figures[cache_key] = fig
+        if len(self._figures) > self.max_size:
+            self._figures.popitem(last=False)
+        return fig
+
+
+figure_cache = FigureCache()
+
+
+def get_figure_update(name: str, key: tuple, last_key: Optional[list], build: Callable[[], Figure]) -> (object, list):
+    # the figure, or no_update when the browser already shows it (last_key kept in a dcc.Store per browser)
+    # key: flat tuple of json values, returned as a list for the store
+    if last_key is not None and list(key) == last_key:
+        return no_update, last_key
+    return figure_cache.get(name=name, key=key, build=build), list(key)
+
+
+def get_balance_figure_update(asset: str, free: float, locked: float, y_max: float,
+                              last_key: Optional[list]) -> (object, list):
+    # rounded as displayed
+    precision = 2 if asset == 'eur' else 6
+    key = (asset, round(free, precision), round(locked, precision), y_max)
+
+    def build() -> Figure:
+        df = pd.DataFrame([
+            dict(asset=asset, amount=free, type='free'),
+            dict(asset=asset, amount=locked, type='locked'),
+        ])
+        return get_balance_bar_chart(df=df, asset=asset, y_max=y_max)
+    return get_figure_update(name='balance', key=key, last_key=last_key, build=build)
+
+
+def get_kpi_figure_update(df: pd.DataFrame, last_key: Optional[list]) -> (object, list):
+    # amounts rounded as displayed (prices not shown), nan compared as 0
+    prices = df['price'].fillna(0.0).round(0).tolist()
+    amounts = df['amount'].fillna(0.0).round(2).tolist()
+    key = tuple(x for row in zip(df['side'].tolist(), prices, amounts) for x in row)
+    return get_figure_update(name='kpi', key=key, last_key=last_key, build=lambda: get_kpi_bar_chart(df=df))
+
+
+def get_cmp_indicator_update(last_cmp: float, first_cmp: Optional[float],
+                             last_key: Optional[list]) -> (object, list):
+    key = (round(last_cmp, 2), round(first_cmp, 2) if first_cmp is not None else None)
+    return get_figure_update(name='indicator', key=key, last_key=last_key,
+                             build=lambda: get_cmp_indicator(last_cmp=last_cmp, first_cmp=first_cmp))
+
+
+def get_cmp_line_chart_update(resolution: float, times: Tuple[float, ...], closes: Tuple[float, ...],
+                              last_key: Optional[list]) -> (object, list):
+    # bars only added or the last one changed: first & last bar identify the content
+    key = (resolution, len(times), times[0], times[-1], closes[-1]) if len(times) else (resolution, 0)
+
+    def build() -> Figure:
+        df = pd.DataFrame(dict(time=pd.to_datetime(times, unit='s'), cmp=closes))
+        return get_cmp_line_chart(df=df)
+    return get_figure_update(name='line', key=key, last_key=last_key, build=build)
+
 
 # ********** dashboard app.callback functions **********
 
@@ -66,6 +147,28 @@ def get_balance_bar_chart(df: pd.DataFrame, asset: str, y_max: float) -> Figure:
     return fig
 
 
+def get_kpi_bar_chart(df: pd.DataFrame) -> Figure:
+    fig = px.bar(
+        data_frame=df,
+        x='price',
+        y='amount',
+        text='amount',
+        color='side',
+        range_y=[0, 0.5],
+        height=350,
+        color_discrete_map={'BUY': 'LightSeaGreen', 'SELL': 'LightCoral'}
+    )
+    fig.update_xaxes(visible=False)
+    fig.update_yaxes(visible=False)
+    fig.update_traces(texttemplate='%{y:,.2f}')
+    fig.update_layout(
+        showlegend=False,
+        # paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        )
+    return fig
+
+
 def get_led_display(led_id: str, led_label: str) -> Row:
     value = 0.0
     layout = Row([
@@ -116,13 +219,10 @@ def get_completed_pt_df(df: pd.DataFrame) -> pd.DataFrame:
     return df_completed_pt
 
 
-def get_cmp_indicator(cmps: List[float]) -> Figure:
-    # get last and first values
-    last_cmp = 0.0
-    first_cmp = 0.0
-    if len(cmps) > 0:
-        last_cmp = cmps[-1]
-        first_cmp = cmps[0]
+def get_cmp_indicator(last_cmp: float, first_cmp: Optional[float]) -> Figure:
+    # no tick processed yet: no change
+    if first_cmp is None:
+        first_cmp = last_cmp
     # create indicator
     fig = Figure(Indicator(
         mode="number+delta",
@@ -133,10 +233,11 @@ def get_cmp_indicator(cmps: List[float]) -> Figure:
     return fig
 
 
-def get_cmp_line_chart(df: pd.DataFrame, cmps: List[float]) -> Figure:
+def get_cmp_line_chart(df: pd.DataFrame) -> Figure:
+    # df: time & cmp (bar close)
     fig = px.line(
         df,
-        x='rate',
+        x='time',
         y='cmp',
         # dynamic y-range
         range_y=[df['cmp'].min(), df['cmp'].max()],
@@ -160,8 +261,8 @@ def get_cmp_line_chart(df: pd.DataFrame, cmps: List[float]) -> Figure:
     )
     # color green or red depending on difference between last cmp and first cmp
     diff = 0
-    if len(cmps) > 0:
-        diff = cmps[-1] - cmps[0]
+    if len(df) > 0:
+        diff = df['cmp'].iat[-1] - df['cmp'].iat[0]
     if diff > 0:
         return fig.update_traces(fill='tozeroy', line={'color': 'green'})
     else:
@@ -416,3 +517,29 @@ def get_pending_datatable(
         sort_action='native'
     )
     return datatable
+
+
+def get_metrics_datatable(table_id: str) -> DataTable:
+    # one row per instrumented stage, values in microseconds
+    columns = [{'id': 'stage', 'name': 'stage', 'type': 'text'},
+               {'id': 'count', 'name': 'count', 'type': 'numeric'}]
+    for col in ['p50', 'p99', 'max', 'mean']:
+        columns.append(
+            {'id': col, 'name': f'{col} [us]', 'type': 'numeric',
+             'format': Format(precision=1, scheme=Scheme.fixed, group=True)})
+    datatable = DataTable(
+        id=table_id,
+        columns=columns,
+        data=[],
+        page_action='none',
+        style_cell={'fontSize': 14, 'font-family': 'Arial'},
+        style_data={'border': 'none'},
+        style_header={'border': 'none', 'textAlign': 'center', 'fontWeight': 'bold'},
+        style_cell_conditional=[
+            {
+                'if': {'column_id': 'stage'},
+                'textAlign': 'left'
+            }
+        ],
+    )
+    return datatable
@@ -18,6 +18,10 @@ def get_layout(interval: float):
             html.Span(id="example-output", style={"vertical-align": "middle"}),
             html.Br(),
         ]),
+        dbc.Row([
+            dbc.Button('PROFILE 10 s', id='profile-button', color='secondary', size='sm'),
+            html.Span(id='profile-output', style={'vertical-align': 'middle', 'margin-left': '10px'}),
+        ]),
         dbc.Row([
             # ********** balance bar charts **********
             dbc.Col(
@@ -79,9 +83,19 @@ def get_layout(interval: float):
                 width={'size': 6, 'offset': 0}
             ),
         ]),
+        # ********** latency per stage (p50/p99/max) **********
         dbc.Row([
+            dbc.Col(
+                children=daux.get_metrics_datatable(table_id='metrics-table'),
+                width={'size': 6, 'offset': 0},
+            ),
         ]),
         # ********** interval **********
-        dcc.Interval(id='update', n_intervals=0, interval=1000 * interval)
+        dcc.Interval(id='update', n_intervals=0, interval=1000 * interval),
+        # ********** keys of the figures shown (memoized figures, see dashboard_aux) **********
+        dcc.Store(id='balance-keys'),
+        dcc.Store(id='kpi-key'),
+        dcc.Store(id='indicator-key'),
+        dcc.Store(id='line-key')
     ])
     return layout
@@ -6,12 +6,10 @@ import os
 import inspect
 
 from flask import request  # to stop the server
-import pandas as pd
 
 import dash
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
-import plotly.express as px
 
 # *********** to run from terminal project folder ***********
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
@@ -20,12 +18,18 @@ sys.path.insert(0, parentdir)
 # ***********************************************************
 
 from src.dashboards import dashboard_aux as daux
+from src.dashboards import api
+from src.sockets.server import ControlServer
 from src.pp_session import Session, QuitMode
+from src.pp_pending_orders_book import PendingOrdersBook
 from src.xb_logger import XBLogger
 import src.dashboards.layout as main_layout
 
 # dashboard refresh/update rate
 K_INTERVAL = 1.0
+# stacks sampled after a tick slower than this [ms], or from the profile button [secs]
+K_SLOW_TICK_MS = 50.0
+K_PROFILE_SECONDS = 10.0
 
 # K_BACKGROUND_COLOR = '#272b30'
 
@@ -33,48 +37,42 @@ XBLogger()
 log = logging.getLogger('log')
 
 # TODO: remove, here the app arguments have been forced to simplify gunicorn test
-session = Session(client_mode='simulated')  # , new_master_session=True)
+session = Session(client_mode='simulated', slow_tick_ms=K_SLOW_TICK_MS)  # , new_master_session=True)
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 server = app.server
+api.register_routes(server=server, session=session)
+
+# remote control (snapshots, metrics & commands) through the local control socket
+control_server = ControlServer(session=session)
+control_server.start()
 
 # app layout
 app.layout = main_layout.get_layout(interval=K_INTERVAL)
 
 
 # ********** app callbacks **********
+# figures memoized in dashboard_aux: no_update when the key kept in the browser store is unchanged
 @app.callback(
     Output(component_id='btc-balance-chart', component_property='figure'),
     Output(component_id='eur-balance-chart', component_property='figure'),
     Output(component_id='bnb-balance-chart', component_property='figure'),
-    Input(component_id='update', component_property='n_intervals')
+    Output(component_id='balance-keys', component_property='data'),
+    Input(component_id='update', component_property='n_intervals'),
+    State(component_id='balance-keys', component_property='data')
 )
-def update_figure(timer):
-    ab = session.bm.get_account_balance()
-    btc_free = ab.s1.free
-    btc_locked = ab.s1.locked
-    eur_free = ab.s2.free
-    eur_locked = ab.s2.locked
-    bnb_free = ab.bnb.free
-    bnb_locked = ab.bnb.locked
-
-    df_btc = pd.DataFrame([
-        dict(asset='btc', amount=btc_free, type='free'),
-        dict(asset='btc', amount=btc_locked, type='locked'),
-    ])
-    df_eur = pd.DataFrame([
-        dict(asset='eur', amount=eur_free, type='free'),
-        dict(asset='eur', amount=eur_locked, type='locked'),
-    ])
-    df_bnb = pd.DataFrame([
-        dict(asset='bnb', amount=bnb_free, type='free'),
-        dict(asset='bnb', amount=bnb_locked, type='locked'),
-    ])
-
-    fig_btc = daux.get_balance_bar_chart(df=df_btc, asset='btc', y_max=0.2)
-    fig_eur = daux.get_balance_bar_chart(df=df_eur, asset='eur', y_max=10000)
-    fig_bnb = daux.get_balance_bar_chart(df=df_bnb, asset='bnb', y_max=55)
-    return fig_btc, fig_eur, fig_bnb
+def update_figure(timer, last_keys):
+    # last balance received from the user socket (no REST call from the dashboard thread)
+    ab = session.get_snapshot().current_ab
+    last_keys = last_keys or [None] * 3
+    figures, keys = [], []
+    for (asset, balance, y_max), last_key in zip(
+            [('btc', ab.s1, 0.2), ('eur', ab.s2, 10000), ('bnb', ab.bnb, 55)], last_keys):
+        fig, key = daux.get_balance_figure_update(
+            asset=asset, free=balance.free, locked=balance.locked, y_max=y_max, last_key=last_key)
+        figures.append(fig)
+        keys.append(key)
+    return figures[0], figures[1], figures[2], keys
 
 
 @app.callback(
@@ -85,10 +83,23 @@ def on_button_click(n):
         return ''
     else:
         shutdown_flask_server()
-        session.quit(quit_mode=QuitMode.CANCEL_ALL_PLACED)
+        control_server.stop()
+        session.loop.call(session.quit, quit_mode=QuitMode.CANCEL_ALL_PLACED)
         return 'app stopped'
 
 
+@app.callback(
+    Output(component_id='profile-output', component_property='children'),
+    [Input(component_id='profile-button', component_property='n_clicks')])
+def on_profile_click(n):
+    if n is None:
+        return ''
+    # the capture runs in the profiler thread, the file is written when done
+    if not session.profiler.start(seconds=K_PROFILE_SECONDS, reason='dashboard'):
+        return 'profile already running'
+    return f'profiling {K_PROFILE_SECONDS:.0f} s, written to {session.profiler.folder}'
+
+
 # @app.callback(
 #     Output('completed-pt-balance-chart', 'figure'), Input('update', 'n_intervals'))
 # def update_chart(timer):
@@ -100,28 +111,13 @@ def on_button_click(n):
 
 
 @app.callback(
-    Output('kpi-bar-chart', 'figure'), Input('update', 'n_intervals'))
-def update_chart(timer):
-    df = session.pob.get_pending_orders_kpi(cmp=session.last_cmp, buy_fee=0.0008, sell_fee=0.0008)
-    fig = px.bar(
-        data_frame=df,
-        x='price',
-        y='amount',
-        text='amount',
-        color='side',
-        range_y=[0, 0.5],
-        height=350,
-        color_discrete_map={'BUY': 'LightSeaGreen', 'SELL': 'LightCoral'}
-    )
-    fig.update_xaxes(visible=False)
-    fig.update_yaxes(visible=False)
-    fig.update_traces(texttemplate='%{y:,.2f}')
-    fig.update_layout(
-        showlegend=False,
-        # paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        )
-    return fig
+    Output('kpi-bar-chart', 'figure'), Output('kpi-key', 'data'),
+    Input('update', 'n_intervals'), State('kpi-key', 'data'))
+def update_chart(timer, last_key):
+    snapshot = session.get_snapshot()
+    df = PendingOrdersBook.get_bands_kpi(
+        bands=snapshot.pending_bands, cmp=snapshot.last_cmp, buy_fee=0.0008, sell_fee=0.0008)
+    return daux.get_kpi_figure_update(df=df, last_key=last_key)
 
 
 # @app.callback(
@@ -142,19 +138,19 @@ def update_chart(timer):
     Input('update', 'n_intervals')
 )
 def update_led(timer):
-    cycle_count = session.ticker_count
-    df = session.get_all_orders_dataframe()
-    # get balance from orders from completed pt
-    btc_balance_completed_pt, eur_balance_completed_pt = daux.get_completed_pt_balance(df=df)
+    snapshot = session.get_snapshot()
+    cycle_count = snapshot.ticker_count
+    # get balance from completed pt (rolling summary, archived pt included)
+    summary = snapshot.completed_summary
+    btc_balance_completed_pt = summary['btc_balance']
+    eur_balance_completed_pt = summary['eur_balance']
     # balance = self.session.get_traded_balance_callback()
     satoshi_balance = btc_balance_completed_pt * 100_000_000
-    trades_to_new_pt = session.partial_traded_orders_count
+    trades_to_new_pt = snapshot.partial_traded_orders_count
     # return f'{trades_to_new_pt:02.0f}', f'{satoshi_balance:.0f}'
-    cycles_from_last = session.cycles_from_last_trade
-    completed_df = daux.get_completed_pt_df(df=df)
-    completed_pt_count = len(completed_df['pt_id'].unique())
-    total_pt_count = len(df['pt_id'].unique())
-    pending_pt_count = total_pt_count - completed_pt_count
+    cycles_from_last = snapshot.cycles_from_last_trade
+    completed_pt_count = summary['pt_count']
+    pending_pt_count = len(set(order.pt_id for order in snapshot.get_pending_orders() + list(snapshot.traded_pending)))
     # completed_pt_count = 1000
     return f'{cycle_count:.0f}', f'{trades_to_new_pt:06.0f}', f'{satoshi_balance:06.0f}', \
            f'{eur_balance_completed_pt:,.2f}', f'{cycles_from_last:06.0f}', \
@@ -172,31 +168,36 @@ def update_table(timer):
     # filter by status for each table (monitor-placed & traded)
     df_pending = df1[df1.status_name.isin(['monitor', 'placed', 'cmp'])]
     df_traded = df1[df1.status_name.eq('traded')]
-    return df_pending.to_dict('records'), df_traded.to_dict('records')
+    # completed pt already moved out of memory are read from the archive
+    traded_records = df_traded.to_dict('records') + session.get_archived_orders()
+    return df_pending.to_dict('records'), traded_records
+
+
+@app.callback(
+    Output('indicator-graph', 'figure'), Output('indicator-key', 'data'),
+    Input('update', 'n_intervals'), State('indicator-key', 'data')
+)
+def update_cmp_indicator(timer, last_key):
+    # last cmp and change from the session start
+    snapshot = session.get_snapshot()
+    return daux.get_cmp_indicator_update(last_cmp=snapshot.last_cmp, first_cmp=snapshot.first_cmp, last_key=last_key)
 
 
 @app.callback(
-    Output('indicator-graph', 'figure'), Input('update', 'n_intervals')
+    Output('daily-line', 'figure'), Output('line-key', 'data'),
+    Input('update', 'n_intervals'), State('line-key', 'data')
 )
-def update_cmp_indicator(timer):
-    # get all session cmp
-    cmps = session.cmps
-    fig = daux.get_cmp_indicator(cmps=cmps)
-    return fig
+def update_cmp_line_chart(timer, last_key):
+    # close of each bar, at the finest resolution showing the whole session in a few hundred points
+    resolution, bars = session.get_chart_bars()
+    return daux.get_cmp_line_chart_update(resolution=resolution, times=bars.time, closes=bars.close, last_key=last_key)
 
 
 @app.callback(
-    Output('daily-line', 'figure'), Input('update', 'n_intervals')
+    Output('metrics-table', 'data'), Input('update', 'n_intervals')
 )
-def update_cmp_line_chart(timer):
-    # get session cmps
-    cmps = session.cmps
-    # create dataframe from cmps list
-    df = pd.DataFrame(data=cmps, columns=['cmp'])
-    df['rate'] = df.index
-    # create line chart
-    fig = daux.get_cmp_line_chart(df=df, cmps=cmps)
-    return fig
+def update_metrics_table(timer):
+    return session.metrics.get_summary()
 
 
 def shutdown_flask_server():
@@ -1,6 +1,7 @@
 # pp_balance_manager.py
 
-from typing import List
+import time
+from typing import Callable, List, Dict, Tuple
 from binance import enums as k_binance
 
 from src.pp_account_balance import AccountBalance
@@ -14,19 +15,67 @@ BTC_MIN_BALANCE = 0.02  # 0.04  # remaining guaranteed BTC balance
 EUR_BUFFER = 1000.0
 BTC_BUFFER = 0.02
 
+K_CONFIRMATION_TIMEOUT = 10.0  # secs, a confirmation not matched by the locked balance is dropped after it
+K_LOCKED_TOLERANCE = 0.001  # relative, the amount sent is rounded (6 decimals)
+
 
 class BalanceManager:
-    def __init__(self, market: Market):
+    def __init__(self, market: Market, clock: Callable[[], float] = time.monotonic):
         self.market = market
+        self.clock = clock
 
         # account balances: initial, current and diff
         self.initial_ab = self.get_account_balance(tag='initial')
         self.current_ab = self.get_account_balance(tag='current')
         self.net_ab = self.current_ab - self.initial_ab
 
+        # optimistic reservations of free balance for the orders being placed, not reflected yet
+        # in current_ab: uid: (side, eur or btc amount)
+        self.reserved: Dict[str, Tuple[str, float]] = {}
+        # placed, waiting for the balance update: uid: (side, eur or btc amount, confirmation time)
+        self.confirmed: Dict[str, Tuple[str, float, float]] = {}
+
     def update_current(self, last_ab: AccountBalance) -> None:
+        # the exchange locks the funds of each placed order (eur for buy, btc for sell) and sends one update
+        # per order: confirmations released in placement order while the locked balance growth covers them
+        locked_growth = {
+            k_binance.SIDE_BUY: last_ab.s2.locked - self.current_ab.s2.locked,
+            k_binance.SIDE_SELL: last_ab.s1.locked - self.current_ab.s1.locked
+        }
         self.current_ab = last_ab
         self.net_ab = last_ab - self.initial_ab
+        now = self.clock()
+        for uid, (k_side, value, confirmed_at) in list(self.confirmed.items()):
+            if value * (1.0 - K_LOCKED_TOLERANCE) <= locked_growth[k_side]:
+                locked_growth[k_side] -= value
+                del self.confirmed[uid]
+            else:
+                # the next ones wait for their own update
+                locked_growth[k_side] = float('-inf')
+                if now - confirmed_at >= K_CONFIRMATION_TIMEOUT:
+                    # growth hidden by a fill or cancel in the same update
+                    del self.confirmed[uid]
+
+    def reserve(self, order: Order) -> None:
+        if order.k_side == k_binance.SIDE_BUY:
+            self.reserved[order.uid] = (order.k_side, order.get_total())
+        else:
+            self.reserved[order.uid] = (order.k_side, order.amount)
+
+    def confirm(self, order: Order) -> None:
+        # placed: kept until the balance update arrives
+        reservation = self.reserved.pop(order.uid, None)
+        if reservation:
+            k_side, value = reservation
+            self.confirmed[order.uid] = (k_side, value, self.clock())
+
+    def release(self, order: Order) -> None:
+        # not placed
+        self.reserved.pop(order.uid, None)
+
+    def get_reserved(self, k_side: str) -> float:
+        return sum(value for side, value in list(self.reserved.values()) if side == k_side) \
+            + sum(value for side, value, _ in list(self.confirmed.values()) if side == k_side)
 
     def is_s2_below_buffer(self):
         buffer = EUR_BUFFER + EUR_MIN_BALANCE
@@ -47,12 +96,12 @@ class BalanceManager:
         # if not enough balance, it returns False and the balance needed
         is_balance_enough = False
         if order.k_side == k_binance.SIDE_BUY:
-            balance_allowance = self.current_ab.get_free_price_s2()
+            balance_allowance = self.current_ab.get_free_price_s2() - self.get_reserved(k_side=k_binance.SIDE_BUY)
             available_liquidity = balance_allowance - EUR_MIN_BALANCE  # [EUR]
             if (available_liquidity - order.get_total()) > 0:
                 is_balance_enough = True
         else:  # SIDE_SELL
-            balance_allowance = self.current_ab.get_free_amount_s1()
+            balance_allowance = self.current_ab.get_free_amount_s1() - self.get_reserved(k_side=k_binance.SIDE_SELL)
             available_liquidity = balance_allowance - BTC_MIN_BALANCE  # [BTC]
             if (available_liquidity - order.amount) > 0:
                 is_balance_enough = True
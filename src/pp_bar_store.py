@@ -0,0 +1,114 @@
+# pp_bar_store.py
+#
+# time indexed OHLC bars of the session prices, updated as the ticks arrive
+#   one BarSeries per resolution (1 s, 1 min, 15 min), columns in arrays (oldest first, last bar still open)
+#   queries by time range: bisect on the bar start times, O(log bars + bars returned)
+#   bars without ticks are not stored (gaps)
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, NamedTuple, Optional
+
+K_RESOLUTIONS = [1, 60, 900]  # secs
+K_MAX_BARS = 100_000  # per resolution (1 s bars: ~28 h), the oldest ones are dropped
+K_CHART_BARS = 600
+
+
+class Bars(NamedTuple):
+    # copies of the columns (bar start time in epoch secs)
+    time: array
+    open: array
+    high: array
+    low: array
+    close: array
+    ticks: array
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+class BarSeries:
+    def __init__(self, resolution: float, max_bars: int = K_MAX_BARS):
+        self.resolution = resolution
+        self.max_bars = max_bars
+        self.time = array('d')
+        self.open = array('d')
+        self.high = array('d')
+        self.low = array('d')
+        self.close = array('d')
+        self.ticks = array('L')
+        self.is_trimmed = False  # oldest bars dropped
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def add(self, t: float, price: float) -> None:
+        start = t - t % self.resolution
+        if self.time and start <= self.time[-1]:
+            # open bar (a clock going back is kept in the last bar)
+            if price > self.high[-1]:
+                self.high[-1] = price
+            if price < self.low[-1]:
+                self.low[-1] = price
+            self.close[-1] = price
+            self.ticks[-1] += 1
+            return
+        self.time.append(start)
+        self.open.append(price)
+        self.high.append(price)
+        self.low.append(price)
+        self.close.append(price)
+        self.ticks.append(1)
+        if len(self.time) > 2 * self.max_bars:
+            # amortized: half the bars dropped at once
+            self._trim(count=len(self.time) - self.max_bars)
+
+    def get_bars(self, start: Optional[float] = None, end: Optional[float] = None) -> Bars:
+        # bars starting in [start, end], the open one included
+        i = 0 if start is None else bisect_left(self.time, start - start % self.resolution)
+        j = len(self.time) if end is None else bisect_right(self.time, end)
+        return self._get_slice(i=i, j=j)
+
+    def get_last(self, count: int) -> Bars:
+        return self._get_slice(i=max(0, len(self.time) - count), j=len(self.time))
+
+    def _get_slice(self, i: int, j: int) -> Bars:
+        return Bars(time=self.time[i:j], open=self.open[i:j], high=self.high[i:j], low=self.low[i:j],
+                    close=self.close[i:j], ticks=self.ticks[i:j])
+
+    def _trim(self, count: int) -> None:
+        for column in [self.time, self.open, self.high, self.low, self.close, self.ticks]:
+            del column[:count]
+        self.is_trimmed = True
+
+
+class BarStore:
+    """Bars at several resolutions from the same ticks; the first and last prices are kept apart
+    (all the session, whatever the bars dropped).
+    """
+    def __init__(self, resolutions: Optional[List[float]] = None, max_bars: int = K_MAX_BARS):
+        self.series: Dict[float, BarSeries] = {
+            resolution: BarSeries(resolution=resolution, max_bars=max_bars)
+            for resolution in sorted(resolutions if resolutions else K_RESOLUTIONS)}
+        self.first_price: Optional[float] = None
+        self.last_price: Optional[float] = None
+        self.tick_count = 0
+
+    def add(self, t: float, price: float) -> None:
+        if self.first_price is None:
+            self.first_price = price
+        self.last_price = price
+        self.tick_count += 1
+        for series in self.series.values():
+            series.add(t=t, price=price)
+
+    def get_bars(self, resolution: float, start: Optional[float] = None, end: Optional[float] = None) -> Bars:
+        return self.series[resolution].get_bars(start=start, end=end)
+
+    def get_chart_bars(self, max_bars: int = K_CHART_BARS) -> (float, Bars):
+        # finest resolution with the whole session in max_bars, else the last max_bars of the coarsest one
+        for resolution, series in self.series.items():
+            if len(series) <= max_bars and not series.is_trimmed:
+                return resolution, series.get_last(count=max_bars)
+        resolution, series = list(self.series.items())[-1]
+        return resolution, series.get_last(count=max_bars)
@@ -0,0 +1,31 @@
+# pp_binance_sockets.py
+
+from autobahn.twisted.websocket import connectWS
+from twisted.internet import ssl
+from binance.websockets import BinanceSocketManager, BinanceClientFactory, BinanceClientProtocol
+
+
+class RawBinanceClientProtocol(BinanceClientProtocol):
+    def onMessage(self, payload, isBinary):
+        # frames are passed undecoded: the market decodes only what it needs
+        if not isBinary:
+            self.factory.callback(payload)
+
+
+class RawBinanceSocketManager(BinanceSocketManager):
+    # same as BinanceSocketManager but callbacks receive the raw frame (bytes)
+    # note: after max reconnect retries the callback still receives the error payload as a dict
+
+    def _start_socket(self, path, callback, prefix='ws/'):
+        if path in self._conns:
+            return False
+
+        factory_url = self.STREAM_URL + prefix + path
+        factory = BinanceClientFactory(factory_url)
+        factory.protocol = RawBinanceClientProtocol
+        factory.callback = callback
+        factory.reconnect = True
+        context_factory = ssl.ClientContextFactory()
+
+        self._conns[path] = connectWS(factory, context_factory)
+        return path
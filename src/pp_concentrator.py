@@ -1,5 +1,5 @@
 # pp_concentrator.py
-from typing import List
+from typing import Callable, List, Optional
 import logging
 from binance import enums as k_binance
 
@@ -8,6 +8,7 @@ from src.pp_balance_manager import BalanceManager
 from src.xb_pt_calculator import get_compensation
 from src.pp_pending_orders_book import PendingOrdersBook
 from src.pp_traded_orders_book import TradedOrdersBook
+from src.xb_metrics import MetricsRegistry
 
 log = logging.getLogger('log')
 
@@ -17,14 +18,21 @@ class ConcentratorManager:
                  pob: PendingOrdersBook,
                  tob: TradedOrdersBook,
                  buy_fee=0.0008,
-                 sell_fee=0.0008
+                 sell_fee=0.0008,
+                 metrics: Optional[MetricsRegistry] = None,
+                 order_concentrated_callback: Optional[Callable[[Order], None]] = None
                  ):
         self.pob = pob
         self.tob = tob
         self.buy_fee = buy_fee
         self.sell_fee = sell_fee
         self.concentrator_count = 0
+        metrics = metrics if metrics else MetricsRegistry()
+        self._c_concentrated = metrics.counter('concentrations', 'orders concentrated in a new pt', kind='pending')
+        self._c_liquidity = metrics.counter('concentrations', kind='liquidity')
         self.concentrated_pt_id = []  # each element a tuple (count, pt_id list)
+        # called for each new order (b1 & s1) once in the book, not for the children of later splits
+        self.order_concentrated_callback = order_concentrated_callback
 
     def concentrate_orders(self, orders: List[Order], ref_mp: float, ref_gap: float) -> bool:
         """concentration does not include n-split
@@ -65,6 +73,7 @@ class ConcentratorManager:
             # increment counter and save mapping between count and pt_ids
             # at this point the concentration is sure and will return True
             self.concentrator_count += 1
+            self._c_concentrated.inc()
             self.concentrated_pt_id.append((self.concentrator_count, pt_ids))
             print(self.concentrated_pt_id)
 
@@ -101,13 +110,27 @@ class ConcentratorManager:
                 name='con-s1'
             )
 
+            # update concentrated variables and inverse counter
+            # (before adding them to the book, so that the book listeners get the final values)
+            b1.concentration_count = 1
+            s1.concentration_count = 1
+
+            # update variables
+            b1.compensation_count = 0
+            b1.split_count = 0
+            s1.compensation_count = 0
+            s1.split_count = 0
+
             # add new orders to appropriate list
-            self.pob.monitor.append(b1)
-            self.pob.monitor.append(s1)
+            self.pob.add_order(b1)
+            self.pob.add_order(s1)
+            if self.order_concentrated_callback:
+                self.order_concentrated_callback(b1)
+                self.order_concentrated_callback(s1)
 
             # delete original orders from list
             for order in orders:
-                self.pob.monitor.remove(order)
+                self.pob.remove_order(order)
 
             # log
             log.info('////////// ORDER COMPENSATED //////////')
@@ -117,16 +140,6 @@ class ConcentratorManager:
             log.info(f'compensated b1: {b1}')
             log.info(f'compensated s1: {s1}')
 
-            # update concentrated variables and inverse counter
-            b1.concentration_count = 1
-            s1.concentration_count = 1
-
-            # update variables
-            b1.compensation_count = 0
-            b1.split_count = 0
-            s1.compensation_count = 0
-            s1.split_count = 0
-
             # split n
             # self.split_n_order(order=b1, inter_distance=interdistance_after_concentration, child_count=n_for_split)
             # self.split_n_order(order=s1, inter_distance=interdistance_after_concentration, child_count=n_for_split)
@@ -165,13 +178,13 @@ class ConcentratorManager:
             new_order.compensation_count = order.compensation_count
             new_order.concentration_count = order.concentration_count
             # add to monitor and pending_orders table
-            self.pob.monitor.append(new_order)
+            self.pob.add_order(new_order)
 
             # add to return list
             new_orders.append(new_order)
 
         # delete original order from orders book
-        self.pob.monitor.remove(order)
+        self.pob.remove_order(order)
 
         return new_orders
 
@@ -211,6 +224,7 @@ class ConcentratorManager:
             # increment counter and save mapping between count and pt_ids
             # at this point the concentration is sure and will return True
             self.concentrator_count += 1
+            self._c_liquidity.inc()
 
             # create both orders
             session_id = order.session_id  # same session_id
@@ -237,12 +251,26 @@ class ConcentratorManager:
                 name='con-s1'
             )
 
+            # update concentrated variables and inverse counter
+            # (before adding them to the book, so that the book listeners get the final values)
+            b1.concentration_count = 1
+            s1.concentration_count = 1
+
+            # update variables
+            b1.compensation_count = 0
+            b1.split_count = 0
+            s1.compensation_count = 0
+            s1.split_count = 0
+
             # add new orders to appropriate list
-            self.pob.monitor.append(b1)
-            self.pob.monitor.append(s1)
+            self.pob.add_order(b1)
+            self.pob.add_order(s1)
+            if self.order_concentrated_callback:
+                self.order_concentrated_callback(b1)
+                self.order_concentrated_callback(s1)
 
             # delete original order from list
-            self.pob.monitor.remove(order)
+            self.pob.remove_order(order)
 
             # log
             print(f'concentrated order: {order}')
@@ -251,14 +279,4 @@ class ConcentratorManager:
             log.info(f'compensated b1: {b1}')
             log.info(f'compensated s1: {s1}')
 
-            # update concentrated variables and inverse counter
-            b1.concentration_count = 1
-            s1.concentration_count = 1
-
-            # update variables
-            b1.compensation_count = 0
-            b1.split_count = 0
-            s1.compensation_count = 0
-            s1.split_count = 0
-
             return True
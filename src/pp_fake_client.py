@@ -2,13 +2,16 @@
 
 import logging
 import time
-from typing import List
+from typing import List, Optional, TYPE_CHECKING
 from enum import Enum
 from random import choice
 import threading
 
 from src.pp_account_balance import AssetBalance, AccountBalance
 
+if TYPE_CHECKING:
+    from src.pp_market_recorder import ReplaySource
+
 log = logging.getLogger('log')
 K_INITIAL_EUR = 3_000.0  # 12_000.0
 K_INITIAL_BTC = 0.05  # 0.3
@@ -21,11 +24,13 @@ K_BNBEUR = 350.0
 K_INITIAL_CMP = 45_000.0
 
 K_UPDATE_RATE = 0.5  # secs
+K_SPREAD = 0.02  # best ask - best bid [EUR] in book ticker messages
 
 
 class FakeCmpMode(Enum):
     MODE_MANUAL = 0
     MODE_GENERATOR = 1
+    MODE_REPLAY = 2  # recorded prices (see ReplaySource)
 
 
 class FakeOrder:
@@ -40,9 +45,13 @@ class FakeOrder:
 
 
 class FakeClient:
-    def __init__(self, user_socket_callback, symbol_ticker_callback, cmp=K_INITIAL_CMP, mode=FakeCmpMode.MODE_MANUAL):
+    def __init__(self, user_socket_callback, symbol_ticker_callback, cmp=K_INITIAL_CMP, mode=FakeCmpMode.MODE_MANUAL,
+                 book_ticker_callback=None, replay_source: Optional['ReplaySource'] = None):
         self.user_socket_callback = user_socket_callback
         self.symbol_ticker_callback = symbol_ticker_callback
+        # when set, bookTicker messages (best bid/ask around cmp) are sent instead of 24hrTicker ones
+        self.book_ticker_callback = book_ticker_callback
+        self.book_ticker_update_id = 0
         self.placed_orders: List[FakeOrder] = []
         self.placed_orders_count = 0
 
@@ -51,6 +60,11 @@ class FakeClient:
         self.cmp_sequence.append(self.cmp)
 
         self.mode = mode  # set when creating FakeClient in line 208 of Market
+        self.replay_source = replay_source
+
+        # the generator thread and the session loop both act on the fake exchange state
+        self._lock = threading.RLock()
+        self._is_generator_on = False
 
         self.account_balance = AccountBalance(
             d=dict(
@@ -61,30 +75,73 @@ class FakeClient:
 
     def start_cmp_generator(self):
         if self.mode == FakeCmpMode.MODE_GENERATOR:
-            x = threading.Thread(target=self._cmp_generator)
+            self._is_generator_on = True
+            x = threading.Thread(target=self._cmp_generator, name='fake-cmp-generator', daemon=True)
+            x.start()
+        elif self.mode == FakeCmpMode.MODE_REPLAY:
+            self._is_generator_on = True
+            x = threading.Thread(target=self._cmp_replay, name='fake-cmp-replay', daemon=True)
             x.start()
         elif self.mode == FakeCmpMode.MODE_MANUAL:
             pass
         else:
             pass
 
+    def stop_cmp_generator(self):
+        self._is_generator_on = False
+
     def _cmp_generator(self):
-        while True:
+        while self._is_generator_on:
             # fake random trade
             time.sleep(K_UPDATE_RATE)
-            self.cmp += choice([-20, -10, -5, 0, 5, 10, 20])
-            self.cmp_sequence.append(self.cmp)
+            with self._lock:
+                self.cmp += choice([-20, -10, -5, 0, 5, 10, 20])
+                self.cmp_sequence.append(self.cmp)
 
             self._process_cmp_change()
 
+    def _cmp_replay(self):
+        # recorded prices with the recorded timing (no wait at speed 0)
+        speed = self.replay_source.speed
+        last_time = None
+        for event_time, cmp in self.replay_source.get_ticks():
+            if not self._is_generator_on:
+                break
+            if last_time is not None and speed > 0:
+                time.sleep(max(0.0, (event_time - last_time) / speed))
+            last_time = event_time
+            self.set_cmp(cmp=cmp)
+        log.info('replay finished')
+        self._is_generator_on = False
+
     def _process_cmp_change(self):
-        self._check_placed_orders_for_trading()
+        with self._lock:
+            self._check_placed_orders_for_trading()
+        if self.book_ticker_callback:
+            self.book_ticker_update_id += 1
+            msg = dict(
+                u=self.book_ticker_update_id,
+                s='BTCEUR',
+                b=str(round(self.cmp - K_SPREAD / 2, 2)),
+                B='1.00000000',
+                a=str(round(self.cmp + K_SPREAD / 2, 2)),
+                A='1.00000000'
+            )
+            self.book_ticker_callback(msg)
+            return
         msg = dict(
             e='24hrTicker',
             c=str(self.cmp)
         )
         self.symbol_ticker_callback(msg)
 
+    def set_cmp(self, cmp: float):
+        # cmp from an external stream (shadow sessions)
+        with self._lock:
+            self.cmp = cmp
+            self.cmp_sequence.append(cmp)
+        self._process_cmp_change()
+
     def update_cmp(self, step: float):
         # when in MANUAL mode the cmp is update from command line interface
         self.cmp += step
@@ -92,7 +149,8 @@ class FakeClient:
         self._process_cmp_change()
 
     def _check_placed_orders_for_trading(self):
-        for order in self.placed_orders:
+        # loop over a copy since traded orders are removed from the list
+        for order in list(self.placed_orders):
             if order.side == 'BUY' and self.cmp <= order.price:
                 self._trade_order(order=order)
             elif order.side == 'SELL' and self.cmp >= order.price:
@@ -100,6 +158,10 @@ class FakeClient:
 
 
     def create_order(self, **kwargs) -> dict:
+        with self._lock:
+            return self._create_order(**kwargs)
+
+    def _create_order(self, **kwargs) -> dict:
         order = FakeOrder(
             uid=kwargs.get('newClientOrderId'),
             side=kwargs.get('side'),
@@ -289,6 +351,10 @@ class FakeClient:
             }
 
     def cancel_order(self, symbol: str, origClientOrderId: str) -> dict:
+        with self._lock:
+            return self._cancel_order(symbol=symbol, origClientOrderId=origClientOrderId)
+
+    def _cancel_order(self, symbol: str, origClientOrderId: str) -> dict:
         # TODO: check that the order exist in list and remove from it
         for order in self.placed_orders:
             if order.uid == origClientOrderId:
@@ -0,0 +1,440 @@
+# pp_grid_screener.py
+
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from src.xb_pt_calculator import get_pt_values, get_compensation
+from src.pp_fake_client import K_INITIAL_EUR, K_INITIAL_BTC, K_INITIAL_BNB, K_FEE, K_BNBBTC, K_BNBEUR
+from src.pp_balance_manager import EUR_MIN_BALANCE, BTC_MIN_BALANCE, EUR_BUFFER, BTC_BUFFER
+from src.pp_session import (
+    K_MINIMUM_DISTANCE_FOR_PLACEMENT, K_MAX_DISTANCE_FOR_REMAINING_PLACED, PT_CREATED_COUNT_MAX,
+    PT_NET_AMOUNT_BALANCE, PT_S1_AMOUNT, PT_BUY_FEE, PT_SELL_FEE, PT_GROSS_EUR_BALANCE, K_INACTIVITY_CYCLES)
+
+K_BLOCK_SIZE = 256  # ticks per block (min/max precomputed per block)
+K_BLOCKS_PER_SCAN = 64  # blocks checked at once when searching the next crossing
+K_LEVEL_EPS = 1e-6  # [EUR] crossing levels widened, so that no event is missed (conditions re-checked exactly)
+
+K_FIRST_PT_MIN_CMP = 20000.0
+K_LIQUIDITY_SHIFT = 110.0  # see StrategyManager.force_buy/force_sell
+K_LIQUIDITY_GAP = 100.0
+K_CONCENTRATOR_FEE = 0.0008
+
+# BTCEUR filters of the fake client (see Order.is_filter_passed)
+K_MIN_QTY = 0.000001
+K_MAX_QTY = 9000.0
+K_MIN_PRICE = 0.01
+K_MAX_PRICE = 1_000_000.0
+K_MIN_NOTIONAL = 10.0
+
+
+class GridConfig(NamedTuple):
+    # pt values (get_pt_values)
+    nab: float = PT_NET_AMOUNT_BALANCE
+    s1_qty: float = PT_S1_AMOUNT
+    buy_fee: float = PT_BUY_FEE
+    sell_fee: float = PT_SELL_FEE
+    geb: float = PT_GROSS_EUR_BALANCE
+    # grid management
+    placement_distance: float = K_MINIMUM_DISTANCE_FOR_PLACEMENT
+    move_back_distance: float = K_MAX_DISTANCE_FOR_REMAINING_PLACED
+    inactivity_cycles: int = K_INACTIVITY_CYCLES
+    max_pt_count: int = PT_CREATED_COUNT_MAX
+    # balances
+    initial_eur: float = K_INITIAL_EUR
+    initial_btc: float = K_INITIAL_BTC
+    initial_bnb: float = K_INITIAL_BNB
+    eur_min_balance: float = EUR_MIN_BALANCE
+    btc_min_balance: float = BTC_MIN_BALANCE
+    eur_buffer: float = EUR_BUFFER
+    btc_buffer: float = BTC_BUFFER
+
+
+class ScreenResult(NamedTuple):
+    config: GridConfig
+    ticks: int
+    events: int  # ticks actually processed
+    seconds: float
+    pt_created_count: int
+    completed_pt_count: int
+    buy_count: int
+    sell_count: int
+    eur: float  # free + locked
+    btc: float
+    bnb: float
+    equity_delta: float  # [EUR] at the last price, bnb at K_BNBEUR
+    fills: Tuple[Tuple[int, str, float], ...]  # (tick, side, price)
+    # risk
+    concentration_count: int
+    max_eur_locked: float
+    max_btc_locked: float
+    eur_exhausted_tick: int  # first tick with eur total below buffer + min balance (-1: never)
+    btc_exhausted_tick: int
+
+    def get_ticks_per_second(self) -> float:
+        return self.ticks / self.seconds if self.seconds > 0 else 0.0
+
+
+class PricePath:
+    """Price array with per block min/max, to find the next crossing of a level without visiting every tick."""
+    def __init__(self, prices: Union[np.ndarray, List[float]], block_size: int = K_BLOCK_SIZE):
+        self.prices = np.ascontiguousarray(prices, dtype=np.float64)
+        self.block_size = block_size
+        starts = np.arange(0, len(self.prices), block_size)
+        self.block_min = np.minimum.reduceat(self.prices, starts) if len(self.prices) else np.empty(0)
+        self.block_max = np.maximum.reduceat(self.prices, starts) if len(self.prices) else np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def find_first_below(self, start: int, level: float) -> int:
+        # first index >= start with price < level (len when none)
+        return self._find_first(start, level, np.less, self.block_min)
+
+    def find_first_above(self, start: int, level: float) -> int:
+        # first index >= start with price > level (len when none)
+        return self._find_first(start, level, np.greater, self.block_max)
+
+    def _find_first(self, start: int, level: float, op: Callable, block_extremes: np.ndarray) -> int:
+        n = len(self.prices)
+        size = self.block_size
+        # rest of the current block
+        end = min(n, (start // size + 1) * size)
+        if start < end:
+            mask = op(self.prices[start:end], level)
+            i = int(mask.argmax())
+            if mask[i]:
+                return start + i
+        # following blocks, by their min/max
+        b = end // size
+        nb = len(block_extremes)
+        while b < nb:
+            e = min(nb, b + K_BLOCKS_PER_SCAN)
+            mask = op(block_extremes[b:e], level)
+            i = int(mask.argmax())
+            if mask[i]:
+                s = (b + i) * size
+                return s + int(op(self.prices[s:s + size], level).argmax())
+            b = e
+        return n
+
+
+class _GridOrder:
+    __slots__ = ('pt_id', 'is_buy', 'price', 'amount', 'x_price', 'x_qty')
+
+    def __init__(self, pt_id: int, is_buy: bool, price: float, amount: float):
+        self.pt_id = pt_id
+        self.is_buy = is_buy
+        self.price = price  # session price (distances)
+        self.amount = amount
+        self.x_price = 0.0  # exchange price & quantity, as sent when placed (rounded)
+        self.x_qty = 0.0
+
+    def get_distance(self, cmp: float) -> float:
+        return cmp - self.price if self.is_buy else self.price - cmp
+
+    def get_x_total(self) -> float:
+        return self.x_price * self.x_qty
+
+
+class GridScreener:
+    """Simulation of the session pt grid on the fake exchange, for one price path and configuration.
+
+    The grid only changes when the price crosses an order level (placement,
+    fill, move back) or on inactivity, so instead of running every tick the
+    next event is found on the price array (per block min/max) and only that
+    tick is processed, with the same rules and order of operations as
+    Session + FakeClient in simulated mode (rate limits not included).
+    """
+    def __init__(self, path: PricePath, config: GridConfig = GridConfig()):
+        self.path = path
+        self.config = config
+
+        self.monitor: List[_GridOrder] = []
+        self.placed: List[_GridOrder] = []
+        self.traded_pending: List[_GridOrder] = []
+
+        # exchange (live) balances
+        self.eur_free = float(str(config.initial_eur))
+        self.eur_locked = 0.0
+        self.btc_free = float(str(config.initial_btc))
+        self.btc_locked = 0.0
+        self.bnb_free = float(str(config.initial_bnb))
+
+        self.pt_created_count = 0
+        self.completed_pt_count = 0
+        self.buy_count = 0
+        self.sell_count = 0
+        self.partial_traded_orders_count = 0
+        self.cycles_from_last_trade = 0
+        self.last_cmp = 0.0  # only used for the pt created on fills, never before the first tick
+        self.events = 0
+        self.fills: List[Tuple[int, str, float]] = []
+        self.concentration_count = 0
+        self.max_eur_locked = 0.0
+        self.max_btc_locked = 0.0
+        self.eur_exhausted_tick = -1
+        self.btc_exhausted_tick = -1
+
+    # ********** run **********
+
+    def run(self) -> ScreenResult:
+        t_start = time.perf_counter()
+        prices = self.path.prices
+        n = len(prices)
+        t = 0
+        last_t = -1
+        while t < n:
+            self.cycles_from_last_trade += t - last_t - 1  # skipped ticks
+            # the session last cmp is the one of the previous tick (processed or not)
+            if t > 0:
+                self.last_cmp = float(prices[t - 1])
+            is_changed = self._process_tick(t=t, cmp=float(prices[t]))
+            self.events += 1
+            last_t = t
+            # after a balance or book change the next tick is checked too (balance updates are applied after the tick)
+            t = t + 1 if is_changed else self._get_next_event(start=t + 1)
+        if last_t < n - 1:
+            self.cycles_from_last_trade += n - 1 - last_t
+        return self._get_result(seconds=time.perf_counter() - t_start)
+
+    def _get_next_event(self, start: int) -> int:
+        c = self.config
+        below = -np.inf  # event when price < below
+        above = np.inf  # event when price > above
+        for order in self.placed:
+            if order.is_buy:
+                below = max(below, order.x_price + K_LEVEL_EPS)  # fill
+                above = min(above, order.price + c.move_back_distance - K_LEVEL_EPS)  # move back
+            else:
+                above = min(above, order.x_price - K_LEVEL_EPS)
+                below = max(below, order.price - c.move_back_distance + K_LEVEL_EPS)
+        cmp = self.last_cmp
+        for order in self.monitor:
+            # orders already ready are only retried after a balance change
+            if order.get_distance(cmp) >= c.placement_distance:
+                if order.is_buy:
+                    below = max(below, order.price + c.placement_distance + K_LEVEL_EPS)
+                else:
+                    above = min(above, order.price - c.placement_distance - K_LEVEL_EPS)
+        next_t = start + c.inactivity_cycles - self.cycles_from_last_trade
+        if below > -np.inf:
+            next_t = min(next_t, self.path.find_first_below(start=start, level=below))
+        if above < np.inf:
+            next_t = min(next_t, self.path.find_first_above(start=start, level=above))
+        return max(start, next_t)
+
+    # ********** one tick (FakeClient._process_cmp_change + Session.symbol_ticker_callback) **********
+
+    def _process_tick(self, t: int, cmp: float) -> bool:
+        c = self.config
+        is_changed = False
+
+        # 1. exchange fills (processed by the session as they arrive)
+        for order in list(self.placed):
+            if (order.is_buy and cmp <= order.x_price) or (not order.is_buy and cmp >= order.x_price):
+                self._trade(order=order)
+                self._on_order_traded(t=t, order=order, cmp=self.last_cmp)
+                is_changed = True
+
+        # 2. session tick
+        if t == 0 and cmp > K_FIRST_PT_MIN_CMP:
+            self._create_new_pt(mp=cmp)
+        self.last_cmp = cmp
+        self.cycles_from_last_trade += 1
+        # balance as last updated: the changes in this tick are applied after it
+        eur_free, btc_free = self.eur_free, self.btc_free
+        eur_total, btc_total = self.eur_free + self.eur_locked, self.btc_free + self.btc_locked
+
+        # move back
+        for order in list(self.placed):
+            if order.get_distance(cmp) > c.move_back_distance:
+                self.placed.remove(order)
+                self.monitor.append(order)
+                self._cancel(order=order)
+                is_changed = True
+
+        # placement, closest first
+        ready = [order for order in self.monitor if order.get_distance(cmp) < c.placement_distance]
+        queued = sorted(ready, key=lambda x: abs(x.get_distance(cmp)), reverse=True)
+        reserved_eur = 0.0
+        reserved_btc = 0.0
+        traded_when_placed = []
+        while queued:
+            order = queued.pop()
+            if order.is_buy:
+                total = round(order.price * order.amount, 2)
+                if not (eur_free - reserved_eur) - c.eur_min_balance - total > 0:
+                    continue
+                reserved_eur += total
+            else:
+                if not (btc_free - reserved_btc) - c.btc_min_balance - order.amount > 0:
+                    continue
+                reserved_btc += order.amount
+            self.monitor.remove(order)
+            self.placed.append(order)
+            if self._place(order=order, cmp=cmp):
+                traded_when_placed.append(order)
+            is_changed = True
+
+        # inactivity
+        if self.cycles_from_last_trade > c.inactivity_cycles:
+            if btc_total < c.btc_buffer + c.btc_min_balance:
+                self._force_liquidity(cmp=cmp, is_buy=True)
+            elif eur_total < c.eur_buffer + c.eur_min_balance:
+                self._force_liquidity(cmp=cmp, is_buy=False)
+            else:
+                self._create_new_pt(mp=cmp)
+            self.cycles_from_last_trade = 0
+            is_changed = True  # new orders may be ready in the next tick
+
+        # fills when placing, received after the tick
+        for order in traded_when_placed:
+            self._on_order_traded(t=t, order=order, cmp=self.last_cmp)
+
+        # totals only change on fills, all of them in processed ticks
+        if self.eur_exhausted_tick < 0 and self.eur_free + self.eur_locked < c.eur_buffer + c.eur_min_balance:
+            self.eur_exhausted_tick = t
+        if self.btc_exhausted_tick < 0 and self.btc_free + self.btc_locked < c.btc_buffer + c.btc_min_balance:
+            self.btc_exhausted_tick = t
+        return is_changed
+
+    # ********** exchange (FakeClient) **********
+
+    def _place(self, order: _GridOrder, cmp: float) -> bool:
+        # price and quantity as sent by Market.place_order
+        order.x_price = float(f'{order.price:0.02f}')
+        order.x_qty = round(order.amount, 6)
+        if order.is_buy:
+            self.eur_free -= order.get_x_total()
+            self.eur_locked += order.get_x_total()
+            self.max_eur_locked = max(self.max_eur_locked, self.eur_locked)
+        else:
+            self.btc_free -= order.x_qty
+            self.btc_locked += order.x_qty
+            self.max_btc_locked = max(self.max_btc_locked, self.btc_locked)
+        # traded when placing
+        if (order.is_buy and cmp < order.x_price) or (not order.is_buy and cmp > order.x_price):
+            self._trade(order=order)
+            return True
+        return False
+
+    def _trade(self, order: _GridOrder) -> None:
+        if order.is_buy:
+            self.eur_locked -= order.get_x_total()
+            self.btc_free += order.x_qty
+        else:
+            self.btc_locked -= order.x_qty
+            self.eur_free += order.get_x_total()
+        self.bnb_free -= order.x_qty * K_FEE / K_BNBBTC
+
+    def _cancel(self, order: _GridOrder) -> None:
+        if order.is_buy:
+            self.eur_free += order.get_x_total()
+            self.eur_locked -= order.get_x_total()
+        else:
+            self.btc_free += order.x_qty
+            self.btc_locked -= order.x_qty
+
+    # ********** session **********
+
+    def _on_order_traded(self, t: int, order: _GridOrder, cmp: float) -> None:
+        self.cycles_from_last_trade = 0
+        if order.is_buy:
+            self.buy_count += 1
+        else:
+            self.sell_count += 1
+        order.price = order.x_price
+        self.fills.append((t, 'BUY' if order.is_buy else 'SELL', order.x_price))
+        self.placed.remove(order)
+        if any(o.pt_id == order.pt_id for o in self.monitor) or any(o.pt_id == order.pt_id for o in self.placed):
+            self.traded_pending.append(order)
+        else:
+            self.completed_pt_count += 1
+            self.traded_pending = [o for o in self.traded_pending if o.pt_id != order.pt_id]
+        self.partial_traded_orders_count += 1
+        if self.pt_created_count < self.config.max_pt_count and self.partial_traded_orders_count >= 0:
+            self._create_new_pt(mp=cmp)
+
+    def _create_new_pt(self, mp: float) -> None:
+        c = self.config
+        b1_qty, b1_price, s1_price, _ = get_pt_values(
+            mp=mp, nab=c.nab, s1_qty=c.s1_qty, buy_fee=c.buy_fee, sell_fee=c.sell_fee, geb=c.geb)
+        if not (GridScreener._is_filter_passed(qty=b1_qty, price=b1_price)
+                and GridScreener._is_filter_passed(qty=c.s1_qty, price=s1_price)):
+            return
+        self.pt_created_count += 1
+        self.monitor.append(_GridOrder(pt_id=self.pt_created_count, is_buy=True, price=b1_price, amount=b1_qty))
+        self.monitor.append(_GridOrder(pt_id=self.pt_created_count, is_buy=False, price=s1_price, amount=c.s1_qty))
+        self.partial_traded_orders_count -= 2
+
+    def _force_liquidity(self, cmp: float, is_buy: bool) -> None:
+        # StrategyManager.force_buy/force_sell: the lowest (buy) or highest (sell) monitor order is concentrated
+        if not self.monitor:
+            return
+        sorted_orders = sorted(self.monitor, key=lambda x: x.price, reverse=True)
+        order = sorted_orders[-1] if is_buy else sorted_orders[0]
+        ref_mp = cmp + K_LIQUIDITY_SHIFT if is_buy else cmp - K_LIQUIDITY_SHIFT
+        signed_amount = order.amount if order.is_buy else -order.amount
+        s1_p, b1_p, s1_qty, b1_qty = get_compensation(
+            cmp=ref_mp,
+            gap=K_LIQUIDITY_GAP,
+            qty_bal=0.0 + signed_amount,
+            price_bal=0.0 - order.price * signed_amount,
+            buy_fee=K_CONCENTRATOR_FEE,
+            sell_fee=K_CONCENTRATOR_FEE)
+        if s1_p < 0 or b1_p < 0 or s1_qty < 0 or b1_qty < 0:
+            return
+        self.monitor.append(_GridOrder(pt_id=order.pt_id, is_buy=True, price=b1_p, amount=b1_qty))
+        self.monitor.append(_GridOrder(pt_id=order.pt_id, is_buy=False, price=s1_p, amount=s1_qty))
+        self.monitor.remove(order)
+        self.concentration_count += 1
+
+    @staticmethod
+    def _is_filter_passed(qty: float, price: float) -> bool:
+        return K_MIN_QTY <= qty <= K_MAX_QTY and K_MIN_PRICE <= price <= K_MAX_PRICE and qty * price > K_MIN_NOTIONAL
+
+    def _get_result(self, seconds: float) -> ScreenResult:
+        c = self.config
+        eur = self.eur_free + self.eur_locked
+        btc = self.btc_free + self.btc_locked
+        last_price = float(self.path.prices[-1]) if len(self.path) else 0.0
+        equity_delta = (eur - c.initial_eur) + (btc - c.initial_btc) * last_price \
+            + (self.bnb_free - c.initial_bnb) * K_BNBEUR
+        return ScreenResult(
+            config=c,
+            ticks=len(self.path),
+            events=self.events,
+            seconds=seconds,
+            pt_created_count=self.pt_created_count,
+            completed_pt_count=self.completed_pt_count,
+            buy_count=self.buy_count,
+            sell_count=self.sell_count,
+            eur=eur,
+            btc=btc,
+            bnb=self.bnb_free,
+            equity_delta=equity_delta,
+            fills=tuple(self.fills),
+            concentration_count=self.concentration_count,
+            max_eur_locked=self.max_eur_locked,
+            max_btc_locked=self.max_btc_locked,
+            eur_exhausted_tick=self.eur_exhausted_tick,
+            btc_exhausted_tick=self.btc_exhausted_tick
+        )
+
+
+def screen(prices: Union[PricePath, np.ndarray, List[float]],
+           configs: List[GridConfig],
+           key: Callable[[ScreenResult], float] = lambda r: r.equity_delta) -> List[ScreenResult]:
+    # configurations ranked on the same path (best first)
+    path = prices if isinstance(prices, PricePath) else PricePath(prices=prices)
+    results = [GridScreener(path=path, config=config).run() for config in configs]
+    return sorted(results, key=key, reverse=True)
+
+
+def get_random_walk(start: float, steps: int, step_values: Optional[List[float]] = None, seed: int = 0) -> np.ndarray:
+    # same steps as the fake client generator by default
+    rng = np.random.default_rng(seed)
+    step_values = np.asarray(step_values if step_values is not None else [-20, -10, -5, 0, 5, 10, 20], dtype=float)
+    return start + np.cumsum(rng.choice(step_values, size=steps))
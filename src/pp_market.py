@@ -2,10 +2,9 @@
 
 import sys
 import logging
-from typing import Callable, Union, Any, Optional, List
-from twisted.internet import reactor
-from binance.client import Client
-from binance.websockets import BinanceSocketManager
+from enum import Enum
+from time import perf_counter_ns, time
+from typing import Callable, Union, Optional, List, Dict, Tuple, TYPE_CHECKING
 from binance import enums as k_binance
 from binance import exceptions
 
@@ -18,40 +17,115 @@ from binance.exceptions import BinanceOrderMinTotalException
 from binance.exceptions import BinanceOrderUnknownSymbolException
 from binance.exceptions import BinanceOrderInactiveSymbolException
 
-from requests.exceptions import ConnectionError, ReadTimeout
 
 from src.pp_order import Order
 from src.pp_account_balance import AccountBalance, AssetBalance
 # from src.pp_simulated_client import SimulatedClient
-from src.pp_fake_client import FakeClient, FakeCmpMode
+from src.pp_fake_client import FakeClient, FakeCmpMode, K_INITIAL_CMP
+from src.pp_tick_intake import TickIntake, TickIntakeMode, Tick
+from src.pp_market_recorder import MarketRecorder, ReplaySource
+from src.xb_metrics import MetricsRegistry
+from src.pp_request_weight import RequestWeightTracker, RequestPriority, K_WEIGHT_HEADER, K_WEIGHT_WINDOW
+from src.pp_message_decoder import (decode_frame, get_event_type, get_float_field, get_field_tag, get_int_field,
+                                    get_number_tag)
+
+# binance client, twisted and requests are only imported in binance mode (slow imports, not used in simulation)
+if TYPE_CHECKING:
+    from binance.client import Client
 
 log = logging.getLogger('log')
 
+K_TAG_LAST_PRICE = get_field_tag('c')
+K_TAG_BEST_BID = get_field_tag('b')
+K_TAG_BEST_ASK = get_field_tag('a')
+K_TAG_EVENT_TIME = get_number_tag('E')  # [ms]
+
+
+class TickerStreamMode(Enum):
+    LAST_PRICE = 1  # 24hrTicker stream: last price, about once per second
+    BOOK_TICKER = 2  # bookTicker stream: best bid/ask, pushed in real time
+
 
 class Market:
     def __init__(self,
                  symbol_ticker_callback: Callable[[float], None],
                  order_traded_callback: Callable[[str, float, float], None],
                  account_balance_callback: Callable[[AccountBalance], None],
-                 client_mode: str):
+                 client_mode: str,
+                 tick_intake_mode: TickIntakeMode = TickIntakeMode.LATEST_ONLY,
+                 threaded: bool = True,
+                 metrics: Optional[MetricsRegistry] = None,
+                 ticker_stream_mode: TickerStreamMode = TickerStreamMode.LAST_PRICE,
+                 book_ticker_callback: Optional[Callable[[float, float], None]] = None,
+                 api_url: Optional[str] = None,
+                 stream_url: Optional[str] = None,
+                 initial_cmp: float = K_INITIAL_CMP,
+                 replay_source: Optional[ReplaySource] = None):
 
         self.symbol_ticker_callback: Callable[[float], None] = symbol_ticker_callback
         self.order_traded_callback: Callable[[str, float, float], None] = order_traded_callback
         self.account_balance_callback: Callable[[AccountBalance], None] = account_balance_callback
+        # in BOOK_TICKER mode the (bid, ask) ticks are passed to book_ticker_callback instead of symbol_ticker_callback
+        self.ticker_stream_mode = ticker_stream_mode
+        self.book_ticker_callback: Optional[Callable[[float, float], None]] = book_ticker_callback
+        if ticker_stream_mode == TickerStreamMode.BOOK_TICKER and book_ticker_callback is None:
+            raise ValueError('book_ticker_callback is needed in BOOK_TICKER stream mode')
         self.client_mode = client_mode
+        # binance mode only: REST and stream urls overridden (local stand-in for load tests), default binance ones
+        self.api_url = api_url
+        self.stream_url = stream_url
+        # simulated and shadow modes: cmp of the fake exchange when created
+        self.initial_cmp = initial_cmp
+        # simulated mode: recorded prices replayed instead of the random generated ones
+        self.replay_source = replay_source
+        # stream events appended to segment files (see MarketRecorder), set by the session
+        self.recorder: Optional[MarketRecorder] = None
+        # when not threaded, no thread is started: ticks are fed by the caller (fake client in manual mode)
+        self.threaded = threaded
         # symbol must be passed as argument o get from configuration file
         self.symbol = 'BTCEUR'
 
+        self._set_event_handlers()
+
         # set control flags
         self.is_symbol_ticker_on = False  # when off symbol ticker socket U/S
 
+        # latency of each REST call, recorded as rest.<endpoint>
+        self.metrics = metrics if metrics else MetricsRegistry()
+        self._h_place_order = self.metrics.histogram('rest.place_order')
+        self._h_cancel_order = self.metrics.histogram('rest.cancel_order')
+        self._h_get_symbol_info = self.metrics.histogram('rest.get_symbol_info')
+        self._h_get_asset_balance = self.metrics.histogram('rest.get_asset_balance')
+        self._h_get_avg_price = self.metrics.histogram('rest.get_avg_price')
+        # stream event time to reception (clock offset included)
+        self._h_ws_lag = self.metrics.histogram('ws.lag')
+
+        # request weight used in the last minute: placements and reads are deferred before reaching the limit
+        self.request_weight = RequestWeightTracker()
+        # last values read, returned when a read has to be deferred
+        self._last_avg_prices: Dict[str, float] = {}
+        self._last_asset_balances: Dict[str, AssetBalance] = {}
+
+        # tick intake stage between the socket thread and the session (coalesces bursts when started)
+        self.tick_intake = TickIntake(callback=self._on_tick, mode=tick_intake_mode)
+        self.metrics.counter('ticks_received', 'ticks received from the stream').set_function(
+            lambda: self.tick_intake.received_count)
+        self.metrics.counter('ticks_coalesced', 'ticks merged into a fresher one or dropped').set_function(
+            lambda: self.tick_intake.merged_count + self.tick_intake.dropped_count)
+        # called with each tick once processed by the session (fan out of the stream to the shadow sessions)
+        self._tick_listeners: List[Callable[[Tick], None]] = []
+
         # create client depending on client_mode parameter
-        self.client: Union[Client, FakeClient]
+        self.client: Union['Client', FakeClient]
+        # network errors raised by the binance client (none in simulator mode)
+        self._network_errors: tuple = ()
         self.client, self.simulator_mode = self.set_client(client_mode)
 
         # self.start_sockets()
 
     def start_sockets(self):
+        if self.threaded:
+            self.tick_intake.start()
         if not self.simulator_mode:
             # sockets only started in binance mode (not in simulator mode)
             self._start_sockets()
@@ -62,61 +136,180 @@ class Market:
 
     # ********** callback functions **********
 
-    def binance_user_socket_callback(self, msg) -> None:
+    def binance_user_socket_callback(self, msg: dict) -> None:
         # called from Binance API each time an order is traded and
         # each time the account balance changes
-        event_type: str = msg['e']
-        if event_type == 'executionReport':
-            if (msg['x'] == 'TRADE') and (msg["X"] == 'FILLED'):
-                # order traded
-                uid = str(msg['c'])
-                order_price = float(msg['L'])
-                bnb_commission = float(msg['n'])
-                # trigger actions for traded order in session
-                self.order_traded_callback(uid, order_price, bnb_commission)
-            elif (msg['x'] == 'NEW') and (msg["X"] == 'NEW'):
-                # order accepted (PLACE confirmation)
-                # not used by the moment
-                pass
-
-        elif event_type == 'outboundAccountPosition':
-            # account balance change
-            balances = msg['B']
-            d = {}
-            # create dictionary from msg to use in account balance instantiation
-            for item in balances:
-                # to avoid errors in case of having more assets
-                if item['a'] in ['BTC', 'EUR', 'BNB']:
-                    # set precision
-                    if item['a'] in ['BTC', 'BNB']:
-                        p = 8
-                    else:
-                        p = 2
-                    ab = AssetBalance(
-                        name=item['a'],
-                        free=float(item['f']),
-                        locked=float(item['l']),
-                        tag='current',
-                        precision=p)
-                    d.update(ab.to_dict(symbol=self.symbol))
-            account_balance = AccountBalance(d=d)
-            self.account_balance_callback(account_balance)
-
-    def binance_symbol_ticker_callback(self, msg: Any) -> None:
+        handler = self._user_event_handlers.get(msg['e'])
+        if handler:
+            handler(msg)
+
+    def binance_symbol_ticker_callback(self, msg: dict) -> None:
         # called from Binance API each time the cmp is updated
-        if msg['e'] == 'error':
-            log.critical(f'symbol ticker socket error: {msg["m"]}')
-        elif msg['e'] == '24hrTicker':
-            # trigger actions for new market price
-            cmp = float(msg['c'])
-            self.symbol_ticker_callback(cmp)
+        handler = self._ticker_event_handlers.get(msg['e'])
+        if handler:
+            handler(msg)
         else:
             log.critical(f'event type not expected: {msg["e"]}')
 
+    def binance_book_ticker_callback(self, msg: dict) -> None:
+        # called each time the best bid or ask changes (bookTicker frames have no event type)
+        if 'e' in msg:
+            self._on_socket_error(msg)
+        else:
+            self._push_tick((float(msg['b']), float(msg['a'])))
+
+    # ********** raw frame callbacks (binance mode) **********
+
+    def binance_user_socket_raw_callback(self, payload: Union[bytes, dict]) -> None:
+        if isinstance(payload, dict):
+            # error payload generated locally by the socket factory
+            self.binance_user_socket_callback(payload)
+            return
+        if self.recorder:
+            self.recorder.add_user_frame(payload)
+        self._record_ws_lag(payload=payload)
+        # only the frames with a handler are decoded
+        if get_event_type(payload) in self._raw_user_event_types:
+            msg = decode_frame(payload)
+            if msg:
+                self.binance_user_socket_callback(msg)
+
+    def binance_symbol_ticker_raw_callback(self, payload: Union[bytes, dict]) -> None:
+        if isinstance(payload, dict):
+            self.binance_symbol_ticker_callback(payload)
+            return
+        self._record_ws_lag(payload=payload)
+        if get_event_type(payload) == b'24hrTicker':
+            # fast path: only the last price is extracted
+            cmp = get_float_field(payload=payload, tag=K_TAG_LAST_PRICE)
+            if cmp is not None:
+                self._push_tick(cmp)
+                return
+        msg = decode_frame(payload)
+        if msg:
+            self.binance_symbol_ticker_callback(msg)
+
+    def binance_book_ticker_raw_callback(self, payload: Union[bytes, dict]) -> None:
+        if isinstance(payload, dict):
+            self.binance_book_ticker_callback(payload)
+            return
+        bid = get_float_field(payload=payload, tag=K_TAG_BEST_BID)
+        ask = get_float_field(payload=payload, tag=K_TAG_BEST_ASK)
+        if bid is None or ask is None:
+            log.critical(f'invalid book ticker frame: {payload[:100]}')
+            return
+        self._push_tick((bid, ask))
+
+    def _record_ws_lag(self, payload: bytes) -> None:
+        event_time = get_int_field(payload=payload, tag=K_TAG_EVENT_TIME)
+        if event_time is not None:
+            self._h_ws_lag.record(int((time() * 1_000 - event_time) * 1_000_000))
+
+    # ********** event handlers **********
+
+    def _on_execution_report(self, msg: dict) -> None:
+        if (msg['x'] == 'TRADE') and (msg['X'] == 'FILLED'):
+            # order traded
+            uid = str(msg['c'])
+            order_price = float(msg['L'])
+            bnb_commission = float(msg['n'])
+            # trigger actions for traded order in session
+            self.order_traded_callback(uid, order_price, bnb_commission)
+        # (msg['x'] == 'NEW') and (msg['X'] == 'NEW'): order accepted (PLACE confirmation), not used by the moment
+
+    def _on_account_position(self, msg: dict) -> None:
+        # account balance change
+        d = {}
+        # only the assets of the symbol and bnb are used (the others are skipped)
+        for item in msg['B']:
+            key_and_precision = self._asset_keys.get(item['a'])
+            if key_and_precision:
+                key, p = key_and_precision
+                d[key] = AssetBalance(
+                    name=item['a'],
+                    free=float(item['f']),
+                    locked=float(item['l']),
+                    tag='current',
+                    precision=p)
+        account_balance = AccountBalance(d=d)
+        self.account_balance_callback(account_balance)
+
+    def _on_24hr_ticker(self, msg: dict) -> None:
+        # trigger actions for new market price
+        cmp = float(msg['c'])
+        self._push_tick(cmp)
+
+    def _push_tick(self, tick: Tick) -> None:
+        if self.recorder:
+            self.recorder.add_tick(tick)
+        self.tick_intake.push(tick)
+
+    def _on_tick(self, tick: Tick) -> None:
+        if self.ticker_stream_mode == TickerStreamMode.BOOK_TICKER:
+            bid, ask = tick
+            self.book_ticker_callback(bid, ask)
+        else:
+            self.symbol_ticker_callback(tick)
+        for listener in self._tick_listeners:
+            # a failing listener must not stop the live stream
+            try:
+                listener(tick)
+            except Exception as e:
+                log.critical(f'tick listener error: {e!r}')
+
+    def add_tick_listener(self, callback: Callable[[Tick], None]) -> None:
+        self._tick_listeners.append(callback)
+
+    def remove_tick_listener(self, callback: Callable[[Tick], None]) -> None:
+        # new list: the intake thread may be iterating over the current one
+        self._tick_listeners = [listener for listener in self._tick_listeners if listener != callback]
+
+    def feed_tick(self, tick: Tick) -> None:
+        # shadow mode: tick of a live stream, fills simulated by the fake exchange at the mid price
+        cmp = tick if isinstance(tick, float) else (tick[0] + tick[1]) / 2
+        self.client.set_cmp(cmp=cmp)
+
+    @staticmethod
+    def _on_socket_error(msg: dict) -> None:
+        log.critical(f'symbol ticker socket error: {msg["m"]}')
+
+    def _set_event_handlers(self) -> None:
+        # dispatch tables: event type -> handler
+        self._user_event_handlers: Dict[str, Callable[[dict], None]] = {
+            'executionReport': self._on_execution_report,
+            'outboundAccountPosition': self._on_account_position,
+            'error': self._on_socket_error
+        }
+        self._raw_user_event_types = {event_type.encode() for event_type in self._user_event_handlers.keys()}
+        self._ticker_event_handlers: Dict[str, Callable[[dict], None]] = {
+            '24hrTicker': self._on_24hr_ticker,
+            'error': self._on_socket_error
+        }
+
+    @property
+    def symbol(self) -> str:
+        return self._symbol
+
+    @symbol.setter
+    def symbol(self, symbol: str) -> None:
+        # account position assets used: name -> (account balance key, precision)
+        self._symbol = symbol
+        self._asset_keys: Dict[str, Tuple[str, int]] = {}
+        for name in [symbol[:3], symbol[3:], 'BNB']:
+            key = AssetBalance(name=name).to_dict(symbol=symbol).popitem()[0]
+            self._asset_keys[name] = (key, 2 if name == 'EUR' else 8)
+
     # ********** calls to binance api **********
 
+    def can_place_order(self) -> bool:
+        return self.request_weight.can_send(endpoint='place_order', priority=RequestPriority.PLACE)
+
     def place_order(self, order: Order) -> Optional[dict]:
         # TODO: check and test it
+        if not self.can_place_order():
+            log.warning(f'placement deferred (request weight used: {self.request_weight.get_used()}) {order}')
+            return None
+        t0 = perf_counter_ns()
         try:
             msg = self.client.create_order(
                 symbol='BTCEUR',
@@ -138,13 +331,18 @@ class Market:
                 BinanceOrderMinPriceException, BinanceOrderMinTotalException,
                 BinanceOrderUnknownSymbolException,
                 BinanceOrderInactiveSymbolException) as e:
+            self._check_rate_limit_error(e)
             log.critical(e)
-        except (ConnectionError, ReadTimeout) as e:
+        except self._network_errors as e:
             log.critical(e)
+        finally:
+            self._h_place_order.record_since(t0)
+            self._record_request(endpoint='place_order', priority=RequestPriority.PLACE)
         return None  # msg['orderId'], msg['status'] == 'FILLED' or 'NEW'
 
     def get_symbol_info(self, symbol: str) -> Optional[dict]:
         # return dict with the required values for checking order values
+        t0 = perf_counter_ns()
         try:
             d = self.client.get_symbol_info(symbol)
             if d:
@@ -165,47 +363,112 @@ class Market:
             else:
                 log.critical(f'no symbol info from Binance for {symbol}')
         except (BinanceAPIException, BinanceRequestException) as e:
+            self._check_rate_limit_error(e)
             log.critical(e)
+        finally:
+            self._h_get_symbol_info.record_since(t0)
+            self._record_request(endpoint='get_symbol_info', priority=RequestPriority.BALANCE)
         return None
 
     def get_asset_balance(self, asset: str, tag: str, p=8) -> AssetBalance:
+        last_balance = self._last_asset_balances.get(asset)
+        if last_balance is not None \
+                and not self.request_weight.can_send(endpoint='get_asset_balance', priority=RequestPriority.BALANCE):
+            log.warning(f'{asset} balance read deferred: last balance read used')
+            return AssetBalance(name=asset, free=last_balance.free, locked=last_balance.locked, tag=tag, precision=p)
+        t0 = perf_counter_ns()
         try:
             d = self.client.get_asset_balance(asset)
             free = float(d.get('free'))
             locked = float(d.get('locked'))
-            return AssetBalance(name=asset, free=free, locked=locked, tag=tag, precision=p)
+            balance = AssetBalance(name=asset, free=free, locked=locked, tag=tag, precision=p)
+            self._last_asset_balances[asset] = balance
+            return balance
         except (BinanceAPIException, BinanceRequestException) as e:
+            self._check_rate_limit_error(e)
             log.critical(e)
+        finally:
+            self._h_get_asset_balance.record_since(t0)
+            self._record_request(endpoint='get_asset_balance', priority=RequestPriority.BALANCE)
 
     def get_cmp(self, symbol: str) -> float:
-        cmp = self.client.get_avg_price(symbol=symbol)
-        return float(cmp['price'])
+        last_price = self._last_avg_prices.get(symbol)
+        if last_price is not None \
+                and not self.request_weight.can_send(endpoint='get_avg_price', priority=RequestPriority.BALANCE):
+            log.warning(f'{symbol} price read deferred: last price read used')
+            return last_price
+        t0 = perf_counter_ns()
+        try:
+            cmp = self.client.get_avg_price(symbol=symbol)
+        finally:
+            self._h_get_avg_price.record_since(t0)
+            self._record_request(endpoint='get_avg_price', priority=RequestPriority.BALANCE)
+        price = float(cmp['price'])
+        self._last_avg_prices[symbol] = price
+        return price
 
     def cancel_orders(self, orders: List[Order]):
+        # cancels reduce risk: always sent, whatever the request weight used
         log.info('********** CANCELLING PLACED ORDER(S) **********')
         for order in orders:
+            t0 = perf_counter_ns()
             try:
                 d = self.client.cancel_order(symbol='BTCEUR', origClientOrderId=order.uid)
                 log.info(f'** ORDER CANCELLED IN BINANCE {order}')
             except (BinanceAPIException, BinanceRequestException) as e:
+                self._check_rate_limit_error(e)
                 log.critical(e)
+            finally:
+                self._h_cancel_order.record_since(t0)
+                self._record_request(endpoint='cancel_order', priority=RequestPriority.CANCEL)
+
+    def _record_request(self, endpoint: str, priority: RequestPriority) -> None:
+        # used weight reported by binance in the last response headers (fake client: local cost model only)
+        response = getattr(self.client, 'response', None)
+        used_weight = response.headers.get(K_WEIGHT_HEADER) if response is not None else None
+        self.request_weight.record(
+            endpoint=endpoint, priority=priority, used_weight=int(used_weight) if used_weight else None)
+
+    def _check_rate_limit_error(self, e: Exception) -> None:
+        # 429: request limit exceeded (back off or be banned), 418: ip banned
+        if getattr(e, 'status_code', None) in (429, 418):
+            retry_after = e.response.headers.get('Retry-After')
+            self.request_weight.set_retry_after(secs=float(retry_after) if retry_after else K_WEIGHT_WINDOW)
+            log.critical(f'request limit exceeded, only cancels for the next {retry_after or K_WEIGHT_WINDOW} secs')
 
     # ********** binance configuration methods **********
 
-    def set_client(self, client_mode) -> (Union[Client, FakeClient], bool):
-        client: Union[Client, FakeClient]
+    def set_client(self, client_mode) -> (Union['Client', FakeClient], bool):
+        client: Union['Client', FakeClient]
         is_simulator_mode = False
         if client_mode == 'binance':
             api_keys = {
                 "key": "JkbTNxP0s6x6ovKcHTWYzDzmzLuKLh6g9gjwHmvAdh8hpsOAbHzS9w9JuyYD9mPf",
                 "secret": "IWjjdrYPyaWK4yMyYPIRhdiS0I7SSyrhb7HIOj4vjDcaFMlbZ1ygR6I8TZMUQ3mW"
             }
-            client = Client(api_keys['key'], api_keys['secret'])
-        elif client_mode == 'simulated':
+            from binance.client import Client
+            from requests.exceptions import ConnectionError, ReadTimeout
+            self._network_errors = (ConnectionError, ReadTimeout)
+            if self.api_url:
+                # the client pings the api when created: url set in the class
+                client = type('LocalClient', (Client,), dict(API_URL=self.api_url))(api_keys['key'], api_keys['secret'])
+            else:
+                client = Client(api_keys['key'], api_keys['secret'])
+        elif client_mode in ['simulated', 'shadow']:
+            # shadow: cmp not generated, fed from a live stream (feed_tick)
+            is_generator = client_mode == 'simulated' and self.threaded
+            if is_generator:
+                mode = FakeCmpMode.MODE_REPLAY if self.replay_source else FakeCmpMode.MODE_GENERATOR
+            else:
+                mode = FakeCmpMode.MODE_MANUAL
             client = FakeClient(
                 user_socket_callback=self.binance_user_socket_callback,
                 symbol_ticker_callback=self.binance_symbol_ticker_callback,
-                mode=FakeCmpMode.MODE_GENERATOR
+                cmp=self.initial_cmp,
+                mode=mode,
+                replay_source=self.replay_source,
+                book_ticker_callback=(self.binance_book_ticker_callback
+                                      if self.ticker_stream_mode == TickerStreamMode.BOOK_TICKER else None)
             )
             is_simulator_mode = True
         else:
@@ -214,28 +477,44 @@ class Market:
         return client, is_simulator_mode
 
     def _start_sockets(self):
-        # init socket manager
-        self._bsm = BinanceSocketManager(client=self.client)
+        from src.pp_binance_sockets import RawBinanceSocketManager
+        # init socket manager (frames received undecoded)
+        self._bsm = RawBinanceSocketManager(client=self.client)
+        if self.stream_url:
+            self._bsm.STREAM_URL = self.stream_url
 
-        # symbol ticker socket
-        self._symbol_ticker_s = self._bsm.start_symbol_ticker_socket(
-            symbol=self.symbol,
-            callback=self.binance_symbol_ticker_callback)
+        # symbol ticker socket (last price or best bid/ask)
+        if self.ticker_stream_mode == TickerStreamMode.BOOK_TICKER:
+            self._symbol_ticker_s = self._bsm.start_symbol_book_ticker_socket(
+                symbol=self.symbol,
+                callback=self.binance_book_ticker_raw_callback)
+        else:
+            self._symbol_ticker_s = self._bsm.start_symbol_ticker_socket(
+                symbol=self.symbol,
+                callback=self.binance_symbol_ticker_raw_callback)
 
         # user socket
         self._user_s = self._bsm.start_user_socket(
-            callback=self.binance_user_socket_callback
+            callback=self.binance_user_socket_raw_callback
         )
 
         # start sockets
         self._bsm.start()
 
     def stop(self):
+        self.tick_intake.stop()
+        log.info(f'tick intake stats: {self.tick_intake.get_stats()}')
+
+        if self.simulator_mode:
+            self.client.stop_cmp_generator()
+            return
+
         self._bsm.stop_socket(self._symbol_ticker_s)
         self._bsm.stop_socket(self._user_s)
 
         # properly close the WebSocket, only if it is running
         # trying to stop it when it is not running, will raise an error
+        from twisted.internet import reactor
         if reactor.running:
             reactor.stop()
 
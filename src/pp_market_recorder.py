@@ -0,0 +1,257 @@
+# pp_market_recorder.py
+#
+# market data recorder: ticker and user stream events appended to compressed binary segment files
+#   file:    gzip stream of K_MAGIC + records, a new segment every K_SEGMENT_SECS or K_SEGMENT_BYTES
+#   record:  kind (u8) + time (f64, epoch secs) + values
+#            TICKER: cmp (f64) - BOOK_TICKER: bid, ask (f64, f64) - USER: size (u32) + raw frame
+# segments are flushed every K_FLUSH_INTERVAL: after a crash only the last secs are lost (truncated gzip)
+
+import glob
+import gzip
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from enum import IntEnum
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from src.pp_tick_intake import Tick
+
+log = logging.getLogger('log')
+
+K_RECORD_FOLDER = 'src/database/market_data'
+K_MAGIC = b'PPMD1\n'
+K_FILE_SUFFIX = '.ppmd.gz'
+
+K_SEGMENT_SECS = 3600.0
+K_SEGMENT_BYTES = 64 << 20  # uncompressed (a segment is read at once)
+K_FLUSH_INTERVAL = 5.0  # secs
+K_COMPRESS_LEVEL = 6
+
+K_HEADER = struct.Struct('<Bd')
+K_TICKER = struct.Struct('<d')
+K_BOOK_TICKER = struct.Struct('<dd')
+K_USER = struct.Struct('<I')
+
+
+class MarketEventKind(IntEnum):
+    TICKER = 1
+    BOOK_TICKER = 2
+    USER = 3
+
+
+class MarketEvent(NamedTuple):
+    kind: MarketEventKind
+    time: float
+    values: Tuple[float, ...]  # (cmp,) or (bid, ask)
+    payload: bytes = b''  # user stream frame (json, as received)
+
+
+class MarketRecorder:
+    """Appends the market events to segment files from a background writer.
+
+    The stream callbacks only queue a tuple (no packing, compression or io in the socket threads).
+    """
+    def __init__(self,
+                 session_id: str,
+                 folder: str = K_RECORD_FOLDER,
+                 segment_secs: float = K_SEGMENT_SECS,
+                 segment_bytes: int = K_SEGMENT_BYTES,
+                 flush_interval: float = K_FLUSH_INTERVAL):
+        self.folder = os.path.join(folder, session_id)
+        self.segment_secs = segment_secs
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._file: Optional[gzip.GzipFile] = None
+        self._segment_start = 0.0
+        self._segment_size = 0
+        self.segment_count = 0
+        self.event_count = 0
+        self.bytes_written = 0  # uncompressed
+
+    def start(self) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='market-recorder', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        # everything queued so far is written before the thread ends
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout=timeout)
+
+    # ********** producers (stream callbacks) **********
+
+    def add_tick(self, tick: Tick) -> None:
+        self._queue.put((time.time(), tick))
+
+    def add_user_frame(self, payload: bytes) -> None:
+        self._queue.put((time.time(), payload))
+
+    def get_stats(self) -> dict:
+        return dict(
+            events=self.event_count,
+            bytes=self.bytes_written,
+            segments=self.segment_count,
+            queued=self._queue.qsize()
+        )
+
+    # ********** writer thread **********
+
+    def _run(self) -> None:
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item = False
+            # all the events already queued are packed in a single write
+            buffer = bytearray()
+            while isinstance(item, tuple):
+                self._pack(buffer=buffer, event_time=item[0], value=item[1])
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = False
+            if buffer:
+                self._write(data=buffer)
+            if item is not False or time.monotonic() >= next_flush:
+                # flush interval elapsed, flush requested or stop
+                if self._file:
+                    self._file.flush()
+                next_flush = time.monotonic() + self.flush_interval
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                self._close_segment()
+                return
+
+    def _pack(self, buffer: bytearray, event_time: float, value) -> None:
+        self.event_count += 1
+        if isinstance(value, float):
+            buffer += K_HEADER.pack(MarketEventKind.TICKER, event_time)
+            buffer += K_TICKER.pack(value)
+        elif isinstance(value, tuple):
+            buffer += K_HEADER.pack(MarketEventKind.BOOK_TICKER, event_time)
+            buffer += K_BOOK_TICKER.pack(*value)
+        else:
+            buffer += K_HEADER.pack(MarketEventKind.USER, event_time)
+            buffer += K_USER.pack(len(value))
+            buffer += value
+
+    def _write(self, data: bytearray) -> None:
+        now = time.time()
+        if self._file is None or now - self._segment_start >= self.segment_secs \
+                or self._segment_size >= self.segment_bytes:
+            self._close_segment()
+            self._open_segment(now=now)
+        try:
+            self._file.write(data)
+            self._segment_size += len(data)
+            self.bytes_written += len(data)
+        except OSError as e:
+            log.critical(f'error recording {len(data)} bytes of market data: {e}')
+
+    def _open_segment(self, now: float) -> None:
+        self.segment_count += 1
+        file_name = os.path.join(
+            self.folder, f'md-{datetime.fromtimestamp(now).strftime("%Y%m%d_%H%M%S")}-{self.segment_count:04}'
+                         f'{K_FILE_SUFFIX}')
+        self._file = gzip.open(file_name, 'wb', compresslevel=K_COMPRESS_LEVEL)
+        self._file.write(K_MAGIC)
+        self._segment_start = now
+        self._segment_size = 0
+
+    def _close_segment(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+# ********** reading **********
+
+def get_segment_files(folder: str) -> List[str]:
+    # segments of a recording folder in time order
+    return sorted(glob.glob(os.path.join(folder, f'*{K_FILE_SUFFIX}')))
+
+
+def read_events(file_names: List[str]) -> Iterator[MarketEvent]:
+    for file_name in file_names:
+        try:
+            with gzip.open(file_name, 'rb') as f:
+                data = f.read()
+        except (EOFError, zlib.error):
+            # segment not closed (crash): the data up to the last flush is readable
+            data = _read_truncated(file_name=file_name)
+        if not data.startswith(K_MAGIC):
+            log.critical(f'not a market data file: {file_name}')
+            continue
+        yield from _get_events(data=data, offset=len(K_MAGIC))
+
+
+def _read_truncated(file_name: str) -> bytes:
+    with open(file_name, 'rb') as f:
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        return decompressor.decompress(f.read())
+
+
+def _get_events(data: bytes, offset: int) -> Iterator[MarketEvent]:
+    size = len(data)
+    while offset + K_HEADER.size <= size:
+        kind, event_time = K_HEADER.unpack_from(data, offset)
+        offset += K_HEADER.size
+        if kind == MarketEventKind.TICKER:
+            if offset + K_TICKER.size > size:
+                return
+            yield MarketEvent(MarketEventKind.TICKER, event_time, K_TICKER.unpack_from(data, offset))
+            offset += K_TICKER.size
+        elif kind == MarketEventKind.BOOK_TICKER:
+            if offset + K_BOOK_TICKER.size > size:
+                return
+            yield MarketEvent(MarketEventKind.BOOK_TICKER, event_time, K_BOOK_TICKER.unpack_from(data, offset))
+            offset += K_BOOK_TICKER.size
+        elif kind == MarketEventKind.USER:
+            if offset + K_USER.size > size:
+                return
+            (length,) = K_USER.unpack_from(data, offset)
+            offset += K_USER.size
+            if offset + length > size:
+                return
+            yield MarketEvent(MarketEventKind.USER, event_time, (), bytes(data[offset:offset + length]))
+            offset += length
+        else:
+            log.critical(f'unknown market event kind {kind} at offset {offset}')
+            return
+
+
+class ReplaySource:
+    """Recorded prices for the fake client (FakeCmpMode.MODE_REPLAY): cmp of each ticker event,
+    or mid price of each book ticker event, replayed with the recorded timing divided by speed (0: no wait).
+    """
+    def __init__(self, file_names: List[str], speed: float = 1.0):
+        self.file_names = file_names
+        self.speed = speed
+
+    @staticmethod
+    def from_folder(folder: str, speed: float = 1.0) -> 'ReplaySource':
+        return ReplaySource(file_names=get_segment_files(folder=folder), speed=speed)
+
+    def get_ticks(self) -> Iterator[Tuple[float, float]]:
+        # (time, cmp)
+        for event in read_events(file_names=self.file_names):
+            if event.kind == MarketEventKind.TICKER:
+                yield event.time, event.values[0]
+            elif event.kind == MarketEventKind.BOOK_TICKER:
+                yield event.time, (event.values[0] + event.values[1]) / 2
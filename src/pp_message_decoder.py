@@ -0,0 +1,73 @@
+# pp_message_decoder.py
+
+import logging
+from typing import Optional
+
+import ujson
+
+log = logging.getLogger('log')
+
+# all binance stream frames start with the event type: {"e":"24hrTicker","E":...
+K_EVENT_TYPE_PREFIX = b'{"e":"'
+
+
+def decode_frame(payload: bytes) -> Optional[dict]:
+    try:
+        return ujson.loads(payload)
+    except ValueError as e:
+        log.critical(f'invalid frame received: {payload[:100]} ({e})')
+        return None
+
+
+def get_event_type(payload: bytes) -> Optional[bytes]:
+    # event type without decoding the whole frame
+    if payload.startswith(K_EVENT_TYPE_PREFIX):
+        start = len(K_EVENT_TYPE_PREFIX)
+        end = payload.find(b'"', start)
+        if end > 0:
+            return payload[start:end]
+    return None
+
+
+def get_field_tag(key: str) -> bytes:
+    # precomputed once by the caller: 'c' -> b'"c":"'
+    return b'"' + key.encode() + b'":"'
+
+
+def get_number_tag(key: str) -> bytes:
+    # numeric (not quoted) fields: 'E' -> b'"E":'
+    return b'"' + key.encode() + b'":'
+
+
+def get_int_field(payload: bytes, tag: bytes) -> Optional[int]:
+    start = payload.find(tag)
+    if start < 0:
+        return None
+    start += len(tag)
+    end = start
+    while end < len(payload) and 48 <= payload[end] <= 57:  # digits
+        end += 1
+    return int(payload[start:end]) if end > start else None
+
+
+def get_str_field(payload: bytes, tag: bytes) -> Optional[bytes]:
+    # value of a string field ("key":"value") without decoding the whole frame
+    # only valid for flat frames with single character keys, as the binance ticker ones
+    start = payload.find(tag)
+    if start < 0:
+        return None
+    start += len(tag)
+    end = payload.find(b'"', start)
+    if end < 0:
+        return None
+    return payload[start:end]
+
+
+def get_float_field(payload: bytes, tag: bytes) -> Optional[float]:
+    value = get_str_field(payload=payload, tag=tag)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
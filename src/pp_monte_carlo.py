@@ -0,0 +1,246 @@
+# pp_monte_carlo.py
+#
+# monte carlo risk of the pt strategy: the grid screener run on thousands of price paths
+#   paths:   random walk (fake client steps), block bootstrap of recorded returns or regime switching
+#            generated with numpy per chunk of paths, in the worker processes (only the results are sent back)
+#   report:  distributions of equity, balances, max locked eur/btc, concentrations and time to liquidity
+#            exhaustion (first tick with a total below BalanceManager buffer + min balance)
+#   $> python -m src.pp_monte_carlo --model regime --paths 2000 --steps 86400
+
+import argparse
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from src.pp_grid_screener import GridConfig, GridScreener, PricePath, ScreenResult
+from src.pp_fake_client import K_INITIAL_CMP
+from src.pp_market_recorder import ReplaySource
+
+log = logging.getLogger('log')
+
+K_STEP_VALUES = [-20, -10, -5, 0, 5, 10, 20]  # see FakeClient._cmp_generator
+K_CHUNK_PATHS = 16  # paths per task (fixed, so that the results do not depend on the processes count)
+K_BLOCK_SIZE = 600  # ticks per bootstrap block (keeps the short term autocorrelation)
+K_PERCENTILES = [5, 25, 50, 75, 95]
+K_METRICS = ['equity_delta', 'eur', 'btc', 'max_eur_locked', 'max_btc_locked', 'pt_created_count',
+             'completed_pt_count', 'concentration_count']
+
+
+class Regime(NamedTuple):
+    drift: float  # mean log return per tick
+    volatility: float  # std of the log return per tick
+    mean_duration: float  # ticks
+
+
+K_REGIMES = [
+    Regime(drift=0.0, volatility=0.0002, mean_duration=3_600),  # range
+    Regime(drift=4e-6, volatility=0.0002, mean_duration=1_800),  # up trend
+    Regime(drift=-4e-6, volatility=0.0002, mean_duration=1_800),  # down trend
+    Regime(drift=0.0, volatility=0.0006, mean_duration=600),  # volatile
+]
+
+
+# ********** price path models **********
+
+class RandomWalkModel:
+    """Steps drawn from the fake client step values."""
+    def __init__(self, start: float = K_INITIAL_CMP, steps: int = 86_400, step_values: Optional[List[float]] = None):
+        self.start = start
+        self.steps = steps
+        self.step_values = np.asarray(step_values if step_values is not None else K_STEP_VALUES, dtype=float)
+
+    def get_paths(self, n_paths: int, rng: np.random.Generator) -> np.ndarray:
+        paths = rng.choice(self.step_values, size=(n_paths, self.steps))
+        np.cumsum(paths, axis=1, out=paths)
+        paths += self.start
+        return paths
+
+
+class BootstrapModel:
+    """Blocks of recorded tick log returns, drawn with replacement and chained from the start price."""
+    def __init__(self, returns: np.ndarray, start: float = K_INITIAL_CMP, steps: int = 86_400,
+                 block_size: int = K_BLOCK_SIZE):
+        self.returns = np.ascontiguousarray(returns, dtype=np.float64)
+        self.start = start
+        self.steps = steps
+        self.block_size = min(block_size, len(self.returns))
+        if self.block_size < 1:
+            raise ValueError('no returns to bootstrap')
+
+    @staticmethod
+    def from_prices(prices: Union[np.ndarray, List[float]], **kwargs) -> 'BootstrapModel':
+        prices = np.asarray(prices, dtype=np.float64)
+        return BootstrapModel(returns=np.diff(np.log(prices)), **kwargs)
+
+    @staticmethod
+    def from_recording(folder: str, **kwargs) -> 'BootstrapModel':
+        # recorded session (MarketRecorder folder)
+        source = ReplaySource.from_folder(folder=folder, speed=0)
+        prices = np.fromiter((cmp for _, cmp in source.get_ticks()), dtype=np.float64)
+        return BootstrapModel.from_prices(prices=prices, **kwargs)
+
+    def get_paths(self, n_paths: int, rng: np.random.Generator) -> np.ndarray:
+        size = self.block_size
+        n_blocks = -(-self.steps // size)
+        starts = rng.integers(0, len(self.returns) - size + 1, size=(n_paths, n_blocks))
+        index = (starts[:, :, None] + np.arange(size)).reshape(n_paths, n_blocks * size)[:, :self.steps]
+        return _get_prices(start=self.start, log_returns=self.returns[index])
+
+
+class RegimeModel:
+    """Markov regime switching: each regime lasts a geometric number of ticks (mean_duration),
+    then another one is chosen at random (uniform), with gaussian log returns of the regime in between.
+    """
+    def __init__(self, regimes: Optional[List[Regime]] = None, start: float = K_INITIAL_CMP, steps: int = 86_400):
+        self.regimes = regimes if regimes is not None else K_REGIMES
+        self.start = start
+        self.steps = steps
+
+    def get_states(self, n_paths: int, rng: np.random.Generator) -> np.ndarray:
+        # regime of each tick (n_paths x steps), per path one segment at a time
+        n = len(self.regimes)
+        leave = np.array([1.0 / max(1.0, r.mean_duration) for r in self.regimes])
+        states = np.empty((n_paths, self.steps), dtype=np.int8)
+        for i in range(n_paths):
+            tick = 0
+            state = int(rng.integers(n))
+            while tick < self.steps:
+                duration = int(rng.geometric(leave[state]))
+                states[i, tick:tick + duration] = state
+                tick += duration
+                if n > 1:
+                    state = (state + int(rng.integers(1, n))) % n  # any other regime
+        return states
+
+    def get_paths(self, n_paths: int, rng: np.random.Generator) -> np.ndarray:
+        states = self.get_states(n_paths=n_paths, rng=rng)
+        drift = np.array([r.drift for r in self.regimes])
+        volatility = np.array([r.volatility for r in self.regimes])
+        log_returns = rng.standard_normal(size=states.shape)
+        log_returns *= volatility[states]
+        log_returns += drift[states]
+        return _get_prices(start=self.start, log_returns=log_returns)
+
+
+def _get_prices(start: float, log_returns: np.ndarray) -> np.ndarray:
+    # rounded to the exchange tick size [EUR]
+    paths = np.cumsum(log_returns, axis=1)
+    np.exp(paths, out=paths)
+    paths *= start
+    return np.round(paths, 2, out=paths)
+
+
+# ********** evaluation **********
+
+def _run_chunk(model, config: GridConfig, n_paths: int, seed: np.random.SeedSequence) -> List[ScreenResult]:
+    # worker: paths of the chunk generated at once, fills not sent back
+    paths = model.get_paths(n_paths=n_paths, rng=np.random.default_rng(seed))
+    return [GridScreener(path=PricePath(prices=prices), config=config).run()._replace(fills=())
+            for prices in paths]
+
+
+def run_monte_carlo(model, config: GridConfig = GridConfig(), n_paths: int = 1_000, seed: int = 0,
+                    processes: Optional[int] = None) -> 'MonteCarloReport':
+    # processes: 1 runs in this process, None one per cpu
+    t_start = time.perf_counter()
+    chunks = [min(K_CHUNK_PATHS, n_paths - i) for i in range(0, n_paths, K_CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    configs = [config] * len(chunks)
+    models = [model] * len(chunks)
+    if processes == 1:
+        chunk_results = map(_run_chunk, models, configs, chunks, seeds)
+        results = [r for chunk in chunk_results for r in chunk]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunk_results = executor.map(_run_chunk, models, configs, chunks, seeds)
+            results = [r for chunk in chunk_results for r in chunk]
+    seconds = time.perf_counter() - t_start
+    log.info(f'monte carlo: {n_paths} paths x {model.steps} ticks in {seconds:.1f} secs')
+    return MonteCarloReport(results=results, steps=model.steps, seconds=seconds)
+
+
+class MonteCarloReport:
+    def __init__(self, results: List[ScreenResult], steps: int, seconds: float = 0.0):
+        self.results = results
+        self.steps = steps
+        self.seconds = seconds
+
+    def get_values(self, metric: str) -> np.ndarray:
+        return np.array([getattr(r, metric) for r in self.results], dtype=np.float64)
+
+    def get_exhausted_ticks(self) -> np.ndarray:
+        # first tick with eur or btc below buffer + min balance, -1 when never
+        eur = self.get_values('eur_exhausted_tick')
+        btc = self.get_values('btc_exhausted_tick')
+        return np.where(eur < 0, btc, np.where(btc < 0, eur, np.minimum(eur, btc)))
+
+    @staticmethod
+    def get_distribution(values: np.ndarray) -> dict:
+        if len(values) == 0:
+            return dict(count=0)
+        percentiles = np.percentile(values, K_PERCENTILES)
+        d = dict(count=len(values), mean=float(values.mean()), min=float(values.min()))
+        d.update({f'p{p}': float(v) for p, v in zip(K_PERCENTILES, percentiles)})
+        d['max'] = float(values.max())
+        return d
+
+    def get_summary(self) -> Dict[str, dict]:
+        summary = {metric: self.get_distribution(self.get_values(metric)) for metric in K_METRICS}
+        n = len(self.results)
+        for name, ticks in [('eur_exhausted_tick', self.get_values('eur_exhausted_tick')),
+                            ('btc_exhausted_tick', self.get_values('btc_exhausted_tick')),
+                            ('exhausted_tick', self.get_exhausted_ticks())]:
+            # time to exhaustion of the exhausted paths only, with the share of them
+            exhausted = ticks[ticks >= 0]
+            summary[name] = dict(self.get_distribution(exhausted), probability=len(exhausted) / n if n else 0.0)
+        return summary
+
+    def get_table(self) -> str:
+        summary = self.get_summary()
+        columns = ['mean', 'min'] + [f'p{p}' for p in K_PERCENTILES] + ['max']
+        lines = [f'paths: {len(self.results)} - ticks: {self.steps} - secs: {self.seconds:.1f}',
+                 f'{"":20}' + ''.join(f'{c:>12}' for c in columns) + f'{"prob":>8}']
+        for metric, d in summary.items():
+            cells = ''.join(f'{d[c]:>12,.4f}' if d.get('count') else f'{"-":>12}' for c in columns)
+            probability = f'{d["probability"]:>8.1%}' if 'probability' in d else ''
+            lines.append(f'{metric:20}{cells}{probability}')
+        return '\n'.join(lines)
+
+
+def get_model(name: str, steps: int, start: float, record_folder: Optional[str] = None):
+    if name == 'walk':
+        return RandomWalkModel(start=start, steps=steps)
+    elif name == 'bootstrap':
+        if not record_folder:
+            raise ValueError('bootstrap model needs a recording folder')
+        return BootstrapModel.from_recording(folder=record_folder, start=start, steps=steps)
+    elif name == 'regime':
+        return RegimeModel(start=start, steps=steps)
+    raise ValueError(f'unknown model {name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='monte carlo risk of the pt strategy')
+    parser.add_argument('--model', choices=['walk', 'bootstrap', 'regime'], default='walk')
+    parser.add_argument('--record-folder', help='recorded session folder (bootstrap model)')
+    parser.add_argument('--paths', type=int, default=1_000)
+    parser.add_argument('--steps', type=int, default=86_400, help='ticks per path')
+    parser.add_argument('--start', type=float, default=K_INITIAL_CMP)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    model = get_model(name=args.model, steps=args.steps, start=args.start, record_folder=args.record_folder)
+    report = run_monte_carlo(model=model, n_paths=args.paths, seed=args.seed, processes=args.processes)
+    print(report.get_table())
+    print(f'{math.floor(len(report.results) * args.steps / max(report.seconds, 1e-9)):,} ticks/sec')
+
+
+if __name__ == '__main__':
+    main()
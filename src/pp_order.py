@@ -4,6 +4,7 @@ import logging
 import secrets
 from datetime import datetime
 from enum import Enum
+from typing import Optional
 from binance import enums as k_binance
 
 log = logging.getLogger('log')
@@ -80,21 +81,24 @@ class Order:
     def get_new_uid() -> str:
         return secrets.token_hex(8)
 
-    def is_ready_for_placement(self, cmp: float, min_dist: float) -> bool:
-        return self.get_distance(cmp=cmp) < min_dist
+    def is_ready_for_placement(self, cmp: float, min_dist: float,
+                               bid: Optional[float] = None, ask: Optional[float] = None) -> bool:
+        return self.get_distance(cmp=cmp, bid=bid, ask=ask) < min_dist
 
-    def is_isolated(self, cmp:float, max_dist: float) -> bool:
-        return self.get_distance(cmp=cmp) > max_dist
+    def is_isolated(self, cmp: float, max_dist: float,
+                    bid: Optional[float] = None, ask: Optional[float] = None) -> bool:
+        return self.get_distance(cmp=cmp, bid=bid, ask=ask) > max_dist
 
-    def get_distance(self, cmp: float) -> float:
-        # return abs(cmp - self.price)
+    def get_distance(self, cmp: float, bid: Optional[float] = None, ask: Optional[float] = None) -> float:
+        # when the book ticker is available the touch price that would trade the order is used:
+        # a buy order is filled against the best ask and a sell order against the best bid
         if self.k_side == k_binance.SIDE_BUY:
-            return cmp - self.price
+            return (cmp if ask is None else ask) - self.price
         else:
-            return self.price - cmp
+            return self.price - (cmp if bid is None else bid)
 
-    def get_abs_distance(self, cmp: float) -> float:
-        return abs(self.get_distance(cmp))
+    def get_abs_distance(self, cmp: float, bid: Optional[float] = None, ask: Optional[float] = None) -> float:
+        return abs(self.get_distance(cmp=cmp, bid=bid, ask=ask))
 
     def get_price_str(self, precision: int = 2) -> str:
         price = '{:0.0{}f}'.format(self.price, precision)  # 2 for EUR
@@ -116,6 +120,16 @@ class Order:
     def get_signed_total(self) -> float:
         return - (self.price * self.get_signed_amount())
 
+    def set_price(self, price: float) -> None:
+        # the signed values are kept consistent with price and amount
+        self.price = price
+        self.signed_total = self.get_signed_total()
+
+    def set_amount(self, amount: float) -> None:
+        self.amount = amount
+        self.signed_amount = self.get_signed_amount()
+        self.signed_total = self.get_signed_total()
+
     def get_momentum(self, cmp: float):
         return abs(self.amount * (cmp - self.price))
 
@@ -0,0 +1,170 @@
+# pp_order_exporter.py
+
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, date
+from enum import Enum
+from time import monotonic
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from src.pp_order import Order
+
+# pyarrow is optional, only needed once the export is enabled
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+log = logging.getLogger('log')
+
+K_EXPORT_FOLDER = 'src/database/export'
+
+# rows of a partition buffered before being written to a new file (one row group)
+K_BATCH_ROWS = 50_000
+# max secs a row stays buffered: the files of a session are readable at most this time after the event
+K_FLUSH_INTERVAL = 60.0
+K_COMPRESSION = 'zstd'
+
+# columns of each table (session_id and date are not stored in the files, they are the partition keys)
+K_ORDERS_COLUMNS = [
+    ('time', 'timestamp[us]'), ('event', 'string'), ('ticker_count', 'int64'), ('cmp', 'double'),
+    ('uid', 'string'), ('pt_id', 'string'), ('order_id', 'string'), ('name', 'string'), ('k_side', 'string'),
+    ('price', 'double'), ('amount', 'double'), ('signed_amount', 'double'), ('signed_total', 'double'),
+    ('bnb_commission', 'double'), ('btc_commission', 'double'), ('status_name', 'string'),
+    ('traded_cycle', 'int64'), ('compensation_count', 'int64'), ('split_count', 'int64'),
+    ('concentration_count', 'int64'), ('creation', 'timestamp[us]')
+]
+K_TICKS_COLUMNS = [
+    ('time', 'timestamp[us]'), ('ticker_count', 'int64'), ('cmp', 'double'), ('bid', 'double'), ('ask', 'double'),
+    ('monitor_count', 'int64'), ('placed_count', 'int64'), ('pt_created_count', 'int64'), ('buy_count', 'int64'),
+    ('sell_count', 'int64'), ('tick_us', 'double')
+]
+K_TABLES = dict(orders=K_ORDERS_COLUMNS, ticks=K_TICKS_COLUMNS)
+
+
+class ExportEvent(Enum):
+    PLACED = 1
+    TRADED = 2
+    CONCENTRATED = 3
+
+
+class OrderExporter:
+    """Streams the order events and per-tick metrics of a session to parquet files.
+
+    Rows are queued by the session loop (a tuple per row) and written in batches by a background thread,
+    partitioned as <folder>/<table>/session_id=<id>/date=<yyyy-mm-dd>/part-*.parquet (hive layout).
+    pyarrow is only imported by the writer thread.
+    """
+    def __init__(self,
+                 session_id: str,
+                 folder: str = K_EXPORT_FOLDER,
+                 batch_rows: int = K_BATCH_ROWS,
+                 flush_interval: float = K_FLUSH_INTERVAL):
+        self.session_id = session_id
+        self.folder = folder
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._file_count = 0
+        self.rows_exported = dict(orders=0, ticks=0)
+        self.files_written = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='order-exporter', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        # everything queued so far is written before the thread ends
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        # write all the buffered rows now (blocking until written)
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout=timeout)
+
+    # ********** producers (session loop) **********
+
+    def add_order_event(self, event: ExportEvent, order: Order, ticker_count: int, cmp: float) -> None:
+        self._queue.put(('orders', (
+            datetime.now(), event.name.lower(), ticker_count, cmp,
+            order.uid, order.pt_id, order.order_id, order.name, order.k_side,
+            order.price, order.amount, order.signed_amount, order.signed_total,
+            order.bnb_commission, order.btc_commission, order.status_name,
+            order.traded_cycle, order.compensation_count, order.split_count,
+            order.concentration_count, order.creation)))
+
+    def add_tick(self,
+                 ticker_count: int,
+                 cmp: float,
+                 bid: Optional[float],
+                 ask: Optional[float],
+                 monitor_count: int,
+                 placed_count: int,
+                 pt_created_count: int,
+                 buy_count: int,
+                 sell_count: int,
+                 tick_us: float) -> None:
+        self._queue.put(('ticks', (
+            datetime.now(), ticker_count, cmp, bid, ask, monitor_count, placed_count,
+            pt_created_count, buy_count, sell_count, tick_us)))
+
+    # ********** writer thread **********
+
+    def _run(self) -> None:
+        buffers: Dict[Tuple[str, date], List[tuple]] = {}
+        deadline = monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - monotonic()))
+            except queue.Empty:
+                item = False
+            if isinstance(item, tuple):
+                table, row = item
+                key = (table, row[0].date())
+                rows = buffers.setdefault(key, [])
+                rows.append(row)
+                if len(rows) >= self.batch_rows:
+                    self._write(table=table, day=key[1], rows=buffers.pop(key))
+                if monotonic() < deadline:
+                    continue
+            # flush interval elapsed, flush requested or stop
+            for (table, day), rows in buffers.items():
+                self._write(table=table, day=day, rows=rows)
+            buffers = {}
+            deadline = monotonic() + self.flush_interval
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _write(self, table: str, day: date, rows: List[tuple]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = K_TABLES[table]
+        schema = pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in columns])
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+        folder = os.path.join(self.folder, table, f'session_id={self.session_id}', f'date={day.isoformat()}')
+        self._file_count += 1
+        file_name = os.path.join(folder, f'part-{datetime.now().strftime("%H%M%S")}-{self._file_count:05}.parquet')
+        try:
+            os.makedirs(folder, exist_ok=True)
+            pq.write_table(pa.Table.from_arrays(arrays, schema=schema), file_name, compression=K_COMPRESSION)
+            self.rows_exported[table] += len(rows)
+            self.files_written += 1
+        except (OSError, pa.ArrowException) as e:
+            log.critical(f'error exporting {len(rows)} {table} rows to {file_name}: {e}')
+
+
+def read_export(table: str,
+                folder: str = K_EXPORT_FOLDER,
+                columns: Optional[List[str]] = None,
+                filters: Optional[list] = None) -> 'pa.Table':
+    # offline analysis: only the columns requested are read and the partitions not matching filters are skipped
+    # e.g. read_export('orders', columns=['price', 'amount'], filters=[('session_id', '=', 'S_20211001_1200')])
+    import pyarrow.parquet as pq
+    return pq.read_table(os.path.join(folder, table), columns=columns, filters=filters, partitioning='hive')
@@ -1,17 +1,45 @@
 # pp_pending_orders_book.py
 
-import pandas as pd
+import bisect
+import heapq
 import logging
-from typing import List
+import math
+from itertools import chain
+from typing import List, Callable, Dict, Tuple, NamedTuple, Optional, TYPE_CHECKING
 from enum import Enum
 from binance import enums as k_binance
 
 from src.pp_order import Order, OrderStatus
 from src.xb_pt_calculator import get_compensation
-from polaris_old.pp_dbmanager import DBManager
+from src.xb_exact_sum import ExactSum
+
+# pandas and the legacy DBManager are only imported by the dataframe methods (dashboard)
+if TYPE_CHECKING:
+    import pandas as pd
 
 log = logging.getLogger('log')
 
+K_BAND_WIDTH = 50.0  # EUR, price bands of the running aggregates
+
+# kpi chart: compensation pair for each gap of the pending orders farther than the min distance
+K_KPI_GAPS = [100, 200, 300, 400, 500]
+K_KPI_MIN_DISTANCE = 50.0
+
+
+class PendingBand:
+    # running exact aggregates of the pending orders of one side with price in a band
+    def __init__(self):
+        self.amount = ExactSum()
+        self.total = ExactSum()
+        self.orders: Dict[str, Tuple[float, float, float]] = {}  # uid: (price, signed_amount, signed_total)
+
+
+class BandSnapshot(NamedTuple):
+    # immutable copy of a band, summed exactly later
+    amount: Tuple[float, ...]  # partials
+    total: Tuple[float, ...]
+    orders: Tuple[Tuple[float, float, float], ...]
+
 
 class PendingOrdersBook:
     def __init__(self, orders: List[Order]):
@@ -21,23 +49,132 @@ class PendingOrdersBook:
 
         self.concentrated_count = 1
 
+        # called each time an order enters or leaves the monitor list
+        self._on_monitor_added: List[Callable[[Order], None]] = []
+        self._on_monitor_removed: List[Callable[[Order], None]] = []
+
+        # signed amount & total of the pending orders (monitor + placed), overall and per (k_side, price band)
+        # updated on every change, with the values of each order as indexed (subtracted when it leaves the book)
+        self.signed_amount = ExactSum()
+        self.signed_total = ExactSum()
+        self._bands: Dict[Tuple[str, int], PendingBand] = {}
+        self._band_keys: Dict[str, Tuple[str, int]] = {}  # uid: band key
+
+        # monitor orders sorted by price and by amount, as (value, seq) with seq the order of entry in the
+        # monitor list (ties resolved as the list order): extreme price and top momentum queries without sorting
+        self._monitor_seq = 0
+        self._monitor_by_seq: Dict[int, Order] = {}
+        self._monitor_keys: Dict[str, Tuple[Tuple[float, int], Tuple[float, int]]] = {}  # uid: (price key, amount key)
+        self._monitor_by_price: List[Tuple[float, int]] = []
+        self._monitor_by_amount: List[Tuple[float, int]] = []
+
         # add each order to its appropriate list
         for order in orders:
             self.monitor.append(order)
+            self._index(order)
+            self._index_monitor(order)
 
-    def get_monitor_df(self) -> pd.DataFrame:
+    def get_monitor_df(self) -> 'pd.DataFrame':
+        import pandas as pd
         df = pd.DataFrame(data=self.monitor)
         return df
 
+    def add_monitor_listener(self,
+                             on_added: Callable[[Order], None],
+                             on_removed: Callable[[Order], None]) -> None:
+        # the monitor list must only be changed through the methods below for the listeners to be called
+        self._on_monitor_added.append(on_added)
+        self._on_monitor_removed.append(on_removed)
+
+    def _notify_added(self, order: Order) -> None:
+        for callback in self._on_monitor_added:
+            callback(order)
+
+    def _notify_removed(self, order: Order) -> None:
+        for callback in self._on_monitor_removed:
+            callback(order)
+
+    # ********** running aggregates **********
+
+    def _index(self, order: Order) -> None:
+        key = (order.k_side, math.floor(order.price / K_BAND_WIDTH))
+        band = self._bands.get(key)
+        if band is None:
+            band = self._bands[key] = PendingBand()
+        amount = order.get_signed_amount()
+        total = order.get_signed_total()
+        band.amount.add(amount)
+        band.total.add(total)
+        band.orders[order.uid] = (order.price, amount, total)
+        self.signed_amount.add(amount)
+        self.signed_total.add(total)
+        self._band_keys[order.uid] = key
+
+    def _unindex(self, order: Order) -> None:
+        key = self._band_keys.pop(order.uid)
+        band = self._bands[key]
+        _, amount, total = band.orders.pop(order.uid)
+        if band.orders:
+            band.amount.subtract(amount)
+            band.total.subtract(total)
+        else:
+            del self._bands[key]
+        self.signed_amount.subtract(amount)
+        self.signed_total.subtract(total)
+
+    def get_signed_balance(self) -> (float, float):
+        # equivalent (amount, total) of all the pending orders
+        return self.signed_amount.get_value(), self.signed_total.get_value()
+
+    def get_bands_snapshot(self) -> Dict[Tuple[str, int], BandSnapshot]:
+        return {key: BandSnapshot(amount=band.amount.get_partials(),
+                                  total=band.total.get_partials(),
+                                  orders=tuple(band.orders.values()))
+                for key, band in self._bands.items()}
+
+    def _index_monitor(self, order: Order, seq: Optional[int] = None) -> None:
+        # a new seq when entering the monitor list (appended), the previous one when only re-indexed
+        if seq is None:
+            self._monitor_seq += 1
+            seq = self._monitor_seq
+        price_key = (order.price, seq)
+        amount_key = (order.amount, seq)
+        bisect.insort(self._monitor_by_price, price_key)
+        bisect.insort(self._monitor_by_amount, amount_key)
+        self._monitor_by_seq[seq] = order
+        self._monitor_keys[order.uid] = (price_key, amount_key)
+
+    def _unindex_monitor(self, order: Order) -> int:
+        price_key, amount_key = self._monitor_keys.pop(order.uid)
+        del self._monitor_by_price[bisect.bisect_left(self._monitor_by_price, price_key)]
+        del self._monitor_by_amount[bisect.bisect_left(self._monitor_by_amount, amount_key)]
+        del self._monitor_by_seq[price_key[1]]
+        return price_key[1]
+
+    # ********** orders **********
+
     def add_order(self, order: Order) -> None:
         self.monitor.append(order)
+        self._index(order)
+        self._index_monitor(order)
+        self._notify_added(order)
 
     def remove_order(self, order: Order) -> None:
         self.monitor.remove(order)
+        self._unindex(order)
+        self._unindex_monitor(order)
+        self._notify_removed(order)
+
+    def remove_placed_order(self, order: Order) -> None:
+        # traded
+        self.placed.remove(order)
+        self._unindex(order)
 
     def place_order(self, order: Order) -> None:
         if order in self.monitor:
             self.monitor.remove(order)
+            self._unindex_monitor(order)
+            self._notify_removed(order)
             self.placed.append(order)
             # in session, once placement confirmed, will be set to status PLACED
             order.set_status(OrderStatus.TO_BE_PLACED)
@@ -48,15 +185,61 @@ class PendingOrdersBook:
         if order in self.placed:
             self.placed.remove(order)
             self.monitor.append(order)
+            self._index_monitor(order)
             order.set_status(OrderStatus.MONITOR)
+            self._notify_added(order)
         else:
             log.critical(f'trying to place back to monitor an order not found in the placed list: {order}')
 
     def get_monitor_orders(self) -> List[Order]:
         return self.monitor
 
-    def get_monitor_sorted_by_momentum(self, cmp: float) -> List[Order]:
-        return sorted(self.monitor, key=lambda x: x.get_momentum(cmp=cmp), reverse=True)
+    def get_top_momentum(self, cmp: float, k: int) -> List[Order]:
+        # the k monitor orders with highest momentum |amount * (cmp - price)|, highest first
+        # (same as sorting the monitor list by momentum, reverse=True, and taking the first k)
+        by_price = self._monitor_by_price
+        if k <= 0 or not by_price:
+            return []
+        max_amount = self._monitor_by_amount[-1][0]
+        top = []  # min heap of (momentum, -seq): the worst of the k best on top
+        lo = 0
+        hi = len(by_price) - 1
+        while lo <= hi:
+            # the remaining orders are in the price range [lo, hi], the farthest from cmp at one of its ends
+            d_lo = abs(cmp - by_price[lo][0])
+            d_hi = abs(cmp - by_price[hi][0])
+            if len(top) == k and top[0][0] > max_amount * max(d_lo, d_hi):
+                break
+            if d_lo >= d_hi:
+                seq = by_price[lo][1]
+                lo += 1
+            else:
+                seq = by_price[hi][1]
+                hi -= 1
+            item = (self._monitor_by_seq[seq].get_momentum(cmp=cmp), -seq)
+            if len(top) < k:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+        return [self._monitor_by_seq[-seq] for _, seq in sorted(top, reverse=True)]
+
+    def get_extreme_price_order(self, highest: bool, k_side: Optional[str] = None) -> Optional[Order]:
+        # the monitor order with highest (or lowest) price, of one side or any side
+        # ties resolved as sorting the monitor list by price, reverse=True: first (highest) or last (lowest)
+        by_price = self._monitor_by_price
+        indexes = range(len(by_price) - 1, -1, -1) if highest else range(len(by_price))
+        found = None
+        found_price = None
+        for i in indexes:
+            price, seq = by_price[i]
+            order = self._monitor_by_seq[seq]
+            if k_side and order.k_side != k_side:
+                continue
+            if found and price != found_price:
+                break
+            found = order
+            found_price = price
+        return found
 
     def get_pending_orders(self) -> List[Order]:
         return self.monitor + self.placed
@@ -102,14 +285,31 @@ class PendingOrdersBook:
     def set_order_amount_by_uid(self, amount: float, uid: str):
         for order in self.monitor:
             if order.uid == uid:
-                order.amount = amount
+                self._unindex(order)
+                seq = self._unindex_monitor(order)
+                order.set_amount(amount=amount)
+                self._index(order)
+                self._index_monitor(order, seq=seq)
                 break
 
+    def set_order_price(self, order: Order, price: float) -> None:
+        is_pending = order.uid in self._band_keys
+        is_monitor = order.uid in self._monitor_keys
+        if is_pending:
+            self._unindex(order)
+        seq = self._unindex_monitor(order) if is_monitor else None
+        order.set_price(price=price)
+        if is_pending:
+            self._index(order)
+        if is_monitor:
+            self._index_monitor(order, seq=seq)
+
     # ********* pandas methods **********
     def show_orders_graph(self):
         pass
 
-    def get_pending_orders_df(self) -> pd.DataFrame:
+    def get_pending_orders_df(self) -> 'pd.DataFrame':
+        import pandas as pd
         # create dataframe from orders list
         df_monitor = pd.DataFrame([order.__dict__ for order in self.monitor])
         df_monitor['status'] = 'monitor'
@@ -119,41 +319,71 @@ class PendingOrdersBook:
         df_pending = df_monitor.append(other=df_placed)
         return df_pending
 
-    def get_pending_orders_kpi(self, cmp: float, buy_fee: float, sell_fee: float) -> pd.DataFrame:
-        # create all pending orders list
-        pending_orders = self.monitor + self.placed  # check it
+    def get_pending_orders_kpi(self, cmp: float, buy_fee: float, sell_fee: float) -> 'pd.DataFrame':
+        return PendingOrdersBook.get_bands_kpi(
+            bands=self.get_bands_snapshot(), cmp=cmp, buy_fee=buy_fee, sell_fee=sell_fee)
+
+    @staticmethod
+    def get_orders_kpi(orders: List[Order], cmp: float, buy_fee: float, sell_fee: float) -> 'pd.DataFrame':
         # filter orders by distance
-        for order in pending_orders:
-            if order.get_distance(cmp=cmp) < 50:
-                pending_orders.remove(order)
+        far_orders = [order for order in orders if order.get_distance(cmp=cmp) >= K_KPI_MIN_DISTANCE]
         # get equivalent balance
-        amount, total = PendingOrdersBook.get_balance_for_list(orders=pending_orders)
-
-        # create empty dataframe (only column names)
-        # df = pd.DataFrame(columns=['kpi', 'price', 'amount', 'side'])
-        data_list = []
-
-        # get equivalent pair for each gap
-        gap_list = [100, 200, 300, 400, 500]
-        for gap in gap_list:
-            s1_p, b1_p, s1_qty, b1_qty = get_compensation(
-                cmp=cmp,
-                gap=gap,
-                qty_bal=amount,
-                price_bal=total,
-                buy_fee=buy_fee,
-                sell_fee=sell_fee
-            )
-            # create new data
-            sell_kpi = dict(kpi=gap, price=s1_p, amount=s1_qty, side='SELL')
-            buy_kpi = dict(kpi=gap, price=b1_p, amount=b1_qty, side='BUY')
-            # append to list
-            data_list.append(buy_kpi)
-            data_list.append(sell_kpi)
-        # create dataframe
-        df = pd.DataFrame(data=data_list, columns=['kpi', 'price', 'amount', 'side'])
-        # df1 = df.append(other=data_list, ignore_index=True)
-        return df
+        amount = math.fsum(order.get_signed_amount() for order in far_orders)
+        total = math.fsum(order.get_signed_total() for order in far_orders)
+        return PendingOrdersBook._get_kpi_df(amount=amount, total=total, cmp=cmp, buy_fee=buy_fee, sell_fee=sell_fee)
+
+    @staticmethod
+    def get_bands_kpi(bands: Dict[Tuple[str, int], BandSnapshot],
+                      cmp: float, buy_fee: float, sell_fee: float) -> 'pd.DataFrame':
+        # same as get_orders_kpi() from the band aggregates: only the orders of the bands around the
+        # min distance limits are checked one by one, the other bands are fully included or excluded
+        amount, total = PendingOrdersBook.get_bands_balance(bands=bands, cmp=cmp, min_distance=K_KPI_MIN_DISTANCE)
+        return PendingOrdersBook._get_kpi_df(amount=amount, total=total, cmp=cmp, buy_fee=buy_fee, sell_fee=sell_fee)
+
+    @staticmethod
+    def get_bands_balance(bands: Dict[Tuple[str, int], BandSnapshot],
+                          cmp: float, min_distance: float) -> (float, float):
+        buy_edge = math.floor((cmp - min_distance) / K_BAND_WIDTH)
+        sell_edge = math.floor((cmp + min_distance) / K_BAND_WIDTH)
+        amounts = []
+        totals = []
+        for (k_side, band_index), band in bands.items():
+            if k_side == k_binance.SIDE_BUY:
+                offset = buy_edge - band_index  # > 0: all the band far enough below cmp
+            else:
+                offset = band_index - sell_edge
+            if offset > 1:
+                amounts.append(band.amount)
+                totals.append(band.total)
+            elif offset >= -1:
+                # same distance as Order.get_distance()
+                for price, amount, total in band.orders:
+                    distance = cmp - price if k_side == k_binance.SIDE_BUY else price - cmp
+                    if distance >= min_distance:
+                        amounts.append((amount,))
+                        totals.append((total,))
+        return math.fsum(chain.from_iterable(amounts)), math.fsum(chain.from_iterable(totals))
+
+    @staticmethod
+    def _get_kpi_df(amount: float, total: float, cmp: float, buy_fee: float, sell_fee: float) -> 'pd.DataFrame':
+        import numpy as np
+        import pandas as pd
+        # equivalent pair for all the gaps at once
+        gaps = np.array(K_KPI_GAPS, dtype=float)
+        s1_p, b1_p, s1_qty, b1_qty = get_compensation(
+            cmp=cmp,
+            gap=gaps,
+            qty_bal=amount,
+            price_bal=total,
+            buy_fee=buy_fee,
+            sell_fee=sell_fee
+        )
+        # rows in (buy, sell) order for each gap
+        return pd.DataFrame(dict(
+            kpi=np.repeat(K_KPI_GAPS, 2),
+            price=np.column_stack((b1_p, s1_p)).ravel(),
+            amount=np.column_stack((b1_qty, s1_qty)).ravel(),
+            side=['BUY', 'SELL'] * len(K_KPI_GAPS)))
 
     @staticmethod
     def get_depth() -> float:
@@ -190,7 +420,9 @@ class PendingOrdersBook:
         return max_sell_price, min_sell_price, max_buy_price, min_buy_price
 
     @staticmethod
-    def _get_df_from_pending_orders_table() -> pd.DataFrame:
+    def _get_df_from_pending_orders_table() -> 'pd.DataFrame':
+        import pandas as pd
+        from polaris_old.pp_dbmanager import DBManager
         # get dataframe from pending orders table in the database
         cnx = DBManager.create_connection(file_name='src/database/orders.db')
         df = pd.read_sql_query(f'SELECT * FROM pending_orders', cnx)
@@ -0,0 +1,58 @@
+# pp_placement_queue.py
+
+from typing import Callable, List, Optional
+import time
+
+from src.pp_order import Order
+from src.xb_rate_limit import TokenBucket, RateLimiter
+
+# binance spot order rate limits (per account)
+K_ORDERS_PER_SECOND = 10
+K_ORDERS_PER_DAY = 200_000
+
+
+class PlacementQueue:
+    """Orders ready for placement, closest to cmp first, drained under the exchange order rate.
+
+    Orders not placed because the budget is exhausted stay in the monitor list and
+    are queued again in the next tick (where their priority is recalculated).
+    """
+    def __init__(self,
+                 orders_per_second: float = K_ORDERS_PER_SECOND,
+                 orders_per_day: float = K_ORDERS_PER_DAY,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limiter = RateLimiter(buckets=[
+            TokenBucket(rate=orders_per_second, capacity=orders_per_second, clock=clock),
+            TokenBucket(rate=orders_per_day / 86_400, capacity=orders_per_day, clock=clock)
+        ])
+        self.queued: List[Order] = []
+        self.placed_count = 0
+        self.throttled_count = 0  # placements delayed to a later tick by the rate limit
+
+    def set_orders(self,
+                   orders: List[Order],
+                   cmp: float,
+                   bid: Optional[float] = None,
+                   ask: Optional[float] = None) -> None:
+        # orders ready for placement in this tick, kept from farthest to closest (pop from the end)
+        self.queued = sorted(orders, key=lambda x: x.get_abs_distance(cmp=cmp, bid=bid, ask=ask), reverse=True)
+
+    def pop(self) -> Optional[Order]:
+        # closest order to the market not popped yet
+        return self.queued.pop() if self.queued else None
+
+    def try_acquire(self) -> bool:
+        # one placement from the budget, if exhausted the queued orders wait for the next tick
+        if self.limiter.try_acquire():
+            self.placed_count += 1
+            return True
+        self.throttled_count += 1 + len(self.queued)
+        self.queued = []
+        return False
+
+    def get_stats(self) -> dict:
+        return dict(
+            placed=self.placed_count,
+            throttled=self.throttled_count,
+            available=self.limiter.get_available()
+        )
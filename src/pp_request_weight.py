@@ -0,0 +1,111 @@
+# pp_request_weight.py
+
+import time
+from collections import deque
+from enum import Enum
+from typing import Callable, Deque, Optional, Tuple
+
+# binance spot REQUEST_WEIGHT limit (per ip and minute)
+K_WEIGHT_LIMIT = 1200
+K_WEIGHT_WINDOW = 60.0  # secs
+K_WEIGHT_HEADER = 'x-mbx-used-weight-1m'
+
+# local cost model, used when the exchange does not report the used weight (fake client)
+K_REQUEST_WEIGHTS = {
+    'place_order': 1,
+    'cancel_order': 1,
+    'get_avg_price': 1,
+    'get_asset_balance': 10,  # account endpoint
+    'get_symbol_info': 10  # exchange info endpoint
+}
+
+
+class RequestPriority(Enum):
+    CANCEL = 1  # risk reduction: always sent
+    BALANCE = 2  # balance and price reads
+    PLACE = 3  # new placements: the first ones deferred when the budget runs low
+
+
+# share of the weight limit each priority can use, so that cancels always find budget left
+K_PRIORITY_SHARE = {
+    RequestPriority.CANCEL: 1.0,
+    RequestPriority.BALANCE: 0.9,
+    RequestPriority.PLACE: 0.7
+}
+
+
+class RequestWeightTracker:
+    """Request weight used in the last minute, to schedule the REST calls under the exchange limit.
+
+    The used weight reported by the exchange (response header) is trusted when
+    available, plus the local cost of the requests sent after it. Otherwise the
+    local cost model is used on a sliding window.
+    """
+    def __init__(self,
+                 limit: int = K_WEIGHT_LIMIT,
+                 window: float = K_WEIGHT_WINDOW,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+
+        self._requests: Deque[Tuple[float, int]] = deque()  # (time, weight)
+        self._local_used = 0
+        self._reported_used: Optional[int] = None
+        self._reported_time = 0.0
+        self._weight_since_report = 0
+        self._blocked_until = 0.0
+
+        self.sent_count = {priority.name.lower(): 0 for priority in RequestPriority}
+        self.deferred_count = {priority.name.lower(): 0 for priority in RequestPriority}
+
+    def get_used(self) -> int:
+        now = self.clock()
+        while self._requests and now - self._requests[0][0] >= self.window:
+            self._local_used -= self._requests.popleft()[1]
+        used = self._local_used
+        if self._reported_used is not None and now - self._reported_time < self.window:
+            used = max(used, self._reported_used + self._weight_since_report)
+        return used
+
+    def get_remaining(self) -> int:
+        return max(0, self.limit - self.get_used())
+
+    def can_send(self, endpoint: str, priority: RequestPriority) -> bool:
+        if priority == RequestPriority.CANCEL:
+            return True
+        weight = K_REQUEST_WEIGHTS.get(endpoint, 1)
+        is_allowed = self.clock() >= self._blocked_until \
+            and self.get_used() + weight <= self.limit * K_PRIORITY_SHARE[priority]
+        if not is_allowed:
+            self.deferred_count[priority.name.lower()] += 1
+        return is_allowed
+
+    def record(self, endpoint: str, priority: RequestPriority, used_weight: Optional[int] = None) -> None:
+        # called once the request has been sent, with the used weight reported in the response (if any)
+        now = self.clock()
+        weight = K_REQUEST_WEIGHTS.get(endpoint, 1)
+        self._requests.append((now, weight))
+        self._local_used += weight
+        if used_weight is None:
+            self._weight_since_report += weight
+        else:
+            self._reported_used = used_weight
+            self._reported_time = now
+            self._weight_since_report = 0
+        self.sent_count[priority.name.lower()] += 1
+
+    def set_retry_after(self, secs: float) -> None:
+        # the exchange rejected a request for exceeding the limit: only cancels until then
+        self._blocked_until = max(self._blocked_until, self.clock() + secs)
+
+    def get_stats(self) -> dict:
+        used = self.get_used()
+        return dict(
+            used=used,
+            limit=self.limit,
+            remaining=max(0, self.limit - used),
+            blocked=self.clock() < self._blocked_until,
+            sent=dict(self.sent_count),
+            deferred=dict(self.deferred_count)
+        )
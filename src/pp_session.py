@@ -1,22 +1,38 @@
 # pp_session.py
 
+import copy
+import itertools
 import logging
 from datetime import datetime
+from time import perf_counter_ns, monotonic, time
 from enum import Enum
-import pandas as pd
 
-from typing import Optional
+from typing import Optional, NamedTuple, Tuple, List, Dict, TYPE_CHECKING
 from binance import enums as k_binance
 
-from src.pp_market import Market
+from src.pp_market import Market, TickerStreamMode
+from src.pp_fake_client import K_INITIAL_CMP
 from src.pp_order import Order, OrderStatus
 from src.pp_account_balance import AccountBalance
 from src.xb_pt_calculator import get_pt_values
-from src.pp_pending_orders_book import PendingOrdersBook
+from src.pp_pending_orders_book import PendingOrdersBook, BandSnapshot
 from src.pp_traded_orders_book import TradedOrdersBook
+from src.pp_traded_orders_archive import TradedOrdersArchive, K_ARCHIVE_FILE
 from src.pp_strategy_manager import StrategyManager
 from src.pp_balance_manager import BalanceManager
 from src.pp_concentrator import ConcentratorManager
+from src.pp_tick_intake import TickIntakeMode
+from src.pp_session_loop import SessionLoop
+from src.pp_placement_queue import PlacementQueue
+from src.pp_order_exporter import OrderExporter, ExportEvent
+from src.pp_market_recorder import MarketRecorder, ReplaySource
+from src.pp_bar_store import BarStore, Bars
+from src.xb_metrics import MetricsRegistry
+from src.xb_profiler import SamplingProfiler, K_PROFILE_FOLDER
+
+# pandas is only imported when a dataframe is requested (dashboard), not by the engine
+if TYPE_CHECKING:
+    import pandas as pd
 
 log = logging.getLogger('log')
 
@@ -38,11 +54,23 @@ K_DISTANCE_FOR_CONCENTRATION = 150
 K_GAP_CONCENTRATION = 200
 K_INTERDISTANCE_AFTER_CONCENTRATION = 50.0
 
-# one placement per cycle control flag
-K_ONE_PLACE_PER_CYCLE_MODE = True
+# LATEST_ONLY: ticks received while processing a previous one are merged, only the last cmp is processed
+K_TICK_INTAKE_MODE = TickIntakeMode.LATEST_ONLY
+
+# LAST_PRICE: 24hrTicker stream (~1 tick/s)
+# BOOK_TICKER: best bid/ask stream, move back and placement are checked on every book update against the touch price
+K_TICKER_STREAM_MODE = TickerStreamMode.LAST_PRICE
+# in BOOK_TICKER mode the full cycle (strategy, inactivity, cycle counters) runs at most once per interval,
+# so that all the cycle-based parameters keep their meaning (approximately secs)
+K_BOOK_TICKER_CYCLE_INTERVAL = 1.0  # secs
 
 K_INITIAL_PT_TO_CREATE = 1
 
+# completed pt older than K_MAX_COMPLETED_AGE (see traded orders book) are archived every this number of ticks
+K_ARCHIVE_CHECK_CYCLES = 60
+# archived orders shown in the traded table
+K_TRADED_TABLE_ARCHIVED_ROWS = 200
+
 # pt creation
 PT_CREATED_COUNT_MAX = 100  # max number of pt created per session
 PT_CMP_CYCLE_COUNT = 30  # approximately secs (cmp update elapsed time)
@@ -55,39 +83,161 @@ PT_GROSS_EUR_BALANCE = 0.0
 
 COMPENSATION_GAP = 500.0  # applied gap for compensated orders
 
+K_INACTIVITY_CYCLES = 125  # cmp cycles (ticks) without a trade before forcing a new pt or liquidity (~5')
+
+_session_count = itertools.count(1)  # session_id suffix
+
+
+class SessionConfig(NamedTuple):
+    # strategy parameters of a session (shadow sessions run variants of the live one)
+    nab: float = PT_NET_AMOUNT_BALANCE
+    s1_qty: float = PT_S1_AMOUNT
+    buy_fee: float = PT_BUY_FEE
+    sell_fee: float = PT_SELL_FEE
+    geb: float = PT_GROSS_EUR_BALANCE
+    placement_distance: float = K_MINIMUM_DISTANCE_FOR_PLACEMENT
+    move_back_distance: float = K_MAX_DISTANCE_FOR_REMAINING_PLACED
+    inactivity_cycles: int = K_INACTIVITY_CYCLES
+    max_pt_count: int = PT_CREATED_COUNT_MAX
+
 
 class QuitMode(Enum):
     CANCEL_ALL_PLACED = 1
     PLACE_ALL_PENDING = 2
 
 
+class SessionSnapshot(NamedTuple):
+    # immutable view of the session state, safe to be read from any thread
+    version: int
+    last_cmp: float
+    last_bid: Optional[float]  # only in BOOK_TICKER stream mode
+    last_ask: Optional[float]
+    first_cmp: Optional[float]  # first price of the session (price series in session.bars)
+    ticker_count: int
+    cycles_from_last_trade: int
+    partial_traded_orders_count: int
+    pt_created_count: int
+    buy_count: int
+    sell_count: int
+    new_pt_permission_granted: bool
+    monitor: Tuple[Order, ...]  # copies, not the live orders
+    placed: Tuple[Order, ...]
+    pending_bands: Dict[Tuple[str, int], BandSnapshot]  # running aggregates of monitor + placed
+    traded_completed: Tuple[Order, ...]
+    traded_pending: Tuple[Order, ...]
+    completed_summary: dict  # rolling totals of completed pt, archived included
+    current_ab: AccountBalance
+
+    def get_pending_orders(self) -> List[Order]:
+        return list(self.monitor + self.placed)
+
+    def get_traded_orders(self) -> List[Order]:
+        return list(self.traded_completed + self.traded_pending)
+
+
 class Session:
-    def __init__(self, client_mode: str):
+    def __init__(self,
+                 client_mode: str,
+                 threaded: bool = True,
+                 ticker_stream_mode: TickerStreamMode = K_TICKER_STREAM_MODE,
+                 api_url: Optional[str] = None,
+                 stream_url: Optional[str] = None,
+                 export_folder: Optional[str] = None,
+                 config: Optional[SessionConfig] = None,
+                 name: str = '',
+                 initial_cmp: float = K_INITIAL_CMP,
+                 record_folder: Optional[str] = None,
+                 replay_source: Optional[ReplaySource] = None,
+                 slow_tick_ms: Optional[float] = None,
+                 profile_folder: str = K_PROFILE_FOLDER,
+                 archive_file: Optional[str] = K_ARCHIVE_FILE):
+
+        self.config = config if config else SessionConfig()
+        # shadow sessions are named (part of the session_id)
+        self.name = name
+
+        # all the session state is mutated from this loop (single writer)
+        # when not threaded, commands are run inline by the caller thread (tests & simulations)
+        self.loop = SessionLoop(after_command=self._on_state_changed)
+        self._state_version = 0
+        self._snapshot: Optional[SessionSnapshot] = None
+
+        # latency histograms (tick stages, fills and market REST calls)
+        self.metrics = MetricsRegistry()
+        self._h_tick = self.metrics.histogram('tick.total')
+        self._h_move_back = self.metrics.histogram('tick.move_back')
+        self._h_strategy = self.metrics.histogram('tick.strategy')
+        self._h_placement = self.metrics.histogram('tick.placement')
+        self._h_inactivity = self.metrics.histogram('tick.inactivity')
+        self._h_fill = self.metrics.histogram('fill.total')
+        self._h_book_tick = self.metrics.histogram('tick.book_fast_path')
+        # counters & gauges (prometheus exposition), only updated from the loop
+        self._c_ticks = self.metrics.counter('ticks_processed', 'session cycles run')
+        self._c_placed = {side: self.metrics.counter('orders_placed', 'orders placed on the exchange', side=side)
+                          for side in [k_binance.SIDE_BUY, k_binance.SIDE_SELL]}
+        self._c_filled = {side: self.metrics.counter('orders_filled', 'orders traded', side=side)
+                          for side in [k_binance.SIDE_BUY, k_binance.SIDE_SELL]}
+        self._c_cancelled = self.metrics.counter('orders_cancelled', 'placed orders moved back to monitor')
+        self._g_monitor = self.metrics.gauge('pending_orders', 'orders in the pending book', list='monitor')
+        self._g_placed = self.metrics.gauge('pending_orders', list='placed')
+        # stack sampling on demand (control socket, dashboard) or after a tick slower than slow_tick_ms
+        self.profiler = SamplingProfiler(
+            folder=profile_folder, slow_tick_ns=int(slow_tick_ms * 1e6) if slow_tick_ms is not None else None)
+        self._g_balances = {(asset, kind): self.metrics.gauge('balance', 'last balance received', asset=asset, type=kind)
+                            for asset in ['btc', 'eur', 'bnb'] for kind in ['free', 'locked']}
 
         self.market = Market(
-            symbol_ticker_callback=self.symbol_ticker_callback,
-            order_traded_callback=self.order_traded_callback,
-            account_balance_callback=self.account_balance_callback,
-            client_mode=client_mode
+            symbol_ticker_callback=self._on_symbol_ticker,
+            order_traded_callback=self._on_order_traded,
+            account_balance_callback=self._on_account_balance,
+            client_mode=client_mode,
+            tick_intake_mode=K_TICK_INTAKE_MODE,
+            threaded=threaded,
+            metrics=self.metrics,
+            ticker_stream_mode=ticker_stream_mode,
+            book_ticker_callback=self._on_book_ticker,
+            api_url=api_url,
+            stream_url=stream_url,
+            initial_cmp=initial_cmp,
+            replay_source=replay_source
         )
 
         # ********** managers **********
         self.bm = BalanceManager(market=self.market)
         self.pob = PendingOrdersBook(orders=[])
-        self.tob = TradedOrdersBook()
+        # completed pt archive: sqlite file, ':memory:' or None (kept in memory, not archived)
+        self.tob = TradedOrdersBook(
+            archive=TradedOrdersArchive(file_name=archive_file) if archive_file is not None else None)
 
-        self.cm = ConcentratorManager(pob=self.pob, tob=self.tob)
+        self.cm = ConcentratorManager(pob=self.pob, tob=self.tob, metrics=self.metrics,
+                                      order_concentrated_callback=self._on_order_concentrated)
 
         self.sm = StrategyManager(pob=self.pob, cm=self.cm, bm=self.bm)
 
+        # orders ready for placement, placed as fast as the exchange order rate limits allow
+        self.placement_queue = PlacementQueue()
+
         # *********** concentrator **********
 
-        self.cmps = []
-        self.cycles_serie = []
+        # ohlc bars of the cycle prices (charts and time range queries)
+        self.bars = BarStore()
         self.orders_book_depth = []
         self.orders_book_span = []
 
-        self.session_id = f'S_{datetime.now().strftime("%Y%m%d_%H%M")}'
+        # unique in the process (sessions started in the same second share the archive file)
+        self.session_id = f'S_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{next(_session_count):03}' \
+            + (f'_{name}' if name else '')
+
+        # optional streaming of the order events and tick metrics to parquet files (pyarrow needed)
+        self.exporter: Optional[OrderExporter] = None
+        if export_folder:
+            self.exporter = OrderExporter(session_id=self.session_id, folder=export_folder)
+            self.exporter.start()
+
+        # optional recording of the ticker and user stream events (replayable by the fake client)
+        if record_folder:
+            self.market.recorder = MarketRecorder(session_id=self.session_id, folder=record_folder)
+            self.market.recorder.start()
         self.pt_created_count = 0
         self.buy_count = 0
         self.sell_count = 0
@@ -102,35 +252,125 @@ class Session:
         # get filters that will be checked before placing an order
         self.symbol_filters = self.market.get_symbol_info(symbol='BTCEUR')
 
-        self.market.start_sockets()
-
         self.last_cmp = self.market.get_cmp('BTCEUR')
+        # best bid/ask (only updated in BOOK_TICKER stream mode)
+        self.last_bid: Optional[float] = None
+        self.last_ask: Optional[float] = None
+        self._last_cycle_time: Optional[float] = None
 
         self.ticker_count = 0
 
         self.partial_traded_orders_count = 0
 
+        self._set_balance_gauges(ab=self.bm.current_ab)
+
+        # start sockets once the session is fully initialized, since from now on callbacks can be received
+        if threaded:
+            self.loop.start()
+        self.market.start_sockets()
+
+    # ********** snapshot (read-only access from other threads) **********
+
+    def _on_state_changed(self) -> None:
+        # called by the loop after each command
+        self._state_version += 1
+        self._g_monitor.set(len(self.pob.monitor))
+        self._g_placed.set(len(self.pob.placed))
+
+    def get_snapshot(self) -> SessionSnapshot:
+        # the snapshot is rebuilt (in the loop) only if the state has changed since the last one
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != self._state_version:
+            snapshot = self.loop.read(self._build_snapshot)
+        return snapshot
+
+    def _build_snapshot(self) -> SessionSnapshot:
+        snapshot = SessionSnapshot(
+            version=self._state_version,
+            last_cmp=self.last_cmp,
+            last_bid=self.last_bid,
+            last_ask=self.last_ask,
+            first_cmp=self.bars.first_price,
+            ticker_count=self.ticker_count,
+            cycles_from_last_trade=self.cycles_from_last_trade,
+            partial_traded_orders_count=self.partial_traded_orders_count,
+            pt_created_count=self.pt_created_count,
+            buy_count=self.buy_count,
+            sell_count=self.sell_count,
+            new_pt_permission_granted=self.new_pt_permission_granted,
+            monitor=tuple(copy.copy(order) for order in self.pob.monitor),
+            placed=tuple(copy.copy(order) for order in self.pob.placed),
+            pending_bands=self.pob.get_bands_snapshot(),
+            traded_completed=tuple(copy.copy(order) for order in self.tob.completed),
+            traded_pending=tuple(copy.copy(order) for order in self.tob.pending),
+            completed_summary=self.tob.completed_summary.to_dict(),
+            current_ab=self.bm.current_ab
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    def get_bars(self, resolution: float, start: Optional[float] = None, end: Optional[float] = None) -> Bars:
+        # bars starting in [start, end] (epoch secs), copied in the loop
+        return self.loop.read(self.bars.get_bars, resolution, start, end)
+
+    def get_chart_bars(self) -> (float, Bars):
+        return self.loop.read(self.bars.get_chart_bars)
+
+    def get_limit_stats(self) -> dict:
+        # placement rate & request weight stats, read in the loop (reading them expires old entries)
+        return self.loop.read(lambda: dict(
+            placement=self.placement_queue.get_stats(),
+            request_weight=self.market.request_weight.get_stats()
+        ))
+
     # ********** dashboard callback functions **********
 
-    def get_all_orders_dataframe(self) -> pd.DataFrame:
+    def get_all_orders_dataframe(self) -> 'pd.DataFrame':
+        import pandas as pd
+        snapshot = self.get_snapshot()
         # get list with all orders: pending (monitor + placed) & traded (completed + pending_pt_id)
-        all_orders = self.pob.get_pending_orders() + self.tob.get_all_traded_orders()
+        all_orders = snapshot.get_pending_orders() + snapshot.get_traded_orders()
         # create dataframe
         df = pd.DataFrame([order.__dict__ for order in all_orders])
         # delete status column because it returns a tuple and raises an error in the dash callback
         df1 = df.drop(columns='status', axis=1)
         return df1
 
-    def get_all_orders_dataframe_with_cmp(self) -> pd.DataFrame:
+    def get_all_orders_dataframe_with_cmp(self) -> 'pd.DataFrame':
         df = self.get_all_orders_dataframe()
         # create cmp order-like and add to dataframe
-        cmp_order = dict(pt_id='CMP', status_name='cmp', price=self.last_cmp)
+        cmp_order = dict(pt_id='CMP', status_name='cmp', price=self.get_snapshot().last_cmp)
         df1 = df.append(other=cmp_order, ignore_index=True)
         return df1
 
+    def get_archived_orders(self, limit: int = K_TRADED_TABLE_ARCHIVED_ROWS) -> List[dict]:
+        # most recent orders of this session moved to the archive (records like the traded table ones)
+        return self.tob.get_archived_orders(session_id=self.session_id, limit=limit)
+
+    # ********** market callbacks (called from socket threads, queued to the loop) **********
+
+    def _on_symbol_ticker(self, cmp: float) -> None:
+        # wait for the tick to be processed: meanwhile the tick intake merges the new ticks received
+        self.loop.call(self.symbol_ticker_callback, cmp)
+
+    def _on_book_ticker(self, bid: float, ask: float) -> None:
+        self.loop.call(self.book_ticker_callback, bid, ask)
+
+    def _on_order_traded(self, uid: str, order_price: float, bnb_commission: float) -> None:
+        self.loop.submit(self.order_traded_callback, uid, order_price, bnb_commission)
+
+    def _on_account_balance(self, ab: AccountBalance) -> None:
+        self.loop.submit(self.account_balance_callback, ab)
+
+    def _on_order_concentrated(self, order: Order) -> None:
+        if self.exporter:
+            self.exporter.add_order_event(
+                event=ExportEvent.CONCENTRATED, order=order, ticker_count=self.ticker_count, cmp=self.last_cmp)
+
     # ********** Binance socket callback functions **********
 
     def symbol_ticker_callback(self, cmp: float) -> None:
+        t_start = perf_counter_ns()
         # 0.1: create first pt
         if self.ticker_count == 0 and cmp > 20000.0:
             self.create_new_pt(cmp=cmp)
@@ -138,28 +378,66 @@ class Session:
         # 0.2: update cmp count to control timely pt creation
         self.cmp_count += 1
         self.ticker_count += 1
+        self._c_ticks.inc()
 
-        # these two lists will be used to plot
-        self.cmps.append(cmp)
-        self.cycles_serie.append(self.cmp_count)
+        self.bars.add(t=time(), price=cmp)
 
         self.last_cmp = cmp
         self.cycles_from_last_trade += 1
 
         # 2. loop through placed orders and move to monitor list if isolated
+        t0 = perf_counter_ns()
         self.check_placed_list_for_move_back(cmp=cmp)
+        t1 = perf_counter_ns()
+        self._h_move_back.record(t1 - t0)
 
         # strategy manager and update of trades needed for new pt
         self.partial_traded_orders_count += self.sm.assess_strategy_actions(cmp=cmp)
+        t0 = perf_counter_ns()
+        self._h_strategy.record(t0 - t1)
 
         # 4. loop through monitoring orders and place to Binance when appropriate
         self.check_monitor_list_for_placing(cmp=cmp)
+        t1 = perf_counter_ns()
+        self._h_placement.record(t1 - t0)
 
         # 5. check inactivity & liquidity
         self.check_inactivity(cmp=cmp)
+        t0 = perf_counter_ns()
+        self._h_inactivity.record(t0 - t1)
+
+        # 6. move old completed pt out of memory
+        if self.ticker_count % K_ARCHIVE_CHECK_CYCLES == 0:
+            self.tob.archive_completed()
+        self._h_tick.record(t0 - t_start)
+        self.profiler.on_tick_latency(elapsed_ns=t0 - t_start)
+
+        if self.exporter:
+            self.exporter.add_tick(
+                ticker_count=self.ticker_count, cmp=cmp, bid=self.last_bid, ask=self.last_ask,
+                monitor_count=len(self.pob.monitor), placed_count=len(self.pob.placed),
+                pt_created_count=self.pt_created_count, buy_count=self.buy_count, sell_count=self.sell_count,
+                tick_us=(t0 - t_start) / 1000)
+
+    def book_ticker_callback(self, bid: float, ask: float) -> None:
+        # BOOK_TICKER stream mode: the mid price is used as cmp and the touch prices for the distances
+        self.last_bid = bid
+        self.last_ask = ask
+        mid = (bid + ask) / 2
+        now = monotonic()
+        if self._last_cycle_time is None or now - self._last_cycle_time >= K_BOOK_TICKER_CYCLE_INTERVAL:
+            self._last_cycle_time = now
+            self.symbol_ticker_callback(cmp=mid)
+            return
+        # between cycles only the latency sensitive stages are run
+        t0 = perf_counter_ns()
+        self.last_cmp = mid
+        self.check_placed_list_for_move_back(cmp=mid)
+        self.check_monitor_list_for_placing(cmp=mid, is_new_cycle=False)
+        self._h_book_tick.record_since(t0)
 
     def check_inactivity(self, cmp):
-        if self.cycles_from_last_trade > 125:  # TODO: magic number (5')
+        if self.cycles_from_last_trade > self.config.inactivity_cycles:
             if self.bm.is_s1_below_buffer():
                 # force BUY
                 self.sm.force_buy(cmp=cmp)
@@ -173,40 +451,64 @@ class Session:
             self.cycles_from_last_trade = 0  # equivalent to trading but without a trade
 
     def check_placed_list_for_move_back(self, cmp: float):
-        for order in self.pob.placed:
-            if order.is_isolated(cmp=cmp, max_dist=K_MAX_DISTANCE_FOR_REMAINING_PLACED):
+        # loop over a copy since isolated orders are removed from the placed list
+        for order in list(self.pob.placed):
+            if order.is_isolated(cmp=cmp, max_dist=self.config.move_back_distance,
+                                 bid=self.last_bid, ask=self.last_ask):
                 self.pob.place_back_order(order=order)
                 # cancel order in Binance
                 self.market.cancel_orders(orders=[order])
-
-    def check_monitor_list_for_placing(self, cmp: float):
-        new_placement_allowed = True
-        sorted_orders = sorted(self.pob.monitor, key=lambda x: x.get_abs_distance(cmp=cmp))
-        for order in sorted_orders:
-            order.cycles_count += 1
-            if new_placement_allowed and order.is_ready_for_placement(
+                self._c_cancelled.inc()
+
+    def check_monitor_list_for_placing(self, cmp: float, is_new_cycle: bool = True):
+        bid, ask = self.last_bid, self.last_ask
+        ready_orders = []
+        for order in self.pob.monitor:
+            if is_new_cycle:
+                order.cycles_count += 1
+            if order.is_ready_for_placement(
                     cmp=cmp,
-                    min_dist=K_MINIMUM_DISTANCE_FOR_PLACEMENT):
-                # check balance
-                if self.bm.is_balance_enough(order=order):
-                    new_placement_allowed = self._process_place_order(order=order)
-
-    def _process_place_order(self, order: Order) -> bool:
-        new_placement_allowed = True
+                    min_dist=self.config.placement_distance,
+                    bid=bid,
+                    ask=ask):
+                ready_orders.append(order)
+        if not ready_orders:
+            return
+        # closest to the market first, while the order rate budget allows it
+        self.placement_queue.set_orders(orders=ready_orders, cmp=cmp, bid=bid, ask=ask)
+        order = self.placement_queue.pop()
+        while order:
+            # check balance (reservations of the orders placed and not updated yet included)
+            if self.bm.is_balance_enough(order=order):
+                # request weight budget first (it is not consumed when deferred), then order rate budget
+                if not self.market.can_place_order() or not self.placement_queue.try_acquire():
+                    break
+                self._process_place_order(order=order)
+            order = self.placement_queue.pop()
+
+    def _process_place_order(self, order: Order) -> None:
+        self.bm.reserve(order=order)
         self.pob.place_order(order=order)
         is_order_placed, new_status = self._place_order(order=order)
         if is_order_placed:
             # 2. placed: (s: PLACED, t: pending_orders, l: placed)
             order.set_status(status=OrderStatus.PLACED)
-            # to control one new placement per cycle mode
-            if K_ONE_PLACE_PER_CYCLE_MODE:
-                new_placement_allowed = False
+            self.bm.confirm(order=order)
+            self._c_placed[order.k_side].inc()
+            if self.exporter:
+                self.exporter.add_order_event(
+                    event=ExportEvent.PLACED, order=order, ticker_count=self.ticker_count, cmp=self.last_cmp)
         else:
+            self.bm.release(order=order)
             self.pob.place_back_order(order=order)
             log.critical(f'for unknown reason the order has not been placed: {order}')
-        return new_placement_allowed
 
     def order_traded_callback(self, uid: str, order_price: float, bnb_commission: float) -> None:
+        t_start = perf_counter_ns()
+        self._process_order_traded(uid=uid, order_price=order_price, bnb_commission=bnb_commission)
+        self.profiler.on_tick_latency(elapsed_ns=self._h_fill.record_since(t_start))
+
+    def _process_order_traded(self, uid: str, order_price: float, bnb_commission: float) -> None:
         print(f'********** ORDER TRADED:    price: {order_price} [EUR] - commission: {bnb_commission} [BNB]')
         # get the order by uid
         for order in self.pob.placed:
@@ -221,15 +523,19 @@ class Session:
                     self.buy_count += 1
                 else:
                     self.sell_count += 1
+                self._c_filled[order.k_side].inc()
                 # set commission and price
                 order.set_bnb_commission(
                     commission=bnb_commission,
                     bnbbtc_rate=self.market.get_cmp(symbol='BNBBTC'))
-                order.price = order_price
+                order.set_price(price=order_price)
                 # change status
                 order.set_status(status=OrderStatus.TRADED)
                 # remove from placed list
-                self.pob.placed.remove(order)
+                self.pob.remove_placed_order(order=order)
+                if self.exporter:
+                    self.exporter.add_order_event(
+                        event=ExportEvent.TRADED, order=order, ticker_count=self.ticker_count, cmp=self.last_cmp)
                 # add to traded list (once removed from placed list) depending on whether is pt_id completed or not
                 if self.pob.has_completed_pt_id(order=order):
                     # completed
@@ -240,7 +546,7 @@ class Session:
                 # update counter for next pt
                 self.partial_traded_orders_count += 1
                 # check whether a new pt is allowed or not
-                if self.pt_created_count < PT_CREATED_COUNT_MAX and self.partial_traded_orders_count >= 0:
+                if self.pt_created_count < self.config.max_pt_count and self.partial_traded_orders_count >= 0:
                     self.create_new_pt(cmp=self.last_cmp)
                 else:
                     log.info('no new pt created after the last traded order')
@@ -250,6 +556,12 @@ class Session:
     def account_balance_callback(self, ab: AccountBalance) -> None:
         # update of current balance from Binance
         self.bm.update_current(last_ab=ab)
+        self._set_balance_gauges(ab=self.bm.current_ab)
+
+    def _set_balance_gauges(self, ab: AccountBalance) -> None:
+        for asset, balance in [('btc', ab.s1), ('eur', ab.s2), ('bnb', ab.bnb)]:
+            self._g_balances[(asset, 'free')].set(balance.free)
+            self._g_balances[(asset, 'locked')].set(balance.locked)
 
     # ********** check methods **********
     def _place_order(self, order) -> (bool, Optional[str]):
@@ -267,23 +579,34 @@ class Session:
         return order_placed, status_received
 
     # ********** new perfect trade related **********
+    def pause_new_pt(self) -> None:
+        self.new_pt_permission_granted = False
+        log.info('new pt creation paused')
+
+    def resume_new_pt(self) -> None:
+        self.new_pt_permission_granted = True
+        log.info('new pt creation resumed')
+
     def create_new_pt(self, cmp: float):
+        if not self.new_pt_permission_granted:
+            log.info('new pt creation paused, no pt created')
+            return
         # get parameters
         dp = dict(
             mp=cmp,
-            nab=PT_NET_AMOUNT_BALANCE,
-            s1_qty=PT_S1_AMOUNT,
-            buy_fee=PT_BUY_FEE,
-            sell_fee=PT_SELL_FEE,
-            geb=PT_GROSS_EUR_BALANCE)
+            nab=self.config.nab,
+            s1_qty=self.config.s1_qty,
+            buy_fee=self.config.buy_fee,
+            sell_fee=self.config.sell_fee,
+            geb=self.config.geb)
 
         # create new orders
         b1, s1 = self.get_b1s1(dynamic_parameters=dp)
 
         if b1 and s1:
             # add orders to list
-            self.pob.monitor.append(b1)
-            self.pob.monitor.append(s1)
+            self.pob.add_order(b1)
+            self.pob.add_order(s1)
 
             # ********** update control variables **********
             # increase created counter
@@ -365,3 +688,9 @@ class Session:
             log.info(f'LOCKED BALANCE CHECK CORRECT: btc_balance: {btc_bal} - eur_balance: {eur_bal}')
 
         self.market.stop()
+        self.loop.stop()
+        self.profiler.stop()
+        if self.exporter:
+            self.exporter.stop()
+        if self.market.recorder:
+            self.market.recorder.stop()
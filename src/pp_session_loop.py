@@ -0,0 +1,126 @@
+# pp_session_loop.py
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+log = logging.getLogger('log')
+
+
+class _Command:
+    __slots__ = ('fn', 'args', 'kwargs', 'done', 'result', 'error', 'is_read')
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict, wait: bool, is_read: bool = False):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.is_read = is_read  # no state change: after_command not called
+        # the event is only needed when the caller waits for the result
+        self.done: Optional[threading.Event] = threading.Event() if wait else None
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+_STOP = _Command(fn=lambda: None, args=(), kwargs={}, wait=False)
+
+
+class SessionLoop:
+    """Single writer for the session state.
+
+    Every mutation of the session (ticks, fills, balance updates and control
+    commands) is queued as a command and executed, in arrival order, by one
+    thread. Readers in other threads never touch the live lists, they get
+    immutable snapshots built by a command.
+
+    While not started the loop runs inline: commands are executed by the thread
+    that submits them, still one at a time and in order (a command submitted
+    while another one is running is queued and executed right after it).
+    """
+    def __init__(self, after_command: Optional[Callable[[], None]] = None, name: str = 'session-loop'):
+        self.after_command = after_command
+        self.name = name
+        self._queue: 'queue.SimpleQueue[_Command]' = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._is_running = False
+        self._is_draining = False  # inline mode only
+        self.processed_count = 0
+
+    def start(self) -> None:
+        if self._is_running:
+            return
+        self._is_running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._is_running:
+            self._is_running = False
+            self._queue.put(_STOP)
+
+    def is_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, fn: Callable, *args, **kwargs) -> None:
+        # fire and forget: the command will be executed after the already queued ones
+        self._queue.put(_Command(fn=fn, args=args, kwargs=kwargs, wait=False))
+        if not self._is_running:
+            self._drain()
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        # execute the command in the loop and wait for its result
+        return self._call(fn, args, kwargs, is_read=False)
+
+    def read(self, fn: Callable, *args, **kwargs) -> Any:
+        # same as call, for commands not changing the state (snapshots)
+        return self._call(fn, args, kwargs, is_read=True)
+
+    def _call(self, fn: Callable, args: tuple, kwargs: dict, is_read: bool) -> Any:
+        if self.is_loop_thread() or (not self._is_running and self._is_draining):
+            # already in the writer context: run it now
+            return fn(*args, **kwargs)
+        command = _Command(fn=fn, args=args, kwargs=kwargs, wait=True, is_read=is_read)
+        self._queue.put(command)
+        if not self._is_running:
+            self._drain()
+        command.done.wait()
+        if command.error is not None:
+            raise command.error
+        return command.result
+
+    def _run(self) -> None:
+        while True:
+            command = self._queue.get()
+            if command is _STOP:
+                break
+            self._execute(command=command)
+        log.info(f'{self.name} stopped after {self.processed_count} commands')
+
+    def _drain(self) -> None:
+        if self._is_draining:
+            return
+        self._is_draining = True
+        try:
+            while True:
+                try:
+                    command = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if command is not _STOP:
+                    self._execute(command=command)
+        finally:
+            self._is_draining = False
+
+    def _execute(self, command: _Command) -> None:
+        try:
+            command.result = command.fn(*command.args, **command.kwargs)
+        except Exception as e:
+            command.error = e
+            if command.done is None:
+                # nobody is waiting for it, so at least leave a trace
+                log.exception(f'error executing {command.fn}: {e}')
+        self.processed_count += 1
+        if self.after_command and not command.is_read:
+            self.after_command()
+        if command.done is not None:
+            command.done.set()
@@ -0,0 +1,85 @@
+# pp_shadow_sessions.py
+
+import logging
+import math
+from typing import Dict
+
+from src.pp_session import Session, SessionConfig, SessionSnapshot, QuitMode
+
+log = logging.getLogger('log')
+
+K_REPORT_ROWS = ['session_id', 'ticks', 'pt_created', 'buy_count', 'sell_count', 'completed_pt',
+                 'completed_value', 'open_value', 'monitor_count', 'placed_count']
+
+
+class ShadowSessions:
+    """Strategy variants run on the price stream of a live session, without any exchange connection.
+
+    Each shadow is a full Session (own books, config and fake exchange) in 'shadow' client mode: every tick
+    of the live stream, once processed by the live session, is passed to the shadow fake exchanges, which
+    simulate the fills and forward the tick to their sessions.
+    """
+    def __init__(self, session: Session, configs: Dict[str, SessionConfig]):
+        self.session = session
+        self.shadows: Dict[str, Session] = {}
+        for name, config in configs.items():
+            shadow = Session(
+                client_mode='shadow',
+                threaded=session.market.threaded,
+                ticker_stream_mode=session.market.ticker_stream_mode,
+                config=config,
+                name=name,
+                initial_cmp=session.last_cmp,
+                archive_file=':memory:')
+            session.market.add_tick_listener(shadow.market.feed_tick)
+            self.shadows[name] = shadow
+            log.info(f'shadow session {shadow.session_id} started: {config}')
+
+    def stop(self) -> None:
+        for shadow in self.shadows.values():
+            # detached first: no more ticks once stopped
+            self.session.market.remove_tick_listener(shadow.market.feed_tick)
+            shadow.loop.call(shadow.quit, quit_mode=QuitMode.CANCEL_ALL_PLACED)
+
+    def get_report(self) -> Dict[str, dict]:
+        # results of the live session and the shadows, same keys (K_REPORT_ROWS) for all
+        report = dict(live=ShadowSessions.get_results(snapshot=self.session.get_snapshot(),
+                                                      session_id=self.session.session_id))
+        for name, shadow in self.shadows.items():
+            report[name] = ShadowSessions.get_results(snapshot=shadow.get_snapshot(), session_id=shadow.session_id)
+        return report
+
+    def get_report_table(self) -> str:
+        # one column per session
+        report = self.get_report()
+        names = list(report.keys())
+        width = max(12, *(len(str(r['session_id'])) for r in report.values()))
+        lines = [f'{"":16}' + ''.join(f'{name:>{width + 2}}' for name in names)]
+        for row in K_REPORT_ROWS:
+            cells = []
+            for name in names:
+                value = report[name][row]
+                cells.append(f'{value:>{width + 2},.2f}' if isinstance(value, float) else f'{value:>{width + 2}}')
+            lines.append(f'{row:16}' + ''.join(cells))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def get_results(snapshot: SessionSnapshot, session_id: str) -> dict:
+        cmp = snapshot.last_cmp
+        summary = snapshot.completed_summary
+        # completed pt and traded orders of not completed pt, valued at the current price [EUR]
+        completed_value = summary['eur_balance'] + summary['btc_balance'] * cmp
+        open_value = math.fsum(order.get_signed_total() + (order.get_signed_amount() - order.btc_commission) * cmp
+                               for order in snapshot.traded_pending)
+        return dict(
+            session_id=session_id,
+            ticks=snapshot.ticker_count,
+            pt_created=snapshot.pt_created_count,
+            buy_count=snapshot.buy_count,
+            sell_count=snapshot.sell_count,
+            completed_pt=summary['pt_count'],
+            completed_value=completed_value,
+            open_value=open_value,
+            monitor_count=len(snapshot.monitor),
+            placed_count=len(snapshot.placed)
+        )
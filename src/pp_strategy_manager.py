@@ -1,9 +1,11 @@
 # pp_strategy_manager.py
 
-from typing import List
+from typing import List, Dict
 import logging
+from enum import Enum
 from binance import enums as k_binance
 from src.pp_order import Order
+from src.xb_price_alarms import PriceAlarmIndex, AlarmDirection
 from src.pp_pending_orders_book import PendingOrdersBook
 from src.pp_concentrator import ConcentratorManager
 from src.pp_balance_manager import BalanceManager
@@ -25,10 +27,20 @@ K_DISTANCE_FOR_CONCENTRATION = 350
 K_GAP_CONCENTRATION = 50
 K_INTERDISTANCE_AFTER_CONCENTRATION = 25.0
 
+K_DISTANCE_FOR_SIDE_BALANCE = 200.0
+
+K_LIQUIDITY_CANDIDATES = 2  # monitor orders with highest momentum considered for liquidity
+
 PT_BUY_FEE = 0.08 / 100
 PT_SELL_FEE = 0.08 / 100
 
 
+class StrategyAlarm(Enum):
+    N_CHILD = 1  # first split
+    COMPENSATION = 2  # first compensation
+    SIDE_BALANCE = 3
+
+
 class StrategyManager:
     def __init__(self,
                  pob: PendingOrdersBook,
@@ -38,10 +50,56 @@ class StrategyManager:
         self.cm = cm
         self.bm = bm
 
+        # one price alarm per monitor order and strategy it is eligible for, at the cmp where its
+        # distance crosses the strategy threshold: each tick only visits the orders beyond the threshold
+        self.alarms: Dict[StrategyAlarm, PriceAlarmIndex] = {alarm: PriceAlarmIndex() for alarm in StrategyAlarm}
+        # monitor orders not concentrated yet, per side (side balance strategy)
+        self.not_concentrated_count = {k_binance.SIDE_BUY: 0, k_binance.SIDE_SELL: 0}
+        for order in self.pob.monitor:
+            self._on_monitor_order_added(order=order)
+        self.pob.add_monitor_listener(on_added=self._on_monitor_order_added,
+                                      on_removed=self._on_monitor_order_removed)
+
+    # ********** price alarms **********
+
+    def _on_monitor_order_added(self, order: Order) -> None:
+        if order.compensation_count == 0 and order.split_count == 0:
+            self._add_alarm(alarm=StrategyAlarm.N_CHILD, order=order, distance=K_DISTANCE_FOR_FIRST_CHILDREN)
+        if order.compensation_count == 0 and order.split_count == 1:
+            self._add_alarm(alarm=StrategyAlarm.COMPENSATION, order=order, distance=K_DISTANCE_FIRST_COMPENSATION)
+        if order.concentration_count == 0:
+            self._add_alarm(alarm=StrategyAlarm.SIDE_BALANCE, order=order, distance=K_DISTANCE_FOR_SIDE_BALANCE)
+            self.not_concentrated_count[order.k_side] += 1
+
+    def _on_monitor_order_removed(self, order: Order) -> None:
+        for index in self.alarms.values():
+            index.remove(key=order.uid)
+        if order.concentration_count == 0:
+            self.not_concentrated_count[order.k_side] -= 1
+
+    def _add_alarm(self, alarm: StrategyAlarm, order: Order, distance: float) -> None:
+        # order.get_distance(cmp) > distance  <=>  cmp > price + distance (buy) or cmp < price - distance (sell)
+        if order.k_side == k_binance.SIDE_BUY:
+            self.alarms[alarm].add(key=order.uid, level=order.price + distance, direction=AlarmDirection.UP,
+                                   payload=order)
+        else:
+            self.alarms[alarm].add(key=order.uid, level=order.price - distance, direction=AlarmDirection.DOWN,
+                                   payload=order)
+
+    def update_alarms(self, cmp: float) -> None:
+        for index in self.alarms.values():
+            index.update(price=cmp)
+
+    def get_orders_beyond(self, alarm: StrategyAlarm) -> List[Order]:
+        # monitor orders eligible for the strategy with distance above its threshold (in crossing order)
+        return self.alarms[alarm].get_active()
+
     def assess_strategy_actions(self, cmp: float) -> int:
         # main strategy
         trades_to_new_pt_delta = 0
 
+        self.update_alarms(cmp=cmp)
+
         # # 0. asses balance needed
         # if self.bm.is_s1_below_buffer():
         #     # force BUY
@@ -67,21 +125,20 @@ class StrategyManager:
         return trades_to_new_pt_delta
 
     def force_buy(self, cmp: float):
-        # order monitor by price from higher to lower
-        sorted_orders = sorted(self.pob.monitor, key=lambda x: x.price, reverse=True)
-        for order in sorted_orders:
-            print(order)
         # get lower
-        lower_order = sorted_orders[-1]
+        lower_order = self.pob.get_extreme_price_order(highest=False)
+        if lower_order is None:
+            log.info('no monitor order to concentrate for liquidity (force buy)')
+            return
         # concentrate it
         self.cm.concentrate_for_liquidity(order=lower_order, ref_mp=cmp + 110, ref_gap=100)
 
     def force_sell(self, cmp: float):
-        # order monitor by price, from higher to lower
-        sorted_orders = sorted(self.pob.monitor, key=lambda x: x.price, reverse=True)
-        print(sorted_orders)
-        # get lower
-        higher_order = sorted_orders[0]
+        # get higher
+        higher_order = self.pob.get_extreme_price_order(highest=True)
+        if higher_order is None:
+            log.info('no monitor order to concentrate for liquidity (force sell)')
+            return
         # concentrate it
         self.cm.concentrate_for_liquidity(order=higher_order, ref_mp=cmp - 110, ref_gap=100)
 
@@ -93,15 +150,16 @@ class StrategyManager:
             # compensate the farthest order
         else:
             # select orders to concentrate based on momentum
-            sorted_by_momentum = self.pob.get_monitor_sorted_by_momentum(cmp=cmp)
+            top_momentum = self.pob.get_top_momentum(cmp=cmp, k=K_LIQUIDITY_CANDIDATES)
 
     def check_monitor_list_for_compensation(self, cmp: float) -> int:
         trades_to_new_pt_delta = 0
-        for order in self.pob.monitor:
-            # first compensation
-            if order.compensation_count == 0 \
-                    and order.split_count == 1 \
-                    and order.get_distance(cmp=cmp) > K_DISTANCE_FIRST_COMPENSATION:  # 200
+        self.update_alarms(cmp=cmp)
+        index = self.alarms[StrategyAlarm.COMPENSATION]
+        # first compensation: compensation_count == 0, split_count == 1 and distance > K_DISTANCE_FIRST_COMPENSATION
+        for order in self.get_orders_beyond(alarm=StrategyAlarm.COMPENSATION):
+            # skip orders already removed by a previous compensation in this loop
+            if index.is_active(key=order.uid):
                 # compensate
                 if self.cm.concentrate_orders(  # return true if compensation Ok
                         orders=[order],
@@ -115,12 +173,10 @@ class StrategyManager:
 
     def check_monitor_list_for_n_child(self, cmp: float) -> int:
         trades_to_new_pt_delta = 0
-        for order in self.pob.monitor:
-            # first split
-            if order.cycles_count > K_MIN_CYCLES_FOR_FIRST_SPLIT \
-                    and order.compensation_count == 0 \
-                    and order.split_count == 0 \
-                    and order.get_distance(cmp=cmp) > K_DISTANCE_FOR_FIRST_CHILDREN:  # 150
+        self.update_alarms(cmp=cmp)
+        # first split: compensation_count == 0, split_count == 0 and distance > K_DISTANCE_FOR_FIRST_CHILDREN
+        for order in self.get_orders_beyond(alarm=StrategyAlarm.N_CHILD):
+            if order.cycles_count > K_MIN_CYCLES_FOR_FIRST_SPLIT:
                 # split into n children
                 child_count = 2
                 self.cm.split_n_order(
@@ -153,22 +209,13 @@ class StrategyManager:
 
     def check_side_balance(self, last_cmp: float) -> float:
         trades_to_new_pt_delta = 0  # return value
-        sell_count = 0
-        buy_count = 0
         orders_to_balance: List[Order] = []
-        orders: List[Order] = []
         child_count = 0
-        # get number of orders for each side with distance > K_DISTANCE_FOR_CONCENTRATION
-        for order in self.pob.monitor:
-            if order.concentration_count == 0:  # check it
-                if order.k_side == k_binance.SIDE_BUY:
-                    buy_count += 1
-                    if order.get_distance(last_cmp) > 200:
-                        orders.append(order)
-                elif order.k_side == k_binance.SIDE_SELL:
-                    sell_count += 1
-                    if order.get_distance(last_cmp) > 200:
-                        orders.append(order)
+        self.update_alarms(cmp=last_cmp)
+        # number of not concentrated orders for each side, and those with distance > K_DISTANCE_FOR_SIDE_BALANCE
+        buy_count = self.not_concentrated_count[k_binance.SIDE_BUY]
+        sell_count = self.not_concentrated_count[k_binance.SIDE_SELL]
+        orders = self.get_orders_beyond(alarm=StrategyAlarm.SIDE_BALANCE)
 
         # concentration only if at least 3 orders in one single side with d>150
         if buy_count == 0 and len(orders) > 2:
@@ -0,0 +1,103 @@
+# pp_tick_intake.py
+
+import logging
+import threading
+from collections import deque
+from enum import Enum
+from typing import Callable, Deque, Optional, Tuple, Union
+
+log = logging.getLogger('log')
+
+K_MAX_QUEUED_TICKS = 100  # only used in EVERY_TICK mode
+
+# cmp (last price stream) or (bid, ask) (book ticker stream)
+Tick = Union[float, Tuple[float, float]]
+
+
+class TickIntakeMode(Enum):
+    EVERY_TICK = 1  # process all ticks in arrival order (bounded queue, oldest dropped)
+    LATEST_ONLY = 2  # coalesce bursts, only the freshest price is processed
+
+
+class TickIntake:
+    """Decouples the socket thread from the session tick processing.
+
+    While not started, each pushed tick is processed synchronously (as before).
+    Once started, push() only stores the tick and a worker thread calls the
+    callback, so that ticks received while a tick is being processed are either
+    queued (EVERY_TICK) or merged into the latest one (LATEST_ONLY).
+    """
+    def __init__(self,
+                 callback: Callable[[Tick], None],
+                 mode: TickIntakeMode = TickIntakeMode.LATEST_ONLY,
+                 max_queued: int = K_MAX_QUEUED_TICKS):
+        self.callback = callback
+        self.mode = mode
+        self.max_queued = max_queued
+
+        self._pending: Deque[Tick] = deque()
+        self._cv = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._is_running = False
+
+        # counters
+        self.received_count = 0
+        self.processed_count = 0
+        self.merged_count = 0  # overwritten by a fresher tick (LATEST_ONLY)
+        self.dropped_count = 0  # discarded because the queue was full (EVERY_TICK)
+
+    def start(self) -> None:
+        if self._is_running:
+            return
+        self._is_running = True
+        self._worker = threading.Thread(target=self._run, name='tick-intake', daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        with self._cv:
+            self._is_running = False
+            self._cv.notify()
+
+    def push(self, tick: Tick) -> None:
+        self.received_count += 1
+        if not self._is_running:
+            # synchronous mode
+            self.processed_count += 1
+            self.callback(tick)
+            return
+        with self._cv:
+            if self.mode == TickIntakeMode.LATEST_ONLY:
+                if self._pending:
+                    self.merged_count += len(self._pending)
+                    self._pending.clear()
+            elif len(self._pending) >= self.max_queued:
+                self._pending.popleft()
+                self.dropped_count += 1
+            self._pending.append(tick)
+            self._cv.notify()
+
+    def get_stats(self) -> dict:
+        return dict(
+            mode=self.mode.name.lower(),
+            received=self.received_count,
+            processed=self.processed_count,
+            merged=self.merged_count,
+            dropped=self.dropped_count,
+            queued=len(self._pending)
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while self._is_running and not self._pending:
+                    self._cv.wait()
+                if not self._is_running:
+                    break
+                tick = self._pending.popleft()
+            # callback called without holding the lock, so that new ticks can be pushed meanwhile
+            self.processed_count += 1
+            try:
+                self.callback(tick)
+            except Exception as e:
+                # an error processing one tick must not kill the intake worker
+                log.exception(f'error processing tick {tick}: {e}')
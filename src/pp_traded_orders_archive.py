@@ -0,0 +1,97 @@
+# pp_traded_orders_archive.py
+
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from src.pp_order import Order
+
+log = logging.getLogger('log')
+
+K_ARCHIVE_FILE = 'src/database/traded_archive.db'
+
+K_COLUMNS = [
+    'uid', 'session_id', 'pt_id', 'order_id', 'name', 'k_side', 'price', 'amount',
+    'signed_amount', 'signed_total', 'bnb_commission', 'btc_commission',
+    'status_name', 'traded_cycle', 'creation', 'archived'
+]
+
+
+class TradedOrdersArchive:
+    """On-disk (sqlite) store for the orders of completed pt moved out of memory.
+
+    Written from the session loop, read from the dashboard threads.
+    """
+    def __init__(self, file_name: str = K_ARCHIVE_FILE):
+        self.file_name = file_name
+        if file_name != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+        self.conn = sqlite3.connect(file_name, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._create_table()
+
+    def _create_table(self) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS completed_orders ('
+                'uid TEXT, session_id TEXT, pt_id TEXT, order_id TEXT, name TEXT, k_side TEXT, '
+                'price REAL, amount REAL, signed_amount REAL, signed_total REAL, '
+                'bnb_commission REAL, btc_commission REAL, status_name TEXT, traded_cycle INTEGER, '
+                'creation TEXT, archived TEXT);')
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_completed_orders_session '
+                'ON completed_orders (session_id, pt_id);')
+
+    def add_orders(self, orders: List[Order]) -> None:
+        # one transaction per batch
+        archived = datetime.now().isoformat(timespec='seconds')
+        rows = [(order.uid, order.session_id, order.pt_id, order.order_id, order.name, order.k_side,
+                 order.price, order.amount, order.signed_amount, order.signed_total,
+                 order.bnb_commission, order.btc_commission, order.status_name, order.traded_cycle,
+                 order.creation.isoformat(), archived) for order in orders]
+        placeholders = ', '.join(['?'] * len(K_COLUMNS))
+        try:
+            with self._lock, self.conn:
+                self.conn.executemany(f'INSERT INTO completed_orders VALUES ({placeholders});', rows)
+        except sqlite3.Error as e:
+            log.critical(f'error archiving {len(orders)} completed orders: {e}')
+
+    def get_orders(self,
+                   session_id: Optional[str] = None,
+                   pt_id: Optional[str] = None,
+                   limit: Optional[int] = None) -> List[dict]:
+        # return the archived orders as records (newest first)
+        query = f'SELECT {", ".join(K_COLUMNS)} FROM completed_orders'
+        conditions = []
+        params = []
+        if session_id is not None:
+            conditions.append('session_id = ?')
+            params.append(session_id)
+        if pt_id is not None:
+            conditions.append('pt_id = ?')
+            params.append(pt_id)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY rowid DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(zip(K_COLUMNS, row)) for row in rows]
+
+    def count(self, session_id: Optional[str] = None) -> int:
+        with self._lock:
+            if session_id is None:
+                row = self.conn.execute('SELECT COUNT(*) FROM completed_orders;').fetchone()
+            else:
+                row = self.conn.execute(
+                    'SELECT COUNT(*) FROM completed_orders WHERE session_id = ?;', (session_id,)).fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
@@ -1,31 +1,111 @@
 # pp_traded_orders_book.py
 
-from typing import List
+import time
+from typing import List, Optional, Tuple
 
 from src.pp_order import Order
+from src.pp_traded_orders_archive import TradedOrdersArchive
 
+# completed pt are moved to the archive when exceeding any of these limits
+K_MAX_COMPLETED_ORDERS_IN_MEMORY = 200
+K_MAX_COMPLETED_AGE = 3600.0  # secs since the pt was completed
 
-class TradedOrdersBook:
+
+class CompletedPtSummary:
+    # rolling totals of all completed pt (in memory and archived)
     def __init__(self):
-        self.completed: List[Order] = []
+        self.pt_count = 0
+        self.order_count = 0
+        self.btc_balance = 0.0  # sum(signed_amount - btc_commission)
+        self.eur_balance = 0.0  # sum(signed_total)
+        self.bnb_commission = 0.0
+
+    def add_pt(self, orders: List[Order]) -> None:
+        self.pt_count += 1
+        for order in orders:
+            self.order_count += 1
+            self.btc_balance += order.get_signed_amount() - order.btc_commission
+            self.eur_balance += order.get_signed_total()
+            self.bnb_commission += order.bnb_commission
+
+    def to_dict(self) -> dict:
+        return dict(
+            pt_count=self.pt_count,
+            order_count=self.order_count,
+            btc_balance=self.btc_balance,
+            eur_balance=self.eur_balance,
+            bnb_commission=self.bnb_commission
+        )
+
+
+class TradedOrdersBook:
+    def __init__(self,
+                 archive: Optional[TradedOrdersArchive] = None,
+                 max_completed_orders: int = K_MAX_COMPLETED_ORDERS_IN_MEMORY,
+                 max_completed_age: float = K_MAX_COMPLETED_AGE):
+        self.completed: List[Order] = []  # orders of completed pt not archived yet, in completion order
         self.pending: List[Order] = []
-        self.completed_pt_id: List[str] = []
+        self.completed_pt_id: List[str] = []  # completed pt still in memory, in completion order
+
+        self.archive = archive
+        self.max_completed_orders = max_completed_orders
+        self.max_completed_age = max_completed_age
+
+        self.completed_summary = CompletedPtSummary()
+        # (completion time, orders count) for each completed_pt_id
+        self._completed_pt_info: List[Tuple[float, int]] = []
 
     def add_pending(self, order: Order):
         self.pending.append(order)
 
     def add_completed(self, order: Order):
-        self.completed.append(order)
+        # the pt is completed: its orders traded before are moved from pending to completed too
+        pt_orders = [o for o in self.pending if o.pt_id == order.pt_id]
+        if pt_orders:
+            self.pending = [o for o in self.pending if o.pt_id != order.pt_id]
+        pt_orders.append(order)
+
+        self.completed.extend(pt_orders)
         self.completed_pt_id.append(order.pt_id)
+        self._completed_pt_info.append((time.monotonic(), len(pt_orders)))
+        self.completed_summary.add_pt(orders=pt_orders)
+
+        self.archive_completed()
+
+    def archive_completed(self, now: Optional[float] = None) -> int:
+        # move the oldest completed pt to the archive while over the count or age limits
+        if self.archive is None:
+            return 0
+        now = time.monotonic() if now is None else now
+        in_memory_count = len(self.completed)
+        pt_count = 0
+        orders_count = 0
+        for completion_time, pt_orders_count in self._completed_pt_info:
+            is_too_many = in_memory_count - orders_count > self.max_completed_orders
+            is_too_old = now - completion_time > self.max_completed_age
+            if not (is_too_many or is_too_old):
+                break
+            pt_count += 1
+            orders_count += pt_orders_count
+
+        if pt_count > 0:
+            self.archive.add_orders(orders=self.completed[:orders_count])
+            del self.completed[:orders_count]
+            del self._completed_pt_info[:pt_count]
+            del self.completed_pt_id[:pt_count]
+        return orders_count
 
     def get_all_traded_orders(self) -> List[Order]:
+        # in memory only, archived orders through get_archived_orders()
         return self.completed + self.pending
 
+    def get_archived_orders(self, session_id: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        if self.archive is None:
+            return []
+        return self.archive.get_orders(session_id=session_id, limit=limit)
+
     def set_new_pt_id(self, new_pt_id: str, pt_id_list: List[str]) -> None:
         # change pt_id of orders with pt_id in the passed list
         for order in self.pending:
             if order.pt_id in pt_id_list:
                 order.pt_id = new_pt_id
-
-
-
@@ -0,0 +1,455 @@
+# binance_standin.py
+#
+# local stand-in for the binance spot REST api and websocket streams, so that the real network path of
+# Market(client_mode='binance') (http client, request signing, socket manager, frames decoding) can be
+# load tested against localhost
+#   $> python -m src.sockets.binance_standin --tick-rate 50 --rest-latency 0.005
+#
+#   REST:    /api/<v1|v3>/ ping, time, exchangeInfo, avgPrice, account, order (POST, DELETE), userDataStream
+#   streams: /ws/<symbol>@ticker, /ws/<symbol>@bookTicker, /ws/<listen key>
+#
+# the exchange state (matching, balances, user events) is a FakeClient, driven by a random walk at tick_rate
+# REST and streams share the same port: api_url http://host:port/api, stream_url ws://host:port/
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import random
+import secrets
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+from src.pp_fake_client import FakeClient, FakeCmpMode, K_INITIAL_CMP, K_SPREAD
+from src.pp_request_weight import RequestWeightTracker, RequestPriority, K_REQUEST_WEIGHTS, K_WEIGHT_LIMIT
+
+log = logging.getLogger('log')
+
+K_STANDIN_HOST = '127.0.0.1'
+K_STANDIN_PORT = 65433
+
+K_TICK_RATE = 2.0  # ticks per second (0: ticks only by set_cmp)
+K_CMP_STEPS = [-20, -10, -5, 0, 5, 10, 20]
+K_SYMBOL = 'BTCEUR'
+
+K_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+K_MAX_HEADER_SIZE = 1 << 14
+K_MAX_WRITE_BUFFER = 1 << 20  # stream messages are dropped for clients not reading
+
+# rest path: (endpoint name in the request weight cost model, priority, signed)
+K_ENDPOINTS = {
+    ('POST', 'order'): ('place_order', RequestPriority.PLACE, True),
+    ('DELETE', 'order'): ('cancel_order', RequestPriority.CANCEL, True),
+    ('GET', 'account'): ('get_asset_balance', RequestPriority.BALANCE, True),
+    ('GET', 'exchangeInfo'): ('get_symbol_info', RequestPriority.BALANCE, False),
+    ('GET', 'avgPrice'): ('get_avg_price', RequestPriority.BALANCE, False),
+    ('GET', 'ping'): ('ping', RequestPriority.BALANCE, False),
+    ('GET', 'time'): ('time', RequestPriority.BALANCE, False),
+    ('POST', 'userDataStream'): ('user_data_stream', RequestPriority.BALANCE, False),
+    ('PUT', 'userDataStream'): ('user_data_stream', RequestPriority.BALANCE, False),
+    ('DELETE', 'userDataStream'): ('user_data_stream', RequestPriority.BALANCE, False)
+}
+
+K_HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found', 429: 'Too Many Requests'}
+
+
+class BinanceError(Exception):
+    # rejected request, returned as a binance error payload {"code": ..., "msg": ...}
+    def __init__(self, status: int, code: int, msg: str):
+        super().__init__(msg)
+        self.status = status
+        self.code = code
+        self.msg = msg
+
+
+def encode_message(msg: dict) -> bytes:
+    # compact and in insertion order ("e" first), as binance frames (see pp_message_decoder)
+    return json.dumps(msg, separators=(',', ':')).encode('utf-8')
+
+
+def encode_ws_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    # server frames are never masked
+    size = len(payload)
+    if size < 126:
+        header = struct.pack('>BB', 0x80 | opcode, size)
+    elif size < 1 << 16:
+        header = struct.pack('>BBH', 0x80 | opcode, 126, size)
+    else:
+        header = struct.pack('>BBQ', 0x80 | opcode, 127, size)
+    return header + payload
+
+
+async def read_ws_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    # (opcode, unmasked payload) of a client frame (fragmented frames are not used by binance clients)
+    b0, b1 = await reader.readexactly(2)
+    size = b1 & 0x7f
+    if size == 126:
+        (size,) = struct.unpack('>H', await reader.readexactly(2))
+    elif size == 127:
+        (size,) = struct.unpack('>Q', await reader.readexactly(8))
+    mask = await reader.readexactly(4) if b1 & 0x80 else None
+    payload = await reader.readexactly(size)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return b0 & 0x0f, payload
+
+
+def get_ws_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + K_WS_GUID).encode()).digest()).decode()
+
+
+def get_signature(secret: str, params: List[Tuple[str, str]]) -> str:
+    # as signed by the binance client: key=value pairs in the order sent, signature excluded
+    query = '&'.join(f'{k}={v}' for k, v in params if k != 'signature')
+    return hmac.new(secret.encode('utf-8'), query.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class BinanceStandin:
+    def __init__(self,
+                 host: str = K_STANDIN_HOST,
+                 port: int = K_STANDIN_PORT,
+                 rest_latency: float = 0.0,
+                 stream_latency: float = 0.0,
+                 tick_rate: float = K_TICK_RATE,
+                 weight_limit: int = K_WEIGHT_LIMIT,
+                 api_secret: Optional[str] = None,
+                 cmp: float = K_INITIAL_CMP,
+                 seed: Optional[int] = None):
+        self.host = host
+        self.port = port  # 0: any free port (updated once listening)
+        self.rest_latency = rest_latency  # secs added to each REST response
+        self.stream_latency = stream_latency  # secs added to each stream message
+        self.tick_rate = tick_rate
+        self.api_secret = api_secret  # when set, signed requests are verified
+        self._random = random.Random(seed)
+
+        # all the exchange state is only accessed from the server thread
+        self.client = FakeClient(
+            user_socket_callback=self._on_user_event,
+            symbol_ticker_callback=self._on_ticker,
+            cmp=cmp,
+            mode=FakeCmpMode.MODE_MANUAL)
+        self.request_weight = RequestWeightTracker(limit=weight_limit)
+        self.listen_key = secrets.token_hex(32)  # 64 chars, as binance ones
+        self.streams: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._book_update_id = 0
+
+        self.requests_count = 0
+        self.rejected_count = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+
+        self._thread: Optional[threading.Thread] = None
+        self._aio_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._is_listening = threading.Event()
+
+    @property
+    def api_url(self) -> str:
+        return f'http://{self.host}:{self.port}/api'
+
+    @property
+    def stream_url(self) -> str:
+        return f'ws://{self.host}:{self.port}/'
+
+    # ********** thread control **********
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='binance-standin', daemon=True)
+        self._thread.start()
+        self._is_listening.wait(timeout=5.0)
+
+    def stop(self) -> None:
+        if self._aio_loop is not None and self._stop_event is not None:
+            self._aio_loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self._thread = None
+
+    def set_cmp(self, cmp: float) -> None:
+        # manual tick (from any thread)
+        self._aio_loop.call_soon_threadsafe(self._process_cmp, cmp)
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            log.exception(f'binance stand-in stopped: {e}')
+        finally:
+            self._is_listening.set()
+
+    async def _serve(self) -> None:
+        self._aio_loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        log.info(f'binance stand-in listening at {self.host}:{self.port}')
+        self._is_listening.set()
+
+        ticker = asyncio.create_task(self._generate_ticks()) if self.tick_rate > 0 else None
+        async with server:
+            await self._stop_event.wait()
+        if ticker:
+            ticker.cancel()
+        # connections closed and their handlers finished before the loop is closed
+        tasks = list(self._connections.values())
+        for writer in list(self._connections.keys()):
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ********** exchange **********
+
+    async def _generate_ticks(self) -> None:
+        interval = 1 / self.tick_rate
+        next_time = self._aio_loop.time()
+        while True:
+            # fixed rate, whatever the time spent processing each tick
+            next_time += interval
+            await asyncio.sleep(max(0.0, next_time - self._aio_loop.time()))
+            self._process_cmp(cmp=self.client.cmp + self._random.choice(K_CMP_STEPS))
+
+    def _process_cmp(self, cmp: float) -> None:
+        self.client.cmp = cmp
+        self.client._process_cmp_change()
+
+    def _on_ticker(self, msg: dict) -> None:
+        # fake client 24hrTicker: published as last price and as best bid/ask around it
+        symbol = K_SYMBOL.lower()
+        cmp = float(msg['c'])
+        event_time = int(time.time() * 1000)
+        if self.streams.get(f'{symbol}@ticker'):
+            self._publish(stream=f'{symbol}@ticker', msg=dict(e='24hrTicker', E=event_time, s=K_SYMBOL, c=msg['c']))
+        if self.streams.get(f'{symbol}@bookticker'):
+            self._book_update_id += 1
+            self._publish(stream=f'{symbol}@bookticker', msg=dict(
+                u=self._book_update_id,
+                s=K_SYMBOL,
+                b=str(round(cmp - K_SPREAD / 2, 2)),
+                B='1.00000000',
+                a=str(round(cmp + K_SPREAD / 2, 2)),
+                A='1.00000000'))
+
+    def _on_user_event(self, msg: dict) -> None:
+        msg = dict(e=msg['e'], E=int(time.time() * 1000), **{k: v for k, v in msg.items() if k != 'e'})
+        if msg['e'] == 'outboundAccountPosition':
+            # binance balances are strings
+            msg['B'] = [dict(a=b['a'], f=str(b['f']), l=str(b['l'])) for b in msg['B']]
+        self._publish(stream=self.listen_key, msg=msg)
+
+    def _publish(self, stream: str, msg: dict) -> None:
+        writers = self.streams.get(stream)
+        if not writers:
+            return
+        # encoded once for all the stream subscribers
+        frame = encode_ws_frame(encode_message(msg))
+        for writer in list(writers):
+            if self.stream_latency > 0:
+                self._aio_loop.call_later(self.stream_latency, self._write_frame, writer, frame)
+            else:
+                self._write_frame(writer=writer, frame=frame)
+
+    def _write_frame(self, writer: asyncio.StreamWriter, frame: bytes) -> None:
+        transport = writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > K_MAX_WRITE_BUFFER:
+            self.messages_dropped += 1
+            return
+        writer.write(frame)
+        self.messages_sent += 1
+
+    # ********** connections **********
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # keep-alive http connection, or websocket once upgraded
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request = await self._read_http_request(reader=reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    await self._handle_websocket(reader=reader, writer=writer, target=target, headers=headers)
+                    break
+                status, payload, extra_headers = await self._handle_rest(method=method, target=target, body=body)
+                self._write_http_response(writer=writer, status=status, payload=payload, headers=extra_headers)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    @staticmethod
+    async def _read_http_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return None
+        if len(head) > K_MAX_HEADER_SIZE:
+            return None
+        lines = head.decode('latin-1').split('\r\n')
+        method, target, _ = lines[0].split(' ', 2)
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        size = int(headers.get('content-length', 0))
+        body = await reader.readexactly(size) if size else b''
+        return method, target, headers, body
+
+    def _write_http_response(self, writer: asyncio.StreamWriter, status: int, payload: bytes, headers: dict) -> None:
+        used_weight = self.request_weight.get_used()
+        lines = [f'HTTP/1.1 {status} {K_HTTP_REASONS.get(status, "Error")}',
+                 'Content-Type: application/json;charset=UTF-8',
+                 f'Content-Length: {len(payload)}',
+                 f'x-mbx-used-weight: {used_weight}',
+                 f'x-mbx-used-weight-1m: {used_weight}']
+        lines += [f'{k}: {v}' for k, v in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+
+    # ********** REST **********
+
+    async def _handle_rest(self, method: str, target: str, body: bytes) -> Tuple[int, bytes, dict]:
+        if self.rest_latency > 0:
+            await asyncio.sleep(self.rest_latency)
+        self.requests_count += 1
+        url = urlsplit(target)
+        params = parse_qsl(url.query) + parse_qsl(body.decode('utf-8'))
+        try:
+            data = self._process_rest(method=method, path=url.path, params=params)
+            return 200, encode_message(data), {}
+        except BinanceError as e:
+            self.rejected_count += 1
+            headers = {'Retry-After': int(self.request_weight.window)} if e.status == 429 else {}
+            return e.status, encode_message(dict(code=e.code, msg=e.msg)), headers
+
+    def _process_rest(self, method: str, path: str, params: List[Tuple[str, str]]) -> dict:
+        # /api/v3/order -> order
+        endpoint = K_ENDPOINTS.get((method, path.rsplit('/', 1)[-1]))
+        if endpoint is None or not path.startswith('/api/'):
+            raise BinanceError(status=404, code=-1000, msg=f'unknown endpoint {method} {path}')
+        name, priority, is_signed = endpoint
+
+        # request weight (hard limit: the client is expected to back off before reaching it)
+        if self.request_weight.get_used() + K_REQUEST_WEIGHTS.get(name, 1) > self.request_weight.limit:
+            raise BinanceError(status=429, code=-1003, msg='Too much request weight used.')
+        self.request_weight.record(endpoint=name, priority=priority)
+
+        if is_signed and self.api_secret is not None:
+            signature = dict(params).get('signature')
+            if signature is None or not hmac.compare_digest(signature, get_signature(self.api_secret, params)):
+                raise BinanceError(status=401, code=-1022, msg='Signature for this request is not valid.')
+
+        p = dict(params)
+        if name == 'place_order':
+            msg = self.client.create_order(
+                symbol=p.get('symbol'),
+                side=p.get('side'),
+                type=p.get('type'),
+                timeInForce=p.get('timeInForce'),
+                quantity=float(p.get('quantity', 0.0)),
+                price=p.get('price'),
+                newClientOrderId=p.get('newClientOrderId'))
+            if not msg:
+                raise BinanceError(status=400, code=-2010, msg='Account has insufficient balance for requested action.')
+            return msg
+        if name == 'cancel_order':
+            msg = self.client.cancel_order(symbol=p.get('symbol'), origClientOrderId=p.get('origClientOrderId'))
+            if not msg:
+                raise BinanceError(status=400, code=-2011, msg='Unknown order sent.')
+            return msg
+        if name == 'get_asset_balance':
+            return dict(canTrade=True, balances=[self.client.get_asset_balance(asset) for asset in ['BTC', 'EUR', 'BNB']])
+        if name == 'get_symbol_info':
+            return dict(timezone='UTC', serverTime=int(time.time() * 1000), rateLimits=[],
+                        symbols=[self.client.get_symbol_info(K_SYMBOL)])
+        if name == 'get_avg_price':
+            return self.client.get_avg_price(symbol=p.get('symbol'))
+        if name == 'time':
+            return dict(serverTime=int(time.time() * 1000))
+        if name == 'user_data_stream' and method == 'POST':
+            return dict(listenKey=self.listen_key)
+        return {}
+
+    # ********** websocket streams **********
+
+    async def _handle_websocket(self,
+                                reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter,
+                                target: str,
+                                headers: Dict[str, str]) -> None:
+        path = urlsplit(target).path
+        stream = path[len('/ws/'):] if path.startswith('/ws/') else ''
+        stream = stream if stream == self.listen_key else stream.lower()
+        if stream != self.listen_key and stream not in (f'{K_SYMBOL.lower()}@ticker', f'{K_SYMBOL.lower()}@bookticker'):
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+            return
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\n'
+                      'Upgrade: websocket\r\n'
+                      'Connection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {get_ws_accept(headers.get("sec-websocket-key", ""))}\r\n'
+                      '\r\n').encode('latin-1'))
+        self.streams.setdefault(stream, set()).add(writer)
+        try:
+            # only control frames are expected from the client
+            while True:
+                opcode, payload = await read_ws_frame(reader=reader)
+                if opcode == 0x8:  # close
+                    writer.write(encode_ws_frame(payload[:2], opcode=0x8))
+                    break
+                if opcode == 0x9:  # ping
+                    writer.write(encode_ws_frame(payload, opcode=0xa))
+        finally:
+            self.streams[stream].discard(writer)
+
+    def get_stats(self) -> dict:
+        return dict(
+            requests=self.requests_count,
+            rejected=self.rejected_count,
+            messages_sent=self.messages_sent,
+            messages_dropped=self.messages_dropped,
+            stream_clients={stream: len(writers) for stream, writers in self.streams.items()},
+            request_weight=self.request_weight.get_stats()
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='local binance spot REST & websocket stand-in')
+    parser.add_argument('--host', default=K_STANDIN_HOST)
+    parser.add_argument('--port', type=int, default=K_STANDIN_PORT)
+    parser.add_argument('--rest-latency', type=float, default=0.0, help='secs added to each REST response')
+    parser.add_argument('--stream-latency', type=float, default=0.0, help='secs added to each stream message')
+    parser.add_argument('--tick-rate', type=float, default=K_TICK_RATE, help='ticker messages per second')
+    parser.add_argument('--weight-limit', type=int, default=K_WEIGHT_LIMIT, help='request weight per minute')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    standin = BinanceStandin(host=args.host, port=args.port, rest_latency=args.rest_latency,
+                             stream_latency=args.stream_latency, tick_rate=args.tick_rate,
+                             weight_limit=args.weight_limit)
+    standin.start()
+    print(f'api_url: {standin.api_url} - stream_url: {standin.stream_url}')
+    try:
+        while True:
+            time.sleep(10.0)
+            print(standin.get_stats())
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
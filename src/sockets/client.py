@@ -1,29 +1,68 @@
 # client.py
-
-import socket
-
+#
+# command line client for the control server (see server.py for the protocol)
+#   $> python -m src.sockets.client
+#
 # to close a socket
 #  1. identify the process using the socket
 #     $> sudo lsof -i :65432
 #     $> sudo kill [PID]1
 
+import json
+import socket
+from typing import Optional
+
+from src.sockets.server import HOST, PORT, K_HEADER, encode_frame
+
+K_OPTIONS = ['snapshot', 'metrics', 'profile', 'subscribe', 'pause_new_pt', 'resume_new_pt', 'stop', 'exit']
+
 
-HOST = '127.0.0.1'
-PORT = 65432
-
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    s.connect((HOST, PORT))
-    options = ['1', 'q', 'exit']
-    # exit = False
-    while True:
-        msg = input('enter option...')
-        if msg in options:
-            s.sendall(msg.encode(encoding='utf-8'))
-            server_response = s.recv(1024)
-            print(server_response.decode(encoding='utf-8'))
-            if msg == 'exit':
-                # exit = True
+def recv_exactly(s: socket.socket, size: int) -> Optional[bytes]:
+    data = b''
+    while len(data) < size:
+        chunk = s.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def recv_frame(s: socket.socket) -> Optional[dict]:
+    header = recv_exactly(s, K_HEADER.size)
+    if header is None:
+        return None
+    (size,) = K_HEADER.unpack(header)
+    payload = recv_exactly(s, size)
+    return None if payload is None else json.loads(payload)
+
+
+def main():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.connect((HOST, PORT))
+        request_id = 0
+        while True:
+            cmd = input(f'enter option {K_OPTIONS}...')
+            if cmd not in K_OPTIONS:
+                print('option selected not allowed')
+                continue
+            if cmd == 'exit':
                 break
-        else:
-            print('option selected not allowed')
-    s.close()  # probably not needed
+            request_id += 1
+            s.sendall(encode_frame(dict(id=request_id, cmd=cmd)))
+            print(json.dumps(recv_frame(s), indent=2))
+            if cmd == 'stop':
+                break
+            if cmd == 'subscribe':
+                # print the streamed events until ctrl-c
+                try:
+                    while True:
+                        frame = recv_frame(s)
+                        if frame is None:
+                            return
+                        print(json.dumps(frame))
+                except KeyboardInterrupt:
+                    break
+
+
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,314 @@
-#!python3
 # server.py
+#
+# asyncio control server: one thread serves all the clients and never blocks the session loop
+#   frame:    4 bytes big-endian payload length + utf-8 json payload
+#   request:  {"id": 1, "cmd": "snapshot"}
+#   response: {"id": 1, "ok": true, "data": {...}}  or  {"id": 1, "ok": false, "error": "..."}
+#   subscribed clients also receive {"event": "snapshot" | "orders", "data": {...}} frames
+#
+# commands: snapshot, metrics, shadows, profile, subscribe, unsubscribe, pause_new_pt, resume_new_pt, stop
 
-import socket
+import asyncio
+import json
+import logging
+import struct
 import threading
+from typing import List, Optional, Set, Tuple
 
-from polaris_old.pp_climanager import CLIManager
+from src.pp_order import Order
+from src.pp_session import Session, SessionSnapshot, QuitMode
+from src.pp_shadow_sessions import ShadowSessions
+
+log = logging.getLogger('log')
 
 HOST = '127.0.0.1'
 PORT = 65432
 
+K_HEADER = struct.Struct('>I')
+K_MAX_FRAME_SIZE = 1 << 20  # 1 MiB, bigger requests close the connection
+K_PUBLISH_INTERVAL = 1.0  # secs
+K_MAX_WRITE_BUFFER = 1 << 20  # events are dropped for clients not reading (requests responses never)
+K_PROFILE_SECONDS = 10.0
+
+
+def encode_frame(message: dict) -> bytes:
+    payload = json.dumps(message).encode('utf-8')
+    return K_HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    # None when the connection has been closed by the client
+    try:
+        (size,) = K_HEADER.unpack(await reader.readexactly(K_HEADER.size))
+        if size > K_MAX_FRAME_SIZE:
+            raise ValueError(f'frame too big: {size} bytes')
+        payload = await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+    return json.loads(payload)
+
+
+def get_order_record(order: Order) -> dict:
+    return dict(
+        uid=order.uid,
+        pt_id=order.pt_id,
+        name=order.name,
+        k_side=order.k_side,
+        price=order.price,
+        amount=order.amount,
+        status_name=order.status_name,
+        bnb_commission=order.bnb_commission,
+        traded_cycle=order.traded_cycle
+    )
+
+
+def get_snapshot_summary(snapshot: SessionSnapshot) -> dict:
+    return dict(
+        version=snapshot.version,
+        last_cmp=snapshot.last_cmp,
+        last_bid=snapshot.last_bid,
+        last_ask=snapshot.last_ask,
+        ticker_count=snapshot.ticker_count,
+        cycles_from_last_trade=snapshot.cycles_from_last_trade,
+        pt_created_count=snapshot.pt_created_count,
+        buy_count=snapshot.buy_count,
+        sell_count=snapshot.sell_count,
+        new_pt_permission_granted=snapshot.new_pt_permission_granted,
+        monitor_count=len(snapshot.monitor),
+        placed_count=len(snapshot.placed),
+        completed_summary=snapshot.completed_summary
+    )
+
+
+def get_orders_changes(old: Optional[SessionSnapshot], new: SessionSnapshot) -> Tuple[List[dict], List[str]]:
+    # changed (or new) order records and removed uids (archived orders) between two snapshots
+    # applied as upserts by the clients, so a change received twice is harmless
+    new_records = {order.uid: get_order_record(order) for order in new.get_pending_orders() + new.get_traded_orders()}
+    if old is None:
+        return list(new_records.values()), []
+    old_records = {order.uid: get_order_record(order) for order in old.get_pending_orders() + old.get_traded_orders()}
+    changed = [record for uid, record in new_records.items() if old_records.get(uid) != record]
+    removed = [uid for uid in old_records.keys() if uid not in new_records]
+    return changed, removed
+
+
+class _Client:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.is_subscribed = False
+        self.dropped_count = 0
+
+
+class ControlServer:
+    def __init__(self,
+                 session: Session,
+                 host: str = HOST,
+                 port: int = PORT,
+                 publish_interval: float = K_PUBLISH_INTERVAL,
+                 shadows: Optional[ShadowSessions] = None):
+        self.session = session
+        self.shadows = shadows
+        self.host = host
+        self.port = port  # 0: any free port (updated once listening)
+        self.publish_interval = publish_interval
+
+        self.clients: Set[_Client] = set()  # only accessed from the server thread
+        self._commands = {
+            'snapshot': self._cmd_snapshot,
+            'metrics': self._cmd_metrics,
+            'shadows': self._cmd_shadows,
+            'profile': self._cmd_profile,
+            'subscribe': self._cmd_subscribe,
+            'unsubscribe': self._cmd_unsubscribe,
+            'pause_new_pt': self._cmd_pause_new_pt,
+            'resume_new_pt': self._cmd_resume_new_pt,
+            'stop': self._cmd_stop
+        }
+
+        self._thread: Optional[threading.Thread] = None
+        self._aio_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._is_listening = threading.Event()
+
+    # ********** thread control **********
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='control-server', daemon=True)
+        self._thread.start()
+        # wait until listening (or failed) so that the port is known
+        self._is_listening.wait(timeout=5.0)
+
+    def stop(self) -> None:
+        if self._aio_loop is not None and self._stop_event is not None:
+            self._aio_loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self._thread = None
 
-class Server:
-    def __init__(self, clm: CLIManager):
-        self.clm = clm
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.bind((HOST, PORT))
-        self.start_listening()
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            log.exception(f'control server stopped: {e}')
+        finally:
+            self._is_listening.set()
 
-    def start_connection(self, conn, addr):
-        with conn:
-            print('connected by ', addr)
-            options = ['0', '1', '2', '3', 'q', 'exit']
+    async def _serve(self) -> None:
+        self._aio_loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        log.info(f'control server listening at {self.host}:{self.port}')
+        self._is_listening.set()
+
+        publisher = asyncio.create_task(self._publish())
+        async with server:
+            await self._stop_event.wait()
+        publisher.cancel()
+        for client in list(self.clients):
+            client.writer.close()
+        log.info('control server stopped')
+
+    # ********** connections **********
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = _Client(writer=writer)
+        self.clients.add(client)
+        peer = writer.get_extra_info('peername')
+        log.info(f'control client connected: {peer}')
+        try:
             while True:
-                response = ''
-                remote_user_input = conn.recv(1024).decode(encoding='utf-8')
-                if remote_user_input in options:
-                    print(remote_user_input)
-                    response = f'option correct: {remote_user_input}'
-                    self.clm.process(user_input=remote_user_input)
-                else:
-                    response = f'option not recognised: {remote_user_input}'
-                conn.sendall(response.encode(encoding='utf-8'))
-                if remote_user_input == 'exit' or not remote_user_input:
+                try:
+                    request = await read_frame(reader=reader)
+                except ValueError as e:
+                    # the framing can not be trusted anymore
+                    self._send(client=client, frame=encode_frame(dict(id=None, ok=False, error=str(e))))
+                    break
+                if request is None:
+                    break
+                response = await self._process(client=client, request=request)
+                self._send(client=client, frame=encode_frame(response))
+                await writer.drain()
+                if response.get('ok') and request.get('cmd') == 'stop':
+                    self._stop_event.set()
                     break
-        print(f'connection with {addr} ended')
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.close()
+            log.info(f'control client disconnected: {peer} (events dropped: {client.dropped_count})')
+
+    async def _process(self, client: _Client, request: dict) -> dict:
+        if not isinstance(request, dict):
+            return dict(id=None, ok=False, error='request must be a json object')
+        request_id = request.get('id')
+        handler = self._commands.get(request.get('cmd'))
+        if handler is None:
+            return dict(id=request_id, ok=False, error=f'unknown command: {request.get("cmd")}')
+        try:
+            data = await handler(client, request)
+        except Exception as e:
+            log.exception(f'error processing control request {request}: {e}')
+            return dict(id=request_id, ok=False, error=str(e))
+        return dict(id=request_id, ok=True, data=data)
+
+    @staticmethod
+    def _send(client: _Client, frame: bytes, droppable: bool = False) -> None:
+        transport = client.writer.transport
+        if transport.is_closing():
+            return
+        if droppable and transport.get_write_buffer_size() > K_MAX_WRITE_BUFFER:
+            # slow client: the events are skipped instead of buffered without limit
+            client.dropped_count += 1
+            return
+        client.writer.write(frame)
+
+    async def _get_snapshot(self) -> SessionSnapshot:
+        # the snapshot may need to be built in the session loop: wait for it in a worker thread
+        return await asyncio.get_running_loop().run_in_executor(None, self.session.get_snapshot)
+
+    # ********** commands **********
+
+    async def _cmd_snapshot(self, client: _Client, request: dict) -> dict:
+        snapshot = await self._get_snapshot()
+        orders, _ = get_orders_changes(old=None, new=snapshot)
+        return dict(get_snapshot_summary(snapshot), orders=orders)
+
+    async def _cmd_metrics(self, client: _Client, request: dict) -> dict:
+        # rate limit stats read in the session loop (single writer): waited for in a worker thread
+        limit_stats = await asyncio.get_running_loop().run_in_executor(None, self.session.get_limit_stats)
+        return dict(
+            stages=self.session.metrics.get_summary(),
+            tick_intake=self.session.market.tick_intake.get_stats(),
+            **limit_stats
+        )
+
+    async def _cmd_shadows(self, client: _Client, request: dict) -> dict:
+        # live and shadow sessions results side by side
+        if self.shadows is None:
+            return {}
+        return await asyncio.get_running_loop().run_in_executor(None, self.shadows.get_report)
+
+    async def _cmd_profile(self, client: _Client, request: dict) -> dict:
+        # {"cmd": "profile", "seconds": 10}: answered once the capture has been written
+        seconds = float(request.get('seconds', K_PROFILE_SECONDS))
+        profiler = self.session.profiler
+        if not profiler.start(seconds=seconds, reason='control'):
+            raise RuntimeError('a profile capture is already running')
+        result = await asyncio.get_running_loop().run_in_executor(None, profiler.wait, seconds + 10.0)
+        if result is None:
+            raise RuntimeError('the profile capture failed (see the log)')
+        return dict(file_name=result.file_name, seconds=result.seconds, samples=result.samples,
+                    top=[dict(stack=stack, count=count) for stack, count in result.get_top()])
+
+    async def _cmd_subscribe(self, client: _Client, request: dict) -> dict:
+        # the full state is returned, then the changes are streamed every publish interval
+        client.is_subscribed = True
+        return await self._cmd_snapshot(client=client, request=request)
+
+    async def _cmd_unsubscribe(self, client: _Client, request: dict) -> dict:
+        client.is_subscribed = False
+        return {}
+
+    async def _cmd_pause_new_pt(self, client: _Client, request: dict) -> dict:
+        # control commands are queued to the session loop (fire and forget)
+        self.session.loop.submit(self.session.pause_new_pt)
+        return {}
+
+    async def _cmd_resume_new_pt(self, client: _Client, request: dict) -> dict:
+        self.session.loop.submit(self.session.resume_new_pt)
+        return {}
+
+    async def _cmd_stop(self, client: _Client, request: dict) -> dict:
+        # the server is stopped too once the response has been sent
+        quit_mode = QuitMode[request.get('quit_mode', 'cancel_all_placed').upper()]
+        self.session.loop.submit(self.session.quit, quit_mode=quit_mode)
+        return dict(quit_mode=quit_mode.name.lower())
+
+    # ********** subscriptions **********
 
-    def start_listening(self):
-        conns_count = 0
+    async def _publish(self) -> None:
+        last_snapshot: Optional[SessionSnapshot] = None
         while True:
-            print(f'\nserver listening at {HOST}:{PORT}')
-            self.socket.listen()
-            # accept() blocks
-            conns_count += 1
-            print(f'connections count: {conns_count}')
-            conn, addr = self.socket.accept()
-            x = threading.Thread(target=self.start_connection, args=(conn, addr))
-            x.start()
+            await asyncio.sleep(self.publish_interval)
+            subscribers = [client for client in self.clients if client.is_subscribed]
+            if not subscribers:
+                continue
+            try:
+                snapshot = await self._get_snapshot()
+                if last_snapshot is not None and snapshot.version == last_snapshot.version:
+                    continue
+                # encoded once for all the subscribers
+                frames = [encode_frame(dict(event='snapshot', data=get_snapshot_summary(snapshot)))]
+                changed, removed = get_orders_changes(old=last_snapshot, new=snapshot)
+                if changed or removed:
+                    frames.append(encode_frame(dict(event='orders', data=dict(changed=changed, removed=removed))))
+                last_snapshot = snapshot
+                for client in subscribers:
+                    for frame in frames:
+                        self._send(client=client, frame=frame, droppable=True)
+            except Exception as e:
+                log.exception(f'error publishing session events: {e}')
@@ -0,0 +1,39 @@
+# xb_exact_sum.py
+
+import math
+from typing import Tuple
+
+
+class ExactSum:
+    """Running sum without rounding error (Shewchuk's non-overlapping partials, as math.fsum).
+
+    Values can be added and subtracted in any order: after subtracting every value added the sum is exactly 0,
+    so a running aggregate never drifts from the sum of the current items.
+    """
+    def __init__(self):
+        self._partials = []
+
+    def add(self, x: float) -> None:
+        partials = self._partials
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                partials[i] = lo
+                i += 1
+            x = hi
+        partials[i:] = [x]
+
+    def subtract(self, x: float) -> None:
+        self.add(-x)
+
+    def get_value(self) -> float:
+        # correctly rounded
+        return math.fsum(self._partials)
+
+    def get_partials(self) -> Tuple[float, ...]:
+        # exact state, to be summed later together with other sums: math.fsum(chain(p1, p2, ...))
+        return tuple(self._partials)
@@ -0,0 +1,153 @@
+# xb_metrics.py
+
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Optional, Tuple
+
+# HDR-like layout: values below 2 * K_SUB_BUCKET_HALF are stored exactly, above that
+# each power of two is split in K_SUB_BUCKET_HALF linear sub-buckets (< 1% relative error)
+K_SUB_BUCKET_BITS = 7
+K_SUB_BUCKET_HALF = 1 << (K_SUB_BUCKET_BITS - 1)  # 64
+K_MAX_SHIFT = 40  # values up to 2^47 ns (~39 h) are tracked, above that they are clamped
+
+
+class LatencyHistogram:
+    def __init__(self, name: str):
+        self.name = name
+        self.counts: List[int] = [0] * (2 * K_SUB_BUCKET_HALF + K_MAX_SHIFT * K_SUB_BUCKET_HALF)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        # value in ns (or any non-negative integer unit)
+        if value < 0:
+            value = 0
+        shift = value.bit_length() - K_SUB_BUCKET_BITS
+        if shift <= 0:
+            index = value
+        else:
+            if shift > K_MAX_SHIFT:
+                shift = K_MAX_SHIFT
+                value = (1 << (K_MAX_SHIFT + K_SUB_BUCKET_BITS)) - 1
+            index = 2 * K_SUB_BUCKET_HALF + (shift - 1) * K_SUB_BUCKET_HALF + (value >> shift) - K_SUB_BUCKET_HALF
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def record_since(self, start_ns: int) -> int:
+        elapsed = perf_counter_ns() - start_ns
+        self.record(elapsed)
+        return elapsed
+
+    @staticmethod
+    def get_bucket_limits(index: int) -> (int, int):
+        # return the lowest and highest value stored in the bucket with the index passed
+        if index < 2 * K_SUB_BUCKET_HALF:
+            return index, index
+        shift = (index - 2 * K_SUB_BUCKET_HALF) // K_SUB_BUCKET_HALF + 1
+        sub = (index - 2 * K_SUB_BUCKET_HALF) % K_SUB_BUCKET_HALF + K_SUB_BUCKET_HALF
+        low = sub << shift
+        return low, low + (1 << shift) - 1
+
+    def get_percentile(self, percentile: float) -> int:
+        if self.count == 0:
+            return 0
+        target = max(1, int(round(percentile / 100.0 * self.count)))
+        accumulated = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                accumulated += count
+                if accumulated >= target:
+                    low, high = LatencyHistogram.get_bucket_limits(index)
+                    return min(high, self.max)
+        return self.max
+
+    def get_mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self) -> None:
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def get_summary(self) -> dict:
+        # values in microseconds
+        return dict(
+            stage=self.name,
+            count=self.count,
+            p50=self.get_percentile(50.0) / 1_000,
+            p99=self.get_percentile(99.0) / 1_000,
+            max=self.max / 1_000,
+            mean=self.get_mean() / 1_000
+        )
+
+
+class Counter:
+    # monotonic count, only increased by the thread owning it (read from any thread)
+    __slots__ = ('name', 'labels', 'value', '_fn')
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...]):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self._fn: Optional[Callable[[], float]] = None
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        # value kept by another object (read when collected)
+        self._fn = fn
+
+    def get(self) -> float:
+        return self._fn() if self._fn else self.value
+
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[Tuple[str, tuple], Counter] = {}
+        self.gauges: Dict[Tuple[str, tuple], Gauge] = {}
+        self.help: Dict[str, str] = {}
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        # get or create
+        h = self.histograms.get(name)
+        if h is None:
+            h = LatencyHistogram(name=name)
+            self.histograms[name] = h
+        return h
+
+    def counter(self, name: str, help_text: str = '', **labels: str) -> Counter:
+        # get or create, one counter per label values
+        return self._get_or_create(self.counters, Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = '', **labels: str) -> Gauge:
+        return self._get_or_create(self.gauges, Gauge, name, help_text, labels)
+
+    def _get_or_create(self, metrics: dict, cls: type, name: str, help_text: str, labels: dict):
+        key = (name, tuple(sorted(labels.items())))
+        metric = metrics.get(key)
+        if metric is None:
+            metric = cls(name=name, labels=key[1])
+            metrics[key] = metric
+            if help_text:
+                self.help[name] = help_text
+        return metric
+
+    def get_summary(self) -> List[dict]:
+        return [self.histograms[name].get_summary() for name in sorted(self.histograms.keys())]
+
+    def reset(self) -> None:
+        for h in list(self.histograms.values()):
+            h.reset()
@@ -0,0 +1,92 @@
+# xb_price_alarms.py
+
+from bisect import bisect_left, bisect_right, insort
+from enum import Enum
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+K_SEQ_LOW = -1  # (level, K_SEQ_LOW) sorts before any alarm at level
+K_SEQ_HIGH = float('inf')  # (level, K_SEQ_HIGH) sorts after any alarm at level
+
+
+class AlarmDirection(Enum):
+    UP = 1  # active while price > level
+    DOWN = 2  # active while price < level
+
+
+class PriceAlarmIndex:
+    """Price levels sorted by direction, so that each update only visits the alarms crossed.
+
+    An alarm is active while its condition holds: it is activated when the price
+    crosses its level and deactivated when it crosses back. The active alarms are
+    kept in a dict, so the cost of an update does not depend on the number of
+    alarms registered but on the number of alarms crossed.
+    """
+    def __init__(self):
+        self._up: List[Tuple[float, int]] = []  # (level, seq) sorted
+        self._down: List[Tuple[float, int]] = []
+        self._alarms: Dict[int, Tuple[Hashable, float, AlarmDirection, Any]] = {}  # seq: (key, level, direction, payload)
+        self._seq_by_key: Dict[Hashable, int] = {}
+        self._seq = 0
+        self.active: Dict[Hashable, Any] = {}  # key: payload (in activation order)
+        self.price: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._alarms)
+
+    def add(self, key: Hashable, level: float, direction: AlarmDirection, payload: Any = None) -> None:
+        # an alarm already registered with the same key is replaced
+        if key in self._seq_by_key:
+            self.remove(key=key)
+        self._seq += 1
+        seq = self._seq
+        self._alarms[seq] = (key, level, direction, payload)
+        self._seq_by_key[key] = seq
+        insort(self._up if direction == AlarmDirection.UP else self._down, (level, seq))
+        if self.price is not None and PriceAlarmIndex._is_condition_met(level, direction, self.price):
+            self.active[key] = payload
+
+    def remove(self, key: Hashable) -> None:
+        seq = self._seq_by_key.pop(key, None)
+        if seq is None:
+            return
+        _, level, direction, _ = self._alarms.pop(seq)
+        levels = self._up if direction == AlarmDirection.UP else self._down
+        del levels[bisect_left(levels, (level, seq))]
+        self.active.pop(key, None)
+
+    def is_active(self, key: Hashable) -> bool:
+        return key in self.active
+
+    def get_active(self) -> List[Any]:
+        return list(self.active.values())
+
+    def update(self, price: float) -> List[Any]:
+        # return the payloads of the alarms activated by this price change
+        previous = self.price
+        self.price = price
+        up, down = self._up, self._down
+        if previous is None:
+            to_activate = up[:bisect_left(up, (price, K_SEQ_LOW))] + down[bisect_right(down, (price, K_SEQ_HIGH)):]
+            to_deactivate = []
+        elif price > previous:
+            # up alarms with previous <= level < price & down alarms with previous < level <= price
+            to_activate = up[bisect_left(up, (previous, K_SEQ_LOW)):bisect_left(up, (price, K_SEQ_LOW))]
+            to_deactivate = down[bisect_right(down, (previous, K_SEQ_HIGH)):bisect_right(down, (price, K_SEQ_HIGH))]
+        elif price < previous:
+            to_activate = down[bisect_right(down, (price, K_SEQ_HIGH)):bisect_right(down, (previous, K_SEQ_HIGH))]
+            to_deactivate = up[bisect_left(up, (price, K_SEQ_LOW)):bisect_left(up, (previous, K_SEQ_LOW))]
+        else:
+            return []
+
+        for _, seq in to_deactivate:
+            self.active.pop(self._alarms[seq][0], None)
+        activated = []
+        for _, seq in to_activate:
+            key, _, _, payload = self._alarms[seq]
+            self.active[key] = payload
+            activated.append(payload)
+        return activated
+
+    @staticmethod
+    def _is_condition_met(level: float, direction: AlarmDirection, price: float) -> bool:
+        return price > level if direction == AlarmDirection.UP else price < level
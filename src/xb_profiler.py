@@ -0,0 +1,168 @@
+# xb_profiler.py
+#
+# on demand sampling profiler: the stacks of the session threads are sampled from a background thread
+# (sys._current_frames) for a few secs and written in collapsed format, one line per distinct stack:
+#   session-loop;_run (pp_session_loop.py:83);_execute (pp_session_loop.py:101);... 42
+# ready for flamegraph.pl / speedscope; nothing is paid while not capturing
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+log = logging.getLogger('log')
+
+K_PROFILE_FOLDER = 'src/log/profiles'
+K_SAMPLE_INTERVAL = 0.005  # secs
+K_MAX_SECONDS = 120.0
+K_THREAD_NAMES = ['session-loop', 'tick-intake']  # ticks and fills are processed in these threads
+K_AUTO_SECONDS = 10.0  # capture after a slow tick
+K_AUTO_COOLDOWN = 300.0  # secs between automatic captures
+K_TOP_STACKS = 10
+
+
+class ProfileResult(NamedTuple):
+    file_name: str
+    reason: str
+    seconds: float
+    samples: int  # sampling rounds
+    stacks: Dict[str, int]  # collapsed stack -> count
+
+    def get_top(self, n: int = K_TOP_STACKS) -> List[tuple]:
+        return Counter(self.stacks).most_common(n)
+
+
+class SamplingProfiler:
+    """Stack sampler of the threads named in thread_names, started for a given time
+    (control socket, dashboard) or automatically when a tick takes longer than slow_tick_ns.
+    """
+    def __init__(self,
+                 folder: str = K_PROFILE_FOLDER,
+                 interval: float = K_SAMPLE_INTERVAL,
+                 thread_names: Optional[List[str]] = None,
+                 slow_tick_ns: Optional[int] = None,
+                 auto_seconds: float = K_AUTO_SECONDS,
+                 auto_cooldown: float = K_AUTO_COOLDOWN):
+        self.folder = folder
+        self.interval = interval
+        self.thread_names = thread_names if thread_names is not None else K_THREAD_NAMES
+        # automatic capture, off when None
+        self.slow_tick_ns = slow_tick_ns
+        self.auto_seconds = auto_seconds
+        self.auto_cooldown = auto_cooldown
+        self._last_auto = -auto_cooldown
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self.last_result: Optional[ProfileResult] = None
+        self.capture_count = 0
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, reason: str = 'manual') -> bool:
+        # False when a capture is already running
+        with self._lock:
+            if self.is_running():
+                return False
+            self._stop_event.clear()
+            self._done.clear()
+            # a failed capture leaves None, never the previous result
+            self.last_result = None
+            self._thread = threading.Thread(target=self._run, args=(min(seconds, K_MAX_SECONDS), reason),
+                                            name='profiler', daemon=True)
+            self._thread.start()
+        log.info(f'profiler started for {seconds} secs ({reason})')
+        return True
+
+    def stop(self) -> None:
+        # the capture ends now (and is written)
+        self._stop_event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[ProfileResult]:
+        return self.last_result if self._done.wait(timeout=timeout) else None
+
+    def run(self, seconds: float, reason: str = 'manual') -> Optional[ProfileResult]:
+        # blocking capture, None if another one was running
+        if not self.start(seconds=seconds, reason=reason):
+            return None
+        return self.wait(timeout=seconds + 10.0)
+
+    def on_tick_latency(self, elapsed_ns: int) -> None:
+        # called after each tick: a comparison unless the tick was slow
+        if self.slow_tick_ns is not None and elapsed_ns > self.slow_tick_ns:
+            now = time.monotonic()
+            if now - self._last_auto >= self.auto_cooldown and not self.is_running():
+                self._last_auto = now
+                log.warning(f'slow tick ({elapsed_ns / 1e6:.1f} ms): profiling the next {self.auto_seconds} secs')
+                self.start(seconds=self.auto_seconds, reason='slow_tick')
+
+    def get_stats(self) -> dict:
+        result = self.last_result
+        return dict(
+            running=self.is_running(),
+            captures=self.capture_count,
+            last_file=result.file_name if result else None,
+            last_samples=result.samples if result else 0
+        )
+
+    # ********** sampler thread **********
+
+    def _run(self, seconds: float, reason: str) -> None:
+        stacks: Dict[str, int] = {}
+        samples = 0
+        t_start = time.monotonic()
+        t_end = t_start + seconds
+        names = {}
+        next_names = 0.0
+        own_ident = threading.get_ident()
+        try:
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if now >= t_end:
+                    break
+                if now >= next_names:
+                    # thread names refreshed once per sec (threads may be started meanwhile)
+                    names = {t.ident: t.name for t in threading.enumerate() if t.name in self.thread_names}
+                    next_names = now + 1.0
+                for ident, frame in sys._current_frames().items():
+                    name = names.get(ident)
+                    if name is None or ident == own_ident:
+                        continue
+                    stack = SamplingProfiler._get_collapsed(thread_name=name, frame=frame)
+                    stacks[stack] = stacks.get(stack, 0) + 1
+                samples += 1
+                self._stop_event.wait(timeout=max(0.0, self.interval - (time.monotonic() - now)))
+            self.last_result = self._write(stacks=stacks, samples=samples, reason=reason,
+                                           seconds=time.monotonic() - t_start)
+            self.capture_count += 1
+        except Exception as e:
+            log.exception(f'profiler error: {e}')
+        finally:
+            self._done.set()
+
+    @staticmethod
+    def _get_collapsed(thread_name: str, frame) -> str:
+        # root first: thread;outer call;...;inner call (function level, not line level)
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ';'.join(reversed(frames))
+
+    def _write(self, stacks: Dict[str, int], samples: int, reason: str, seconds: float) -> ProfileResult:
+        os.makedirs(self.folder, exist_ok=True)
+        name = f'profile-{datetime.now().strftime("%Y%m%d_%H%M%S")}-{self.capture_count + 1:03}-{reason}.txt'
+        file_name = os.path.join(self.folder, name)
+        with open(file_name, 'w') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f'{stack} {count}\n')
+        log.info(f'profile written to {file_name}: {samples} samples in {seconds:.1f} secs')
+        return ProfileResult(file_name=file_name, reason=reason, seconds=seconds, samples=samples, stacks=stacks)
@@ -0,0 +1,89 @@
+# xb_prometheus.py
+#
+# prometheus text exposition (format 0.0.4) of a MetricsRegistry
+#   counters:    pp_<name>_total{labels}
+#   gauges:      pp_<name>{labels}
+#   histograms:  rest.<endpoint> -> pp_rest_latency_seconds{endpoint}, ws.lag -> pp_ws_lag_seconds,
+#                any other stage -> pp_stage_latency_seconds{stage}
+# only the registry values are read (no session list is touched while scraping)
+
+from typing import Dict, List, Tuple
+
+from src.xb_metrics import LatencyHistogram, MetricsRegistry
+
+K_PREFIX = 'pp_'
+K_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+K_BUCKETS = [0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]  # secs
+K_HISTOGRAM_FAMILIES = {
+    # prefix: (family, label, help)
+    'rest': ('rest_latency_seconds', 'endpoint', 'REST call latency by endpoint'),
+    'ws': ('ws_lag_seconds', '', 'stream event time to local reception'),
+}
+K_STAGE_FAMILY = ('stage_latency_seconds', 'stage', 'session stage latency')
+
+
+def get_exposition(metrics: MetricsRegistry) -> str:
+    lines: List[str] = []
+    for suffix, kind, items in [('_total', 'counter', list(metrics.counters.items())),
+                                ('', 'gauge', list(metrics.gauges.items()))]:
+        families: Dict[str, list] = {}
+        for (name, labels), metric in sorted(items, key=lambda x: x[0]):
+            families.setdefault(name, []).append((labels, metric.get()))
+        for name, samples in families.items():
+            family = f'{K_PREFIX}{name}{suffix}'
+            _add_header(lines=lines, family=family, kind=kind, help_text=metrics.help.get(name, ''))
+            for labels, value in samples:
+                lines.append(f'{family}{_get_labels(labels)} {_get_value(value)}')
+
+    histogram_families: Dict[str, Tuple[str, list]] = {}
+    for name, h in sorted(list(metrics.histograms.items())):
+        prefix, _, rest = name.partition('.')
+        family, label, help_text = K_HISTOGRAM_FAMILIES.get(prefix, K_STAGE_FAMILY)
+        labels = ((label, rest if prefix in K_HISTOGRAM_FAMILIES else name),) if label else ()
+        histogram_families.setdefault(family, (help_text, []))[1].append((labels, h))
+    for name, (help_text, histograms) in histogram_families.items():
+        family = f'{K_PREFIX}{name}'
+        _add_header(lines=lines, family=family, kind='histogram', help_text=help_text)
+        for labels, h in histograms:
+            _add_histogram(lines=lines, family=family, labels=labels, h=h)
+    return '\n'.join(lines) + '\n'
+
+
+def _add_header(lines: List[str], family: str, kind: str, help_text: str) -> None:
+    if help_text:
+        lines.append(f'# HELP {family} {help_text}')
+    lines.append(f'# TYPE {family} {kind}')
+
+
+def _add_histogram(lines: List[str], family: str, labels: tuple, h: LatencyHistogram) -> None:
+    # cumulative counts per bucket upper bound, from a copy of the hdr counts (ns)
+    counts = list(h.counts)
+    total_ns = h.total
+    cumulative = [0] * len(K_BUCKETS)
+    count = 0
+    for index, n in enumerate(counts):
+        if n:
+            count += n
+            _, high = LatencyHistogram.get_bucket_limits(index)
+            for i, le in enumerate(K_BUCKETS):
+                if high <= le * 1e9:
+                    cumulative[i] += n
+                    break
+    accumulated = 0
+    for le, n in zip(K_BUCKETS, cumulative):
+        accumulated += n
+        lines.append(f'{family}_bucket{_get_labels(labels + (("le", repr(le)),))} {accumulated}')
+    lines.append(f'{family}_bucket{_get_labels(labels + (("le", "+Inf"),))} {count}')
+    lines.append(f'{family}_sum{_get_labels(labels)} {_get_value(total_ns / 1e9)}')
+    lines.append(f'{family}_count{_get_labels(labels)} {count}')
+
+
+def _get_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+def _get_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
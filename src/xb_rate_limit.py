@@ -0,0 +1,46 @@
+# xb_rate_limit.py
+
+import time
+from typing import Callable, List
+
+
+class TokenBucket:
+    # capacity tokens at most, refilled continuously at rate tokens per second
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self._last = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def get_available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def try_consume(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+class RateLimiter:
+    # several limits on the same resource (i.e. orders per second and per day): all of them or none are consumed
+    def __init__(self, buckets: List[TokenBucket]):
+        self.buckets = buckets
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if all(bucket.get_available() >= tokens for bucket in self.buckets):
+            for bucket in self.buckets:
+                bucket.tokens -= tokens
+            return True
+        return False
+
+    def get_available(self) -> float:
+        return min(bucket.get_available() for bucket in self.buckets)
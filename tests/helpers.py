@@ -0,0 +1,46 @@
+# helpers.py
+#
+# inline simulated sessions for the tests: fake client, no threads, ticks driven by the test
+
+import contextlib
+import os
+from typing import Iterable, Iterator
+
+from src.pp_placement_queue import PlacementQueue
+from src.pp_request_weight import RequestWeightTracker
+from src.pp_session import Session
+
+
+@contextlib.contextmanager
+def quiet() -> Iterator[None]:
+    # the session prints on every tick and fill
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def remove_rate_limits(session: Session) -> None:
+    # placements only limited by the strategy, so that the results do not depend on the timing
+    session.placement_queue = PlacementQueue(orders_per_second=1e9, orders_per_day=1e12)
+    session.market.request_weight = RequestWeightTracker(limit=10 ** 12)
+
+
+def get_session(**kwargs) -> Session:
+    # nothing written to the completed pt archive file
+    kwargs.setdefault('archive_file', None)
+    return Session(client_mode='simulated', threaded=False, **kwargs)
+
+
+def run_prices(session: Session, prices: Iterable[float]) -> None:
+    client = session.market.client
+    for cmp in prices:
+        client.cmp = float(cmp)
+        client._process_cmp_change()
+
+
+def run_session(prices: Iterable[float], **kwargs) -> Session:
+    # exact engine on the fake client, without the rate limits
+    with quiet():
+        session = get_session(**kwargs)
+        remove_rate_limits(session=session)
+        run_prices(session=session, prices=prices)
+    return session
@@ -0,0 +1,71 @@
+# test_bar_store.py
+
+import random
+import unittest
+
+from src.pp_bar_store import BarSeries, BarStore
+from tests.helpers import run_session
+
+K_START = 1_620_000_000.0  # epoch secs, multiple of 900
+
+
+class TestBarStore(unittest.TestCase):
+    def test_same_as_grouping_ticks(self):
+        rnd = random.Random(1)
+        store = BarStore()
+        ticks = []
+        t = K_START
+        for _ in range(20_000):
+            t += rnd.choice([0.05, 0.3, 1.0, 7.0, 120.0])
+            ticks.append((t, round(rnd.uniform(44_000.0, 46_000.0), 2)))
+            store.add(*ticks[-1])
+        for resolution in [1, 60, 900]:
+            groups = {}
+            for t, price in ticks:
+                groups.setdefault(t - t % resolution, []).append(price)
+            bars = store.get_bars(resolution=resolution)
+            self.assertEqual(sorted(groups.keys()), list(bars.time))
+            self.assertEqual([prices[0] for prices in groups.values()], list(bars.open))
+            self.assertEqual([max(prices) for prices in groups.values()], list(bars.high))
+            self.assertEqual([min(prices) for prices in groups.values()], list(bars.low))
+            self.assertEqual([prices[-1] for prices in groups.values()], list(bars.close))
+            self.assertEqual([len(prices) for prices in groups.values()], list(bars.ticks))
+        self.assertEqual((ticks[0][1], ticks[-1][1]), (store.first_price, store.last_price))
+
+    def test_time_range(self):
+        series = BarSeries(resolution=60)
+        for i in range(100):
+            series.add(t=K_START + i * 30, price=45_000.0 + i)
+        # the bar open at start is included
+        bars = series.get_bars(start=K_START + 615, end=K_START + 1_200)
+        self.assertEqual([K_START + 600 + 60 * i for i in range(11)], list(bars.time))
+        self.assertEqual(45_020.0, bars.open[0])
+        self.assertEqual(0, len(series.get_bars(start=K_START + 10_000)))
+
+    def test_bounded_size(self):
+        series = BarSeries(resolution=1, max_bars=100)
+        for i in range(1_000):
+            series.add(t=K_START + i, price=float(i))
+        self.assertLessEqual(len(series), 200)
+        self.assertEqual(999.0, series.get_last(count=1).close[0])
+        self.assertTrue(series.is_trimmed)
+
+    def test_chart_resolution(self):
+        store = BarStore()
+        for i in range(3_000):
+            store.add(t=K_START + i, price=float(i))
+        # 3000 1s bars and 50 1m bars: the 1m ones
+        resolution, bars = store.get_chart_bars(max_bars=600)
+        self.assertEqual(60, resolution)
+        self.assertEqual(50, len(bars))
+
+    def test_session_bars(self):
+        session = run_session(prices=[45_000.0, 45_010.0, 44_990.0])
+        self.assertEqual(45_000.0, session.get_snapshot().first_cmp)
+        bars = session.get_bars(resolution=900)
+        self.assertEqual(3, sum(bars.ticks))
+        self.assertEqual((45_010.0, 44_990.0), (max(bars.high), min(bars.low)))
+
+
+if __name__ == '__main__':
+    unittest.main()
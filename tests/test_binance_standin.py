@@ -0,0 +1,104 @@
+# test_binance_standin.py
+
+import base64
+import json
+import os
+import socket
+import struct
+import unittest
+
+from binance.client import Client
+from binance.exceptions import BinanceAPIException
+
+from src.pp_request_weight import K_WEIGHT_HEADER
+from src.sockets.binance_standin import BinanceStandin, get_ws_accept
+
+K_KEY = 'key'
+K_SECRET = 'secret'
+
+
+def recv_exactly(s: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = s.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('closed')
+        data += chunk
+    return data
+
+
+def connect_ws(host: str, port: int, path: str) -> socket.socket:
+    s = socket.create_connection((host, port), timeout=5.0)
+    key = base64.b64encode(os.urandom(16)).decode()
+    s.sendall((f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+               f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n').encode())
+    head = b''
+    while not head.endswith(b'\r\n\r\n'):
+        head += recv_exactly(s, 1)
+    assert head.startswith(b'HTTP/1.1 101') and get_ws_accept(key).encode() in head
+    return s
+
+
+def recv_ws_message(s: socket.socket) -> dict:
+    _, b1 = recv_exactly(s, 2)
+    size = b1 & 0x7f
+    if size == 126:
+        (size,) = struct.unpack('>H', recv_exactly(s, 2))
+    return json.loads(recv_exactly(s, size))
+
+
+class TestBinanceStandin(unittest.TestCase):
+    def setUp(self) -> None:
+        self.standin = BinanceStandin(port=0, tick_rate=0, api_secret=K_SECRET, weight_limit=50)
+        self.standin.start()
+        client_class = type('LocalClient', (Client,), dict(API_URL=self.standin.api_url))
+        self.client = client_class(K_KEY, K_SECRET)
+
+    def tearDown(self) -> None:
+        self.standin.stop()
+
+    def test_signed_rest_calls(self):
+        self.assertEqual('45000.0', self.client.get_avg_price(symbol='BTCEUR')['price'])
+        self.assertEqual(8, self.client.get_symbol_info('BTCEUR')['baseAssetPrecision'])
+        balance = self.client.get_asset_balance('EUR')
+        msg = self.client.create_order(symbol='BTCEUR', side='BUY', type='LIMIT', timeInForce='GTC',
+                                       quantity='0.010000', price='44000.00', newClientOrderId='UID001')
+        self.assertEqual('NEW', msg['status'])
+        self.assertAlmostEqual(float(balance['free']) - 440.0, float(self.client.get_asset_balance('EUR')['free']))
+        self.client.cancel_order(symbol='BTCEUR', origClientOrderId='UID001')
+        with self.assertRaises(BinanceAPIException) as cm:
+            self.client.cancel_order(symbol='BTCEUR', origClientOrderId='UID001')
+        self.assertEqual(-2011, cm.exception.code)
+        # used weight reported: ping 1 + avgPrice 1 + exchangeInfo 10 + account 10 + order 1 + account 10 + 2 cancels
+        self.assertEqual('35', self.client.response.headers[K_WEIGHT_HEADER])
+        # wrong signature
+        other_client = type('LocalClient', (Client,), dict(API_URL=self.standin.api_url))(K_KEY, 'other')
+        with self.assertRaises(BinanceAPIException) as cm:
+            other_client.get_account()
+        self.assertEqual(-1022, cm.exception.code)
+
+    def test_request_weight_limit(self):
+        for _ in range(4):
+            self.client.get_account()
+        with self.assertRaises(BinanceAPIException) as cm:
+            self.client.get_account()
+        self.assertEqual(429, cm.exception.status_code)
+        self.assertEqual('60', cm.exception.response.headers['Retry-After'])
+
+    def test_streams(self):
+        ticker = connect_ws(self.standin.host, self.standin.port, '/ws/btceur@ticker')
+        user = connect_ws(self.standin.host, self.standin.port, f'/ws/{self.client.stream_get_listen_key()}')
+        self.client.create_order(symbol='BTCEUR', side='SELL', type='LIMIT', timeInForce='GTC',
+                                 quantity='0.010000', price='45100.00', newClientOrderId='UID002')
+        self.assertEqual('outboundAccountPosition', recv_ws_message(user)['e'])
+        self.standin.set_cmp(45_100.0)
+        msg = recv_ws_message(ticker)
+        self.assertEqual(('24hrTicker', 'BTCEUR', '45100.0'), (msg['e'], msg['s'], msg['c']))
+        msg = recv_ws_message(user)
+        self.assertEqual(('executionReport', 'UID002', 'FILLED'), (msg['e'], msg['c'], msg['X']))
+        ticker.close()
+        user.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# test_control_server.py
+
+import os
+import socket
+import tempfile
+import unittest
+
+from src.sockets.client import recv_frame
+from src.sockets.server import ControlServer, encode_frame, K_HEADER
+from tests.helpers import get_session
+
+
+class TestControlServer(unittest.TestCase):
+    def setUp(self) -> None:
+        # inline session (no threads) driven by the test, server in its own thread
+        self.session = get_session()
+        client = self.session.market.client
+        client.cmp += 10.0
+        client._process_cmp_change()
+        self.server = ControlServer(session=self.session, port=0, publish_interval=0.05)
+        self.server.start()
+        self.s = socket.create_connection((self.server.host, self.server.port), timeout=5.0)
+
+    def tearDown(self) -> None:
+        self.s.close()
+        self.server.stop()
+
+    def request(self, request_id: int, cmd: str) -> dict:
+        self.s.sendall(encode_frame(dict(id=request_id, cmd=cmd)))
+        return recv_frame(self.s)
+
+    def test_snapshot_and_metrics(self):
+        response = self.request(request_id=1, cmd='snapshot')
+        self.assertEqual(1, response['id'])
+        self.assertTrue(response['ok'])
+        self.assertEqual(1, response['data']['ticker_count'])
+        self.assertEqual(2, len(response['data']['orders']))  # first pt (b1, s1)
+        response = self.request(request_id=2, cmd='metrics')
+        self.assertIn('tick.total', [stage['stage'] for stage in response['data']['stages']])
+        self.assertIn('used', response['data']['request_weight'])
+        self.assertIn('available', response['data']['placement'])
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.session.profiler.folder = folder
+            self.s.sendall(encode_frame(dict(id=4, cmd='profile', seconds=0.1)))
+            response = recv_frame(self.s)
+            self.assertTrue(response['ok'])
+            self.assertTrue(os.path.isfile(response['data']['file_name']))
+            self.assertGreater(response['data']['samples'], 0)
+            # capture failed (folder not writable): an error, not the previous file
+            self.session.profiler.folder = response['data']['file_name']
+            self.s.sendall(encode_frame(dict(id=5, cmd='profile', seconds=0.1)))
+            response = recv_frame(self.s)
+            self.assertFalse(response['ok'])
+            self.assertIn('failed', response['error'])
+
+    def test_unknown_command(self):
+        response = self.request(request_id=3, cmd='sell_everything')
+        self.assertFalse(response['ok'])
+        self.assertIn('unknown command', response['error'])
+
+    def test_subscribe(self):
+        response = self.request(request_id=1, cmd='subscribe')
+        self.assertTrue(response['ok'])
+        # first published events: summary and all the orders as changes
+        events = {}
+        while 'orders' not in events:
+            frame = recv_frame(self.s)
+            events[frame['event']] = frame['data']
+        self.assertEqual(2, len(events['orders']['changed']))
+        self.assertEqual(2, events['snapshot']['monitor_count'])
+
+    def test_pause_new_pt(self):
+        self.assertTrue(self.request(request_id=1, cmd='pause_new_pt')['ok'])
+        self.assertFalse(self.session.new_pt_permission_granted)
+        self.assertTrue(self.request(request_id=2, cmd='resume_new_pt')['ok'])
+        self.assertTrue(self.session.new_pt_permission_granted)
+
+    def test_frame_too_big(self):
+        self.s.sendall(K_HEADER.pack(1 << 30))
+        response = recv_frame(self.s)
+        self.assertFalse(response['ok'])
+        # the connection is closed by the server
+        self.assertIsNone(recv_frame(self.s))
+
+
+if __name__ == '__main__':
+    unittest.main()
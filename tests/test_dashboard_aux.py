@@ -0,0 +1,71 @@
+# test_dashboard_aux.py
+
+import unittest
+from array import array
+
+from dash import no_update
+
+from src.dashboards import dashboard_aux as daux
+from src.dashboards.dashboard_aux import FigureCache
+
+
+class TestFigureCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = FigureCache(max_size=2)
+        builds = []
+
+        def build(n):
+            builds.append(n)
+            return dict(n=n)
+        cache.get(name='a', key=(1,), build=lambda: build(1))
+        cache.get(name='a', key=(2,), build=lambda: build(2))
+        cache.get(name='a', key=(1,), build=lambda: build(1))  # hit, most recent
+        cache.get(name='a', key=(3,), build=lambda: build(3))  # (2,) evicted
+        cache.get(name='a', key=(1,), build=lambda: build(1))
+        cache.get(name='a', key=(2,), build=lambda: build(2))
+        self.assertEqual([1, 2, 3, 2], builds)
+        self.assertEqual((2, 4), (cache.hits, cache.misses))
+        # same key, other figure
+        self.assertEqual(dict(n=9), cache.get(name='b', key=(1,), build=lambda: dict(n=9)))
+
+
+class TestFigureUpdates(unittest.TestCase):
+    def setUp(self):
+        daux.figure_cache = FigureCache()
+
+    def test_balance_unchanged(self):
+        fig, key = daux.get_balance_figure_update(asset='eur', free=1000.0, locked=50.0, y_max=10000, last_key=None)
+        self.assertIsNot(no_update, fig)
+        self.assertEqual(1, daux.figure_cache.misses)
+        # key kept by the browser store (json list): nothing sent nor built
+        fig, same_key = daux.get_balance_figure_update(
+            asset='eur', free=1000.001, locked=50.0, y_max=10000, last_key=list(key))
+        self.assertIs(no_update, fig)
+        self.assertEqual(1, daux.figure_cache.misses)
+        # changed balance: built, then back to a cached one
+        fig, other_key = daux.get_balance_figure_update(asset='eur', free=900.0, locked=150.0, y_max=10000,
+                                                        last_key=key)
+        self.assertNotEqual(key, other_key)
+        fig, _ = daux.get_balance_figure_update(asset='eur', free=1000.0, locked=50.0, y_max=10000,
+                                                last_key=other_key)
+        self.assertIsNot(no_update, fig)
+        self.assertEqual((2, 1), (daux.figure_cache.misses, daux.figure_cache.hits))
+
+    def test_line_chart_key(self):
+        times, closes = array('d', [0.0, 1.0, 2.0]), array('d', [45_000.0, 45_010.0, 45_020.0])
+        fig, key = daux.get_cmp_line_chart_update(resolution=1, times=times, closes=closes, last_key=None)
+        self.assertEqual(3, len(fig.data[0].x))
+        fig, _ = daux.get_cmp_line_chart_update(resolution=1, times=times, closes=closes, last_key=key)
+        self.assertIs(no_update, fig)
+        # last bar still open: its close changes the chart
+        closes[-1] = 45_030.0
+        fig, _ = daux.get_cmp_line_chart_update(resolution=1, times=times, closes=closes, last_key=key)
+        self.assertEqual(45_030.0, fig.data[0].y[-1])
+        # no bars yet
+        fig, key = daux.get_cmp_line_chart_update(resolution=1, times=array('d'), closes=array('d'), last_key=None)
+        self.assertIsNot(no_update, fig)
+        self.assertEqual([1, 0], key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# test_grid_screener.py
+
+import unittest
+
+import numpy as np
+
+from src.pp_grid_screener import GridConfig, GridScreener, PricePath, get_random_walk, screen
+from tests.helpers import run_session
+
+
+class TestPricePath(unittest.TestCase):
+    def test_find_first_crossing(self):
+        prices = np.full(2_000, 100.0)
+        prices[1_500] = 90.0
+        prices[700] = 111.0
+        path = PricePath(prices=prices, block_size=64)
+        self.assertEqual(1_500, path.find_first_below(start=0, level=95.0))
+        self.assertEqual(1_500, path.find_first_below(start=1_500, level=95.0))
+        self.assertEqual(2_000, path.find_first_below(start=1_501, level=95.0))
+        self.assertEqual(700, path.find_first_above(start=3, level=110.0))
+        self.assertEqual(2_000, path.find_first_above(start=701, level=110.0))
+
+
+class TestGridScreener(unittest.TestCase):
+    def test_same_as_session(self):
+        # differential check: same trades and balances (to the last bit) as the exact engine
+        for seed in [1, 6]:
+            prices = get_random_walk(start=45_000.0, steps=3_000, seed=seed)
+            session = run_session(prices=prices)
+            result = GridScreener(path=PricePath(prices=prices)).run()
+            ab = session.market.client.account_balance
+            self.assertEqual(
+                (session.pt_created_count, session.buy_count, session.sell_count, len(session.tob.completed_pt_id)),
+                (result.pt_created_count, result.buy_count, result.sell_count, result.completed_pt_count))
+            self.assertEqual((ab.s2.free + ab.s2.locked, ab.s1.free + ab.s1.locked, ab.bnb.free),
+                             (result.eur, result.btc, result.bnb))
+            self.assertLess(result.events, len(prices) / 5)
+
+    def test_screen_ranks_configs(self):
+        prices = get_random_walk(start=45_000.0, steps=20_000, seed=3)
+        configs = [GridConfig(s1_qty=qty) for qty in [0.01, 0.015, 0.023]]
+        results = screen(prices=prices, configs=configs)
+        self.assertEqual(3, len(results))
+        self.assertEqual(sorted(r.equity_delta for r in results)[::-1], [r.equity_delta for r in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
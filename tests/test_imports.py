@@ -0,0 +1,28 @@
+# test_imports.py
+
+import subprocess
+import sys
+import unittest
+
+from benchmarks.bench_session import K_HEAVY_MODULES, get_import_stats
+
+
+class TestImports(unittest.TestCase):
+    def test_engine_imports_are_light(self):
+        # fresh interpreter: modules already imported by other tests do not count
+        for module in ['src.pp_session', 'src.pp_strategy_manager', 'src.pp_pending_orders_book']:
+            stats = get_import_stats(module=module)
+            self.assertEqual([], stats['heavy'], module)
+
+    def test_heavy_modules_available_when_needed(self):
+        # dataframes still work, pandas being imported on first use
+        code = ('import sys; from src.pp_pending_orders_book import PendingOrdersBook; '
+                'df = PendingOrdersBook.get_orders_kpi(orders=[], cmp=50000.0, buy_fee=0.0008, sell_fee=0.0008); '
+                'print(len(df), "pandas" in sys.modules)')
+        output = subprocess.check_output([sys.executable, '-c', code], text=True)
+        self.assertEqual('10 True', output.split('\n')[-2])
+        self.assertIn('pandas', K_HEAVY_MODULES)
+
+
+if __name__ == '__main__':
+    unittest.main()
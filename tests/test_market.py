@@ -3,7 +3,7 @@
 import unittest
 from typing import Optional
 
-from src.pp_market import Market
+from src.pp_market import Market, TickerStreamMode
 from src.pp_account_balance import AccountBalance
 
 
@@ -146,3 +146,41 @@ class TestMarket(unittest.TestCase):
         # self.market.binance_user_socket_callback(msg=msg)
         # self.assertAlmostEqual(10_000.0, self.test_account_balance.s1.free)
 
+
+    def test_binance_symbol_ticker_raw_callback(self):
+        payload = b'{"e":"24hrTicker","E":123456789,"s":"BTCEUR","p":"0.0015","c":"60000.88","Q":"10"}'
+        self.market.binance_symbol_ticker_raw_callback(payload=payload)
+        self.assertEqual(60_000.88, self.cmp)
+        # error payload generated by the socket factory is a dict
+        self.market.binance_symbol_ticker_raw_callback(payload={'e': 'error', 'm': 'max reconnect retries reached'})
+        self.assertEqual(60_000.88, self.cmp)
+
+    def test_binance_user_socket_raw_callback(self):
+        payload = (b'{"e":"executionReport","E":1499405658658,"s":"BTCEUR","c":"mUvoqJxFIILMdfAW5iGSOW",'
+                   b'"x":"TRADE","X":"FILLED","L":"49000.88","n":"0.00038859","N":"BNB"}')
+        self.market.binance_user_socket_raw_callback(payload=payload)
+        self.assertEqual('mUvoqJxFIILMdfAW5iGSOW', self.test_order_id)
+        self.assertEqual(49_000.88, self.test_order_price)
+        # frames without handler are not decoded
+        self.market.binance_user_socket_raw_callback(payload=b'{"e":"balanceUpdate", invalid json')
+        self.assertIsNone(self.test_account_balance)
+
+    def test_binance_book_ticker_callbacks(self):
+        book_ticks = []
+        market = Market(
+            symbol_ticker_callback=self.fake_symbol_ticker_callback,
+            order_traded_callback=self.fake_order_traded_callback,
+            account_balance_callback=self.fake_account_balance_callback,
+            client_mode='simulated',
+            ticker_stream_mode=TickerStreamMode.BOOK_TICKER,
+            book_ticker_callback=lambda bid, ask: book_ticks.append((bid, ask))
+        )
+        market.binance_book_ticker_callback(msg={'u': 1, 's': 'BTCEUR', 'b': '50000.01', 'B': '0.5',
+                                                 'a': '50000.03', 'A': '0.2'})
+        market.binance_book_ticker_raw_callback(
+            payload=b'{"u":2,"s":"BTCEUR","b":"50001.00","B":"0.31","a":"50001.20","A":"0.40"}')
+        # the fake client sends book ticker messages too
+        market.client.update_cmp(step=10.0)
+        self.assertEqual([(50_000.01, 50_000.03), (50_001.0, 50_001.2), (45_009.99, 45_010.01)], book_ticks)
+        # the last price callback is not used in this mode
+        self.assertEqual(0.0, self.cmp)
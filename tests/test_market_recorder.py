@@ -0,0 +1,77 @@
+# test_market_recorder.py
+
+import os
+import tempfile
+import time
+import unittest
+
+from src.pp_fake_client import FakeClient, FakeCmpMode
+from src.pp_grid_screener import get_random_walk
+from src.pp_market_recorder import (MarketRecorder, MarketEventKind, ReplaySource, get_segment_files,
+                                    read_events)
+from src.pp_session import QuitMode
+from tests.helpers import quiet, run_session
+
+K_USER_FRAME = b'{"e":"listStatus","E":1620000000000,"s":"BTCEUR"}'
+
+
+class TestMarketRecorder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_segments(self):
+        recorder = MarketRecorder(session_id='S_TEST', folder=self.tmp.name, segment_bytes=1_000)
+        recorder.start()
+        for i in range(200):
+            recorder.add_tick(45_000.0 + i)
+            if i % 50 == 0:
+                recorder.add_tick((44_999.99 + i, 45_000.01 + i))
+                recorder.add_user_frame(K_USER_FRAME)
+            if i % 20 == 0:
+                # one write per batch, the segment rotated once over the size
+                recorder.flush()
+        # last segment not closed yet (as after a crash), readable up to the last flush
+        recorder.flush()
+        files = get_segment_files(folder=recorder.folder)
+        self.assertEqual(208, len(list(read_events(file_names=files))))
+        recorder.stop()
+
+        files = get_segment_files(folder=recorder.folder)
+        self.assertGreater(len(files), 2)
+        events = list(read_events(file_names=files))
+        self.assertEqual(208, len(events))
+        self.assertEqual([45_000.0 + i for i in range(200)],
+                         [e.values[0] for e in events if e.kind == MarketEventKind.TICKER])
+        self.assertEqual((44_999.99 + 50, 45_000.01 + 50),
+                         [e.values for e in events if e.kind == MarketEventKind.BOOK_TICKER][1])
+        self.assertEqual([K_USER_FRAME] * 4, [e.payload for e in events if e.kind == MarketEventKind.USER])
+        times = [e.time for e in events]
+        self.assertEqual(sorted(times), times)
+
+    def test_record_and_replay_session(self):
+        cmps = [float(cmp) for cmp in get_random_walk(start=45_000.0, steps=500, seed=2)]
+        session = run_session(prices=cmps, record_folder=self.tmp.name)
+        with quiet():
+            session.market.binance_user_socket_raw_callback(K_USER_FRAME)
+            session.quit(quit_mode=QuitMode.CANCEL_ALL_PLACED)
+        source = ReplaySource.from_folder(folder=os.path.join(self.tmp.name, session.session_id), speed=0)
+        self.assertEqual(cmps, [cmp for _, cmp in source.get_ticks()])
+
+        # the fake client replays the recorded prices
+        replayed = []
+        fake = FakeClient(user_socket_callback=lambda msg: None,
+                          symbol_ticker_callback=lambda msg: replayed.append(float(msg['c'])),
+                          mode=FakeCmpMode.MODE_REPLAY, replay_source=source)
+        fake.start_cmp_generator()
+        for _ in range(100):
+            if not fake._is_generator_on:
+                break
+            time.sleep(0.05)
+        self.assertEqual(cmps, replayed)
+
+
+if __name__ == '__main__':
+    unittest.main()
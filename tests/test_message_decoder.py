@@ -0,0 +1,47 @@
+# test_message_decoder.py
+
+import unittest
+
+from src.pp_message_decoder import (decode_frame, get_event_type, get_field_tag, get_str_field, get_float_field,
+                                    get_int_field, get_number_tag)
+
+K_TICKER_FRAME = (b'{"e":"24hrTicker","E":123456789,"s":"BTCEUR","p":"0.0015","P":"250.00",'
+                  b'"w":"0.0018","c":"50123.45","Q":"10","b":"50123.40","a":"50123.50"}')
+
+
+class TestMessageDecoder(unittest.TestCase):
+    def test_decode_frame(self):
+        msg = decode_frame(K_TICKER_FRAME)
+        self.assertEqual('24hrTicker', msg['e'])
+        self.assertEqual('50123.45', msg['c'])
+        self.assertIsNone(decode_frame(b'{"e":"24hrTicker",'))
+
+    def test_get_event_type(self):
+        self.assertEqual(b'24hrTicker', get_event_type(K_TICKER_FRAME))
+        self.assertIsNone(get_event_type(b'{"u":400900217,"s":"BNBUSDT"}'))
+        self.assertIsNone(get_event_type(b'{"e":"24hr'))
+
+    def test_get_field(self):
+        self.assertEqual(b'"c":"', get_field_tag('c'))
+        self.assertEqual(b'BTCEUR', get_str_field(K_TICKER_FRAME, get_field_tag('s')))
+        # keys are case sensitive: "p" and "P" are different fields
+        self.assertEqual(0.0015, get_float_field(K_TICKER_FRAME, get_field_tag('p')))
+        self.assertEqual(250.0, get_float_field(K_TICKER_FRAME, get_field_tag('P')))
+        self.assertEqual(50_123.45, get_float_field(K_TICKER_FRAME, get_field_tag('c')))
+        self.assertIsNone(get_float_field(K_TICKER_FRAME, get_field_tag('x')))
+        self.assertIsNone(get_float_field(K_TICKER_FRAME, get_field_tag('s')))
+
+    def test_get_int_field(self):
+        self.assertEqual(123456789, get_int_field(K_TICKER_FRAME, get_number_tag('E')))
+        # string field, not a number
+        self.assertIsNone(get_int_field(K_TICKER_FRAME, get_number_tag('c')))
+        self.assertIsNone(get_int_field(K_TICKER_FRAME, get_number_tag('T')))
+
+    def test_get_field_matches_decoder(self):
+        msg = decode_frame(K_TICKER_FRAME)
+        for key in ['p', 'P', 'w', 'c', 'Q', 'b', 'a']:
+            self.assertEqual(float(msg[key]), get_float_field(K_TICKER_FRAME, get_field_tag(key)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# test_metrics.py
+
+import unittest
+
+from src.xb_metrics import LatencyHistogram, MetricsRegistry
+from src.xb_prometheus import get_exposition
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def setUp(self) -> None:
+        self.h = LatencyHistogram(name='test')
+
+    def test_small_values_are_exact(self):
+        for v in [1, 2, 3, 100]:
+            self.h.record(v)
+        self.assertEqual(2, self.h.get_percentile(50.0))
+        self.assertEqual(100, self.h.get_percentile(100.0))
+        self.assertEqual(4, self.h.count)
+
+    def test_percentiles_relative_error(self):
+        for v in range(1, 100_001):
+            self.h.record(v * 1_000)  # 1 us .. 100 ms
+        p50 = self.h.get_percentile(50.0)
+        p99 = self.h.get_percentile(99.0)
+        self.assertAlmostEqual(50_000_000, p50, delta=50_000_000 * 0.02)
+        self.assertAlmostEqual(99_000_000, p99, delta=99_000_000 * 0.02)
+        self.assertEqual(100_000_000, self.h.max)
+        self.assertEqual(100_000_000, self.h.get_percentile(100.0))
+
+    def test_bucket_limits_cover_recorded_value(self):
+        for v in [127, 128, 129, 255, 256, 1_000_003, 2 ** 40 + 17]:
+            h = LatencyHistogram(name='limits')
+            h.record(v)
+            index = h.counts.index(1)
+            low, high = LatencyHistogram.get_bucket_limits(index)
+            self.assertTrue(low <= v <= high, f'{v} not in [{low}, {high}]')
+
+    def test_summary_in_microseconds(self):
+        self.h.record(2_000)
+        summary = self.h.get_summary()
+        self.assertEqual('test', summary['stage'])
+        self.assertEqual(2.0, summary['max'])
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_histogram_get_or_create(self):
+        registry = MetricsRegistry()
+        h = registry.histogram('tick.total')
+        self.assertIs(h, registry.histogram('tick.total'))
+        registry.histogram('fill.total').record(10)
+        self.assertEqual(['fill.total', 'tick.total'], [d['stage'] for d in registry.get_summary()])
+
+    def test_counters_and_gauges(self):
+        registry = MetricsRegistry()
+        buy = registry.counter('orders_filled', 'orders traded', side='BUY')
+        self.assertIs(buy, registry.counter('orders_filled', side='BUY'))
+        buy.inc()
+        buy.inc(2)
+        self.assertEqual(3, buy.get())
+        sell = registry.counter('orders_filled', side='SELL')
+        sell.set_function(lambda: 7)
+        self.assertEqual(7, sell.get())
+        self.assertEqual('orders traded', registry.help['orders_filled'])
+
+
+class TestPrometheusExposition(unittest.TestCase):
+    def test_exposition(self):
+        registry = MetricsRegistry()
+        registry.counter('orders_filled', 'orders traded', side='BUY').inc(3)
+        registry.gauge('pending_orders', list='monitor').set(12)
+        h = registry.histogram('rest.place_order')
+        for ns in [20_000, 300_000, 2_000_000, 10 ** 10]:
+            h.record(ns)
+        lines = get_exposition(metrics=registry).splitlines()
+        self.assertIn('# HELP pp_orders_filled_total orders traded', lines)
+        self.assertIn('# TYPE pp_orders_filled_total counter', lines)
+        self.assertIn('pp_orders_filled_total{side="BUY"} 3', lines)
+        self.assertIn('pp_pending_orders{list="monitor"} 12', lines)
+        # cumulative buckets in secs
+        self.assertIn('# TYPE pp_rest_latency_seconds histogram', lines)
+        self.assertIn('pp_rest_latency_seconds_bucket{endpoint="place_order",le="5e-05"} 1', lines)
+        self.assertIn('pp_rest_latency_seconds_bucket{endpoint="place_order",le="0.0005"} 2', lines)
+        self.assertIn('pp_rest_latency_seconds_bucket{endpoint="place_order",le="5.0"} 3', lines)
+        self.assertIn('pp_rest_latency_seconds_bucket{endpoint="place_order",le="+Inf"} 4', lines)
+        self.assertIn('pp_rest_latency_seconds_count{endpoint="place_order"} 4', lines)
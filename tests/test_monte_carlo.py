@@ -0,0 +1,79 @@
+# test_monte_carlo.py
+
+import unittest
+
+import numpy as np
+
+from src.pp_grid_screener import GridConfig, GridScreener, PricePath
+from src.pp_monte_carlo import BootstrapModel, RandomWalkModel, Regime, RegimeModel, run_monte_carlo
+
+
+class TestPathModels(unittest.TestCase):
+    def test_random_walk(self):
+        paths = RandomWalkModel(start=45_000.0, steps=1_000).get_paths(n_paths=8, rng=np.random.default_rng(1))
+        self.assertEqual((8, 1_000), paths.shape)
+        steps = np.diff(paths, axis=1, prepend=45_000.0)
+        self.assertTrue(np.isin(steps, [-20, -10, -5, 0, 5, 10, 20]).all())
+
+    def test_bootstrap_uses_recorded_returns(self):
+        prices = 45_000.0 + np.cumsum(np.random.default_rng(2).choice([-10.0, 10.0], size=500))
+        model = BootstrapModel.from_prices(prices=prices, start=45_000.0, steps=1_000, block_size=50)
+        paths = model.get_paths(n_paths=4, rng=np.random.default_rng(3))
+        self.assertEqual((4, 1_000), paths.shape)
+        # each block of 50 returns is a recorded stretch (prices rounded to cents)
+        log_returns = np.diff(np.log(paths[0]), prepend=np.log(45_000.0))
+        windows = np.lib.stride_tricks.sliding_window_view(model.returns, 50)
+        for block in log_returns.reshape(-1, 50):
+            self.assertTrue(np.isclose(windows, block, rtol=0.0, atol=1e-6).all(axis=1).any())
+
+    def test_regime_states(self):
+        model = RegimeModel(regimes=[Regime(drift=0.0, volatility=0.0, mean_duration=100),
+                                     Regime(drift=1e-4, volatility=0.0, mean_duration=100)],
+                            start=45_000.0, steps=5_000)
+        rng = np.random.default_rng(4)
+        states = model.get_states(n_paths=3, rng=rng)
+        switches = (np.diff(states, axis=1) != 0).sum(axis=1)
+        # about steps / mean_duration switches per path
+        self.assertTrue(((switches > 20) & (switches < 100)).all())
+        # no volatility: flat in the first regime, rising in the second one
+        paths = model.get_paths(n_paths=3, rng=np.random.default_rng(4))
+        changes = np.diff(paths, axis=1)
+        self.assertTrue((changes[states[:, 1:] == 0] == 0).all())
+        self.assertTrue((changes[states[:, 1:] == 1] >= 0).all())
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def test_same_results_in_processes(self):
+        model = RandomWalkModel(start=45_000.0, steps=3_000)
+        config = GridConfig(inactivity_cycles=60)
+        local = run_monte_carlo(model=model, config=config, n_paths=40, seed=5, processes=1)
+        pooled = run_monte_carlo(model=model, config=config, n_paths=40, seed=5, processes=2)
+        self.assertEqual(40, len(local.results))
+        self.assertEqual([r._replace(seconds=0) for r in local.results],
+                         [r._replace(seconds=0) for r in pooled.results])
+
+        summary = local.get_summary()
+        self.assertEqual(40, summary['equity_delta']['count'])
+        self.assertLessEqual(summary['equity_delta']['p5'], summary['equity_delta']['p95'])
+        self.assertTrue(0.0 <= summary['exhausted_tick']['probability'] <= 1.0)
+        self.assertIn('max_btc_locked', local.get_table())
+
+    def test_risk_metrics(self):
+        # steady fall: buy orders filled one after the other until the eur buffer is reached
+        prices = 45_000.0 - np.arange(20_000) * 0.5
+        result = GridScreener(path=PricePath(prices=prices), config=GridConfig(inactivity_cycles=60)).run()
+        c = result.config
+        self.assertGreater(result.max_eur_locked, 0.0)
+        self.assertGreaterEqual(result.eur_exhausted_tick, 0)
+        self.assertEqual(-1, result.btc_exhausted_tick)
+        self.assertGreater(result.concentration_count, 0)
+
+        # balances as of the exhaustion tick: replayed up to it
+        cut = GridScreener(path=PricePath(prices=prices[:result.eur_exhausted_tick + 1]), config=c).run()
+        self.assertLess(cut.eur, c.eur_buffer + c.eur_min_balance)
+        before = GridScreener(path=PricePath(prices=prices[:result.eur_exhausted_tick]), config=c).run()
+        self.assertGreaterEqual(before.eur, c.eur_buffer + c.eur_min_balance)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -48,6 +48,17 @@ class TestOrder(unittest.TestCase):
         self.assertAlmostEqual(0.88, self.order_2.get_distance(cmp=60_000.0))
         self.assertAlmostEqual(-0.12, self.order_2.get_distance(cmp=60_001.0))
 
+    def test_get_distance_with_touch_prices(self):
+        # buy orders against the best ask, sell orders against the best bid
+        # (bid < cmp < ask: each side gives a different distance)
+        self.assertEqual(40.0, self.order.get_distance(cmp=50_030.0, bid=50_020.0, ask=50_040.0))
+        self.assertAlmostEqual(30.88, self.order_2.get_distance(cmp=59_980.0, bid=59_970.0, ask=59_990.0))
+        # wider spread: the buy distance grows with the ask, the sell one with a lower bid
+        self.assertEqual(60.0, self.order.get_distance(cmp=50_030.0, bid=50_020.0, ask=50_060.0))
+        self.assertAlmostEqual(40.88, self.order_2.get_distance(cmp=59_980.0, bid=59_960.0, ask=59_990.0))
+        self.assertFalse(self.order.is_ready_for_placement(cmp=50_020.0, min_dist=25, bid=50_015.0, ask=50_030.0))
+        self.assertTrue(self.order.is_isolated(cmp=50_000.0, max_dist=100, bid=50_000.0, ask=50_200.0))
+
     def test_get_price_str(self):
         self.assertEqual('60000.88', self.order_2.get_price_str())
         self.assertEqual('60000.880000', self.order_2.get_price_str(precision=6))
@@ -0,0 +1,79 @@
+# test_order_exporter.py
+
+import importlib.util
+import tempfile
+import unittest
+
+from binance import enums as k_binance
+
+from src.pp_grid_screener import get_random_walk
+from src.pp_order import Order, OrderStatus
+from src.pp_order_exporter import OrderExporter, ExportEvent, read_export
+from src.pp_session import QuitMode
+from tests.helpers import get_session, quiet, run_session
+
+K_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+@unittest.skipUnless(K_PYARROW, 'pyarrow not installed')
+class TestOrderExporter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_partitions_and_columns(self):
+        for session_id in ['S_1', 'S_2']:
+            exporter = OrderExporter(session_id=session_id, folder=self.tmp.name, batch_rows=3)
+            exporter.start()
+            for i in range(5):
+                order = Order(session_id=session_id, order_id='NA', pt_id=f'{i:03}', k_side=k_binance.SIDE_BUY,
+                              price=45_000.0 + i, amount=0.01, status=OrderStatus.PLACED, name='b1')
+                exporter.add_order_event(event=ExportEvent.PLACED, order=order, ticker_count=i, cmp=45_100.0)
+            exporter.add_tick(ticker_count=1, cmp=45_100.0, bid=None, ask=None, monitor_count=2, placed_count=0,
+                              pt_created_count=1, buy_count=0, sell_count=0, tick_us=12.5)
+            self.assertTrue(exporter.flush())
+            exporter.stop()
+            # one batch of 3 orders, then the remaining 2 orders and the tick flushed
+            self.assertEqual((dict(orders=5, ticks=1), 3), (exporter.rows_exported, exporter.files_written))
+
+        table = read_export(table='orders', folder=self.tmp.name, columns=['pt_id', 'price', 'event'],
+                            filters=[('session_id', '=', 'S_2')])
+        self.assertEqual(['pt_id', 'price', 'event'], table.column_names)
+        self.assertEqual([45_000.0 + i for i in range(5)], sorted(table.column('price').to_pylist()))
+        self.assertEqual({'placed'}, set(table.column('event').to_pylist()))
+        ticks = read_export(table='ticks', folder=self.tmp.name)
+        self.assertEqual(['S_1', 'S_2'], sorted(str(s) for s in ticks.column('session_id').to_pylist()))
+
+    def test_session_export(self):
+        session = run_session(prices=get_random_walk(start=45_000.0, steps=2_000, seed=1),
+                              export_folder=self.tmp.name)
+        with quiet():
+            session.quit(quit_mode=QuitMode.CANCEL_ALL_PLACED)
+        orders = read_export(table='orders', folder=self.tmp.name, columns=['event', 'uid']).to_pydict()
+        traded = [uid for event, uid in zip(orders['event'], orders['uid']) if event == 'traded']
+        self.assertEqual(session.buy_count + session.sell_count, len(traded))
+        self.assertLessEqual(len(traded), orders['event'].count('placed'))
+        ticks = read_export(table='ticks', folder=self.tmp.name, columns=['ticker_count'])
+        self.assertEqual(list(range(1, session.ticker_count + 1)), ticks.column('ticker_count').to_pylist())
+
+    def test_concentrated_orders_only(self):
+        with quiet():
+            session = get_session(export_folder=self.tmp.name)
+            order = Order(session_id=session.session_id, order_id='NA', pt_id='001', k_side=k_binance.SIDE_BUY,
+                          price=45_000.0, amount=0.01)
+            session.pob.add_order(order)
+            self.assertTrue(session.cm.concentrate_for_liquidity(order=order, ref_mp=46_000.0, ref_gap=200.0))
+            concentrated = [o for o in session.pob.monitor if o.concentration_count > 0]
+            # children of a concentrated order: split, not concentrated again
+            session.cm.split_n_order(order=concentrated[0], inter_distance=10.0, child_count=2)
+            session.exporter.flush()
+            session.exporter.stop()
+        orders = read_export(table='orders', folder=self.tmp.name, columns=['event', 'uid', 'name']).to_pydict()
+        self.assertEqual(['concentrated'] * 2, orders['event'])
+        self.assertEqual(sorted(o.uid for o in concentrated), sorted(orders['uid']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# test_pending_aggregates.py
+
+import math
+import random
+import unittest
+
+from binance import enums as k_binance
+
+from src.pp_order import Order
+from src.pp_pending_orders_book import PendingOrdersBook
+from src.xb_exact_sum import ExactSum
+
+
+class TestExactSum(unittest.TestCase):
+    def test_no_drift(self):
+        rnd = random.Random(3)
+        values = [rnd.uniform(-1, 1) * 10 ** rnd.randint(-8, 6) for _ in range(2_000)]
+        s = ExactSum()
+        for x in values:
+            s.add(x)
+        self.assertEqual(math.fsum(values), s.get_value())
+        for x in values[::2]:
+            s.subtract(x)
+        self.assertEqual(math.fsum(values[1::2]), s.get_value())
+        for x in values[1::2]:
+            s.subtract(x)
+        self.assertEqual(0.0, s.get_value())
+
+
+class TestPendingAggregates(unittest.TestCase):
+    def test_same_as_full_scan(self):
+        # random book changes: running aggregates and kpi equal to the ones computed from the orders
+        rnd = random.Random(11)
+        pob = PendingOrdersBook(orders=[])
+        for i in range(3_000):
+            action = rnd.random()
+            if action < 0.4 or not pob.monitor:
+                pob.add_order(Order(session_id='S_TEST', order_id='NA', pt_id=f'{i:03}',
+                                    k_side=rnd.choice([k_binance.SIDE_BUY, k_binance.SIDE_SELL]),
+                                    price=round(rnd.uniform(44_000.0, 46_000.0), 2),
+                                    amount=round(rnd.uniform(0.001, 0.03), 6)))
+            elif action < 0.55:
+                pob.remove_order(rnd.choice(pob.monitor))
+            elif action < 0.7:
+                pob.place_order(rnd.choice(pob.monitor))
+            elif action < 0.8 and pob.placed:
+                # traded at a different price
+                order = rnd.choice(pob.placed)
+                pob.set_order_price(order=order, price=order.price - 0.37)
+                pob.remove_placed_order(order=order)
+            elif action < 0.9:
+                pob.set_order_amount_by_uid(amount=round(rnd.uniform(0.001, 0.03), 6), uid=rnd.choice(pob.monitor).uid)
+            elif pob.placed:
+                pob.place_back_order(rnd.choice(pob.placed))
+
+            if i % 100 == 0:
+                orders = pob.get_pending_orders()
+                self.assertEqual((math.fsum(o.get_signed_amount() for o in orders),
+                                  math.fsum(o.get_signed_total() for o in orders)), pob.get_signed_balance())
+                cmp = rnd.uniform(44_500.0, 45_500.0)
+                expected = PendingOrdersBook.get_orders_kpi(orders=orders, cmp=cmp, buy_fee=0.0008, sell_fee=0.0008)
+                df = pob.get_pending_orders_kpi(cmp=cmp, buy_fee=0.0008, sell_fee=0.0008)
+                self.assertTrue(expected.equals(df))
+
+    def test_monitor_queries_same_as_sorting(self):
+        # prices and amounts from a few values, so that ties are frequent
+        rnd = random.Random(5)
+        pob = PendingOrdersBook(orders=[])
+        for i in range(2_000):
+            action = rnd.random()
+            if action < 0.45 or not pob.monitor:
+                pob.add_order(Order(session_id='S_TEST', order_id='NA', pt_id=f'{i:03}',
+                                    k_side=rnd.choice([k_binance.SIDE_BUY, k_binance.SIDE_SELL]),
+                                    price=rnd.choice([44_900.0, 45_000.0, 45_050.0, 45_200.0]),
+                                    amount=rnd.choice([0.01, 0.02])))
+            elif action < 0.6:
+                pob.remove_order(rnd.choice(pob.monitor))
+            elif action < 0.75:
+                pob.place_order(rnd.choice(pob.monitor))
+            elif action < 0.85 and pob.placed:
+                pob.place_back_order(rnd.choice(pob.placed))
+            else:
+                order = rnd.choice(pob.monitor)
+                pob.set_order_price(order=order, price=order.price + 50.0)
+
+            cmp = rnd.choice([44_950.0, 45_000.0, 45_100.0])
+            k = rnd.randint(1, 5)
+            by_momentum = sorted(pob.monitor, key=lambda x: x.get_momentum(cmp=cmp), reverse=True)
+            self.assertEqual(by_momentum[:k], pob.get_top_momentum(cmp=cmp, k=k))
+            by_price = sorted(pob.monitor, key=lambda x: x.price, reverse=True)
+            self.assertIs(by_price[0] if by_price else None, pob.get_extreme_price_order(highest=True))
+            self.assertIs(by_price[-1] if by_price else None, pob.get_extreme_price_order(highest=False))
+            buys = [o for o in by_price if o.k_side == k_binance.SIDE_BUY]
+            self.assertIs(buys[0] if buys else None,
+                          pob.get_extreme_price_order(highest=True, k_side=k_binance.SIDE_BUY))
+
+    def test_signed_values_follow_changes(self):
+        order = Order(session_id='S_TEST', order_id='NA', pt_id='001', k_side=k_binance.SIDE_SELL,
+                      price=45_000.0, amount=0.01)
+        order.set_price(price=46_000.0)
+        order.set_amount(amount=0.02)
+        self.assertEqual((-0.02, 920.0), (order.signed_amount, order.signed_total))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# test_placement_queue.py
+
+import unittest
+
+from binance import enums as k_binance
+
+from src.pp_account_balance import AccountBalance, AssetBalance
+from src.pp_balance_manager import K_CONFIRMATION_TIMEOUT
+from src.pp_order import Order
+from src.pp_placement_queue import PlacementQueue
+from src.xb_rate_limit import TokenBucket
+from tests.helpers import get_session
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10.0, capacity=10.0, clock=clock)
+        self.assertEqual(10, sum(bucket.try_consume() for _ in range(20)))
+        clock.now = 0.25
+        self.assertAlmostEqual(2.5, bucket.get_available())
+        clock.now = 100.0
+        self.assertEqual(10.0, bucket.get_available())  # capped
+
+
+class TestPlacementQueue(unittest.TestCase):
+    def test_closest_first_under_budget(self):
+        clock = FakeClock()
+        queue = PlacementQueue(orders_per_second=2, clock=clock)
+        orders = [Order(session_id='S', order_id='ID', pt_id='001', k_side=k_binance.SIDE_BUY, price=price, amount=0.01)
+                  for price in [49_990.0, 49_970.0, 49_980.0]]
+        queue.set_orders(orders=orders, cmp=50_000.0)
+        popped = []
+        order = queue.pop()
+        while order and queue.try_acquire():
+            popped.append(order.price)
+            order = queue.pop()
+        self.assertEqual([49_990.0, 49_980.0], popped)
+        self.assertEqual(dict(placed=2, throttled=1, available=0.0), queue.get_stats())
+
+
+class TestSessionPlacement(unittest.TestCase):
+    def test_burst_with_balance_reservations(self):
+        session = get_session()
+        client = session.market.client
+        cmp = client.cmp
+        # buy orders about to be ready; the balance is enough for some of them only
+        free_eur = session.bm.current_ab.get_free_price_s2()
+        for i in range(20):
+            session.pob.add_order(Order(session_id=session.session_id, order_id='ID', pt_id=f'{i:03}',
+                                        k_side=k_binance.SIDE_BUY, price=cmp - 40.0 - i, amount=0.005))
+        client.cmp = cmp - 20.0
+        client._process_cmp_change()
+        placed_buy = [o for o in session.pob.placed if o.k_side == k_binance.SIDE_BUY]
+        # more than one order per tick, never over the rate limit nor the balance
+        self.assertGreater(len(placed_buy), 1)
+        self.assertLessEqual(len(placed_buy), 10)
+        self.assertLess(sum(o.get_total() for o in placed_buy), free_eur)
+        self.assertGreaterEqual(session.market.client.account_balance.s2.free, 0.0)
+        # balance updates received: no reservation left
+        self.assertEqual({}, session.bm.reserved)
+        self.assertEqual({}, session.bm.confirmed)
+
+    def test_burst_confirmations_released_per_order(self):
+        session = get_session()
+        bm = session.bm
+        clock = FakeClock()
+        bm.clock = clock
+        orders = [Order(session_id=session.session_id, order_id='ID', pt_id=f'{i:03}',
+                        k_side=k_binance.SIDE_BUY, price=45_000.0 - i, amount=0.01) for i in range(3)]
+        for order in orders:
+            bm.reserve(order=order)
+            bm.confirm(order=order)
+
+        def get_update(locked: float) -> AccountBalance:
+            s2 = bm.current_ab.s2
+            return AccountBalance(dict(
+                s1=bm.current_ab.s1,
+                s2=AssetBalance(name='eur', free=s2.free - locked, locked=s2.locked + locked, precision=2),
+                bnb=bm.current_ab.bnb))
+        # first update: only the first order locked, the funds of the others still reserved
+        bm.update_current(last_ab=get_update(locked=orders[0].get_total()))
+        self.assertEqual([o.uid for o in orders[1:]], list(bm.confirmed))
+        self.assertAlmostEqual(orders[1].get_total() + orders[2].get_total(),
+                               bm.get_reserved(k_side=k_binance.SIDE_BUY))
+        # nothing locked (a fill meanwhile): kept until the timeout
+        bm.update_current(last_ab=get_update(locked=0.0))
+        self.assertEqual(2, len(bm.confirmed))
+        bm.update_current(last_ab=get_update(locked=orders[1].get_total()))
+        self.assertEqual([orders[2].uid], list(bm.confirmed))
+        clock.now = K_CONFIRMATION_TIMEOUT
+        bm.update_current(last_ab=get_update(locked=0.0))
+        self.assertEqual({}, bm.confirmed)
+
+
+if __name__ == '__main__':
+    unittest.main()
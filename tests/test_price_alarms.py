@@ -0,0 +1,84 @@
+# test_price_alarms.py
+
+import random
+import unittest
+
+from binance import enums as k_binance
+
+from src.pp_order import Order
+from src.pp_pending_orders_book import PendingOrdersBook
+from src.pp_strategy_manager import StrategyManager, StrategyAlarm, K_DISTANCE_FOR_SIDE_BALANCE
+from src.xb_price_alarms import PriceAlarmIndex, AlarmDirection
+
+
+class TestPriceAlarmIndex(unittest.TestCase):
+    def test_crossing(self):
+        index = PriceAlarmIndex()
+        index.add(key='up', level=100.0, direction=AlarmDirection.UP, payload='up')
+        index.add(key='down', level=90.0, direction=AlarmDirection.DOWN, payload='down')
+        self.assertEqual([], index.update(price=95.0))
+        self.assertEqual([], index.update(price=100.0))  # strictly above the level
+        self.assertEqual(['up'], index.update(price=100.5))
+        self.assertEqual(['up'], index.get_active())
+        self.assertEqual(['down'], index.update(price=80.0))
+        self.assertEqual(['down'], index.get_active())
+        index.remove(key='down')
+        self.assertEqual([], index.get_active())
+        self.assertEqual(1, len(index))
+        # added beyond its level: active at once
+        index.add(key='up_2', level=50.0, direction=AlarmDirection.UP, payload='up_2')
+        self.assertTrue(index.is_active(key='up_2'))
+
+    def test_matches_full_scan(self):
+        rnd = random.Random(3)
+        index = PriceAlarmIndex()
+        levels = {}
+        price = 1_000.0
+        for step in range(2_000):
+            action = rnd.random()
+            if action < 0.3:
+                key = rnd.randrange(200)
+                level = round(rnd.uniform(900.0, 1_100.0))  # repeated levels on purpose
+                direction = rnd.choice([AlarmDirection.UP, AlarmDirection.DOWN])
+                index.add(key=key, level=level, direction=direction, payload=key)
+                levels[key] = (level, direction)
+            elif action < 0.4 and levels:
+                key = rnd.choice(list(levels.keys()))
+                index.remove(key=key)
+                del levels[key]
+            else:
+                price = round(price + rnd.choice([-20, -5, 0, 5, 20]))
+                index.update(price=price)
+            if index.price is not None:
+                expected = {key for key, (level, direction) in levels.items()
+                            if (price > level if direction == AlarmDirection.UP else price < level)}
+                self.assertEqual(expected, set(index.active.keys()), f'step {step}')
+
+
+class TestStrategyAlarms(unittest.TestCase):
+    def test_orders_beyond_threshold(self):
+        rnd = random.Random(5)
+        pob = PendingOrdersBook(orders=[])
+        sm = StrategyManager(pob=pob, cm=None, bm=None)
+        cmp = 50_000.0
+        for i in range(300):
+            order = Order(session_id='S', order_id='ID', pt_id=f'{i:03}',
+                          k_side=rnd.choice([k_binance.SIDE_BUY, k_binance.SIDE_SELL]),
+                          price=cmp + rnd.uniform(-600.0, 600.0), amount=0.01)
+            order.concentration_count = rnd.choice([0, 0, 1])
+            pob.add_order(order)
+        for _ in range(200):
+            cmp += rnd.choice([-40, -10, 0, 10, 40])
+            sm.update_alarms(cmp=cmp)
+            if rnd.random() < 0.2:
+                # orders leaving the monitor list
+                pob.place_order(order=rnd.choice(pob.monitor))
+            expected = {order.uid for order in pob.monitor
+                        if order.concentration_count == 0 and order.get_distance(cmp=cmp) > K_DISTANCE_FOR_SIDE_BALANCE}
+            self.assertEqual(expected, {o.uid for o in sm.get_orders_beyond(alarm=StrategyAlarm.SIDE_BALANCE)})
+        buy_count = len([o for o in pob.monitor if o.concentration_count == 0 and o.k_side == k_binance.SIDE_BUY])
+        self.assertEqual(buy_count, sm.not_concentrated_count[k_binance.SIDE_BUY])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# test_profiler.py
+
+import os
+import tempfile
+import threading
+import unittest
+
+from src.xb_profiler import SamplingProfiler
+
+
+def busy_function(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(i * i for i in range(1_000))
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=busy_function, args=(self.stop,), name='session-loop', daemon=True)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.stop.set()
+        self.thread.join()
+        self.tmp.cleanup()
+
+    def test_collapsed_stacks(self):
+        profiler = SamplingProfiler(folder=self.tmp.name, interval=0.002)
+        result = profiler.run(seconds=0.3)
+        self.assertGreater(result.samples, 10)
+        # only the sampled threads (not the main one)
+        self.assertTrue(all(stack.startswith('session-loop;') for stack in result.stacks))
+        top_stack, count = result.get_top(n=1)[0]
+        self.assertIn('busy_function (test_profiler.py:', top_stack)
+        with open(result.file_name) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(result.stacks), len(lines))
+        self.assertIn(f'{top_stack} {count}', lines)
+
+    def test_slow_tick_capture(self):
+        profiler = SamplingProfiler(folder=self.tmp.name, slow_tick_ns=50_000_000, auto_seconds=0.1)
+        profiler.on_tick_latency(elapsed_ns=1_000_000)
+        self.assertFalse(profiler.is_running())
+        profiler.on_tick_latency(elapsed_ns=80_000_000)
+        self.assertTrue(profiler.is_running())
+        result = profiler.wait(timeout=5.0)
+        self.assertEqual('slow_tick', result.reason)
+        # once per cooldown
+        profiler.on_tick_latency(elapsed_ns=80_000_000)
+        self.assertFalse(profiler.is_running())
+        self.assertEqual(1, profiler.capture_count)
+
+    def test_failed_capture_has_no_result(self):
+        profiler = SamplingProfiler(folder=self.tmp.name, interval=0.002)
+        self.assertIsNotNone(profiler.run(seconds=0.05))
+        # not writable: the previous capture is not returned as the new one
+        profiler.folder = os.path.join(self.tmp.name, 'file')
+        open(profiler.folder, 'w').close()
+        self.assertIsNone(profiler.run(seconds=0.05))
+        self.assertEqual(1, profiler.capture_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# test_request_weight.py
+
+import unittest
+
+from binance import enums as k_binance
+
+from src.pp_order import Order
+from src.pp_request_weight import RequestWeightTracker, RequestPriority
+from tests.helpers import get_session
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRequestWeightTracker(unittest.TestCase):
+    def test_priorities_and_window(self):
+        clock = FakeClock()
+        tracker = RequestWeightTracker(limit=100, window=60.0, clock=clock)
+        for _ in range(7):
+            tracker.record(endpoint='get_asset_balance', priority=RequestPriority.BALANCE)
+        # 70 used: placements deferred, reads and cancels still allowed
+        self.assertFalse(tracker.can_send(endpoint='place_order', priority=RequestPriority.PLACE))
+        self.assertTrue(tracker.can_send(endpoint='get_avg_price', priority=RequestPriority.BALANCE))
+        self.assertTrue(tracker.can_send(endpoint='cancel_order', priority=RequestPriority.CANCEL))
+        # weight released once out of the window
+        clock.now = 60.0
+        self.assertEqual(0, tracker.get_used())
+        self.assertTrue(tracker.can_send(endpoint='place_order', priority=RequestPriority.PLACE))
+        self.assertEqual(1, tracker.get_stats()['deferred']['place'])
+
+    def test_reported_weight_and_retry_after(self):
+        clock = FakeClock()
+        tracker = RequestWeightTracker(limit=100, clock=clock)
+        # the weight reported by the exchange includes requests from other processes (same ip)
+        tracker.record(endpoint='place_order', priority=RequestPriority.PLACE, used_weight=68)
+        tracker.record(endpoint='place_order', priority=RequestPriority.PLACE)
+        self.assertEqual(69, tracker.get_used())
+        self.assertTrue(tracker.can_send(endpoint='place_order', priority=RequestPriority.PLACE))
+        tracker.record(endpoint='place_order', priority=RequestPriority.PLACE)
+        self.assertFalse(tracker.can_send(endpoint='place_order', priority=RequestPriority.PLACE))
+        # banned after a 429: only cancels
+        clock.now = 61.0
+        tracker.set_retry_after(secs=30.0)
+        self.assertFalse(tracker.can_send(endpoint='get_avg_price', priority=RequestPriority.BALANCE))
+        self.assertTrue(tracker.can_send(endpoint='cancel_order', priority=RequestPriority.CANCEL))
+        clock.now = 91.0
+        self.assertTrue(tracker.can_send(endpoint='get_avg_price', priority=RequestPriority.BALANCE))
+
+
+class TestSessionRequestWeight(unittest.TestCase):
+    def test_placements_deferred_cancels_sent(self):
+        session = get_session()
+        client = session.market.client
+        clock = FakeClock()
+        session.market.request_weight = RequestWeightTracker(limit=10, clock=clock)
+        cmp = client.cmp
+        for i in range(20):
+            session.pob.add_order(Order(session_id=session.session_id, order_id='ID', pt_id=f'{i:03}',
+                                        k_side=k_binance.SIDE_BUY, price=cmp - 40.0 - i, amount=0.0001))
+        client.cmp = cmp - 20.0
+        client._process_cmp_change()
+        # 70% of the limit for placements (the rest of the orders wait in the monitor list)
+        placed_buy = [o for o in session.pob.placed if o.k_side == k_binance.SIDE_BUY]
+        self.assertEqual(7, len(placed_buy))
+        self.assertEqual(7, session.market.request_weight.get_used())
+        # the budget is still there for cancels
+        session.market.cancel_orders(orders=placed_buy[:3])
+        self.assertEqual(10, session.market.request_weight.get_used())
+        # bnb rate read deferred: last value used
+        client_avg_price = session.market.get_cmp(symbol='BNBBTC')
+        self.assertEqual(client_avg_price, session.market.get_cmp(symbol='BNBBTC'))
+
+    def test_deferred_price_read_per_symbol(self):
+        session = get_session()
+        client = session.market.client
+        clock = FakeClock()
+        session.market.request_weight = RequestWeightTracker(limit=10, clock=clock)
+        btceur = session.market.get_cmp(symbol='BTCEUR')
+        self.assertEqual(client.cmp, btceur)
+        while session.market.request_weight.can_send(endpoint='get_avg_price', priority=RequestPriority.BALANCE):
+            session.market.request_weight.record(endpoint='get_avg_price', priority=RequestPriority.BALANCE)
+        # nothing cached for BNBBTC: read anyway, never the BTCEUR price
+        bnbbtc = session.market.get_cmp(symbol='BNBBTC')
+        self.assertAlmostEqual(float(client.get_avg_price(symbol='BNBBTC')['price']), bnbbtc)
+        self.assertNotEqual(btceur, bnbbtc)
+        # deferred reads: last price of each symbol
+        client.cmp = btceur + 100.0
+        self.assertEqual(btceur, session.market.get_cmp(symbol='BTCEUR'))
+        self.assertEqual(bnbbtc, session.market.get_cmp(symbol='BNBBTC'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# test_session_loop.py
+
+import threading
+import unittest
+
+from src.pp_session_loop import SessionLoop
+from tests.helpers import quiet, run_prices, run_session
+
+
+class TestSessionLoop(unittest.TestCase):
+    def setUp(self) -> None:
+        self.executed = []
+        self.after_count = 0
+
+    def after_command(self) -> None:
+        self.after_count += 1
+
+    def test_inline_commands_are_not_reentrant(self):
+        loop = SessionLoop(after_command=self.after_command)
+
+        def first():
+            self.executed.append('first-start')
+            # submitted while running: executed after first() ends, not in the middle
+            loop.submit(self.executed.append, 'second')
+            self.executed.append('first-end')
+
+        loop.submit(first)
+        self.assertEqual(['first-start', 'first-end', 'second'], self.executed)
+        self.assertEqual(2, self.after_count)
+
+    def test_inline_call_returns_result(self):
+        loop = SessionLoop()
+        self.assertEqual(5, loop.call(lambda a, b: a + b, 2, b=3))
+
+    def test_read_is_not_a_state_change(self):
+        loop = SessionLoop(after_command=self.after_command)
+        loop.call(self.executed.append, 'write')
+        self.assertEqual(3, loop.read(lambda: 3))
+        self.assertEqual(1, self.after_count)
+
+    def test_threaded_commands_run_in_loop_thread(self):
+        loop = SessionLoop()
+        loop.start()
+        threads = []
+        for _ in range(3):
+            loop.submit(lambda: threads.append(threading.current_thread().name))
+        # call waits for the previous commands since the queue is FIFO
+        self.assertTrue(loop.call(loop.is_loop_thread))
+        loop.stop()
+        self.assertEqual(['session-loop'] * 3, threads)
+
+    def test_threaded_call_raises_command_error(self):
+        loop = SessionLoop()
+        loop.start()
+        with self.assertRaises(ZeroDivisionError):
+            loop.call(lambda: 1 / 0)
+        # the loop keeps running after an error
+        self.assertEqual(2, loop.call(lambda: 2))
+        loop.stop()
+
+
+class TestSessionSnapshot(unittest.TestCase):
+    def test_snapshot_reused_until_state_changes(self):
+        session = run_session(prices=[45_010.0])
+        snapshot = session.get_snapshot()
+        # building a snapshot is not a state change
+        self.assertIs(snapshot, session.get_snapshot())
+        with quiet():
+            run_prices(session=session, prices=[45_020.0])
+        new_snapshot = session.get_snapshot()
+        self.assertIsNot(snapshot, new_snapshot)
+        self.assertEqual(45_020.0, new_snapshot.last_cmp)
+
+    def test_limit_stats_read_in_loop(self):
+        session = run_session(prices=[45_010.0])
+        threads = []
+        get_stats = session.market.request_weight.get_stats
+        session.market.request_weight.get_stats = lambda: threads.append(threading.current_thread().name) or get_stats()
+        session.loop.start()
+        try:
+            stats = session.get_limit_stats()
+        finally:
+            session.loop.stop()
+        self.assertEqual(['session-loop'], threads)
+        self.assertEqual({'placement', 'request_weight'}, set(stats))
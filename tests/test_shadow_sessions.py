@@ -0,0 +1,56 @@
+# test_shadow_sessions.py
+
+import unittest
+
+from src.pp_grid_screener import get_random_walk
+from src.pp_session import SessionConfig
+from src.pp_shadow_sessions import ShadowSessions
+from tests.helpers import get_session, quiet, remove_rate_limits, run_prices
+
+
+class TestShadowSessions(unittest.TestCase):
+    def test_shadows_follow_live_stream(self):
+        with quiet():
+            session = get_session()
+            shadows = ShadowSessions(session=session, configs=dict(
+                same=SessionConfig(),
+                small=SessionConfig(s1_qty=0.01, inactivity_cycles=60)))
+            for s in [session] + list(shadows.shadows.values()):
+                remove_rate_limits(session=s)
+            run_prices(session=session, prices=get_random_walk(start=45_000.0, steps=3_000, seed=6))
+            report = shadows.get_report()
+            table = shadows.get_report_table()
+            shadows.stop()
+
+        self.assertEqual(['live', 'same', 'small'], list(report.keys()))
+        self.assertTrue(report['same']['session_id'].endswith('_same'))
+        # same config, same prices: same results as the live session
+        live = dict(report['live'], session_id=None)
+        self.assertEqual(live, dict(report['same'], session_id=None))
+        self.assertEqual(3_000, report['small']['ticks'])
+        self.assertNotEqual(live['pt_created'], report['small']['pt_created'])
+        self.assertIn('completed_value', table)
+
+    def test_failing_shadow_does_not_stop_live_stream(self):
+        with quiet():
+            session = get_session()
+            session.market.add_tick_listener(lambda tick: 1 / 0)
+            run_prices(session=session, prices=[45_000.0, 45_010.0])
+        self.assertEqual(2, session.ticker_count)
+
+    def test_stopped_shadow_gets_no_more_ticks(self):
+        with quiet():
+            session = get_session()
+            shadows = ShadowSessions(session=session, configs=dict(same=SessionConfig()))
+            run_prices(session=session, prices=[45_000.0, 45_010.0, 45_020.0])
+            shadows.stop()
+            shadow = shadows.shadows['same']
+            snapshot = shadow.get_snapshot()
+            run_prices(session=session, prices=[45_030.0, 45_040.0, 45_050.0, 45_060.0])
+        self.assertEqual(3, snapshot.ticker_count)
+        self.assertIs(snapshot, shadow.get_snapshot())
+        self.assertEqual(7, session.ticker_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
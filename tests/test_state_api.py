@@ -0,0 +1,77 @@
+# test_state_api.py
+
+import gzip
+import json
+import threading
+import unittest
+
+from flask import Flask
+
+from src.dashboards import api
+from tests.helpers import quiet, run_prices, run_session
+
+
+class TestStateApi(unittest.TestCase):
+    def setUp(self) -> None:
+        self.session = run_session(prices=[45_010.0])
+        server = Flask(__name__)
+        api.register_routes(server=server, session=self.session, state_ttl=0.0)
+        self.client = server.test_client()
+
+    def test_state(self):
+        response = self.client.get('/api/state')
+        self.assertEqual(200, response.status_code)
+        state = json.loads(response.data)
+        self.assertEqual(self.session.session_id, state['session_id'])
+        self.assertEqual(1, state['session']['ticker_count'])
+        # first pt: one buy & one sell in the monitor
+        self.assertEqual(1, state['pending']['BUY']['count'])
+        self.assertEqual(1, state['pending']['SELL']['count'])
+        self.assertIn('tick.total', [stage['stage'] for stage in state['metrics']])
+        self.assertIn('used', state['request_weight'])
+        self.assertIn('available', state['placement'])
+
+    def test_limit_stats_read_in_loop(self):
+        # not read-only (expired entries, token refill): never called from the request thread
+        threads = []
+        get_stats = self.session.placement_queue.get_stats
+        self.session.placement_queue.get_stats = \
+            lambda: threads.append(threading.current_thread().name) or get_stats()
+        self.session.loop.start()
+        try:
+            self.assertEqual(200, self.client.get('/api/state').status_code)
+            self.assertEqual(200, self.client.get('/api/metrics').status_code)
+        finally:
+            self.session.loop.stop()
+        self.assertEqual(['session-loop'] * 2, threads)
+
+    def test_etag_and_compression(self):
+        response = self.client.get('/api/state', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        etag = response.headers['ETag']
+        state = json.loads(gzip.decompress(response.data))
+
+        # unchanged: not sent again
+        response = self.client.get('/api/state', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.data)
+
+        with quiet():
+            run_prices(session=self.session, prices=[45_020.0])
+        response = self.client.get('/api/state', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+        self.assertEqual(state['session']['ticker_count'] + 1, json.loads(response.data)['session']['ticker_count'])
+
+    def test_prometheus_metrics(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        lines = response.data.decode().splitlines()
+        self.assertIn('pp_ticks_processed_total 1', lines)
+        self.assertIn('pp_pending_orders{list="monitor"} 2', lines)
+        self.assertIn('# TYPE pp_stage_latency_seconds histogram', lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
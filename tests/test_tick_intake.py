@@ -0,0 +1,62 @@
+# test_tick_intake.py
+
+import threading
+import time
+import unittest
+
+from src.pp_tick_intake import TickIntake, TickIntakeMode
+
+
+class TestTickIntake(unittest.TestCase):
+    def setUp(self) -> None:
+        self.processed = []
+        self.release = threading.Event()
+        self.first_started = threading.Event()
+
+    def slow_callback(self, cmp: float) -> None:
+        # first tick blocks until released, simulating a slow placement
+        self.first_started.set()
+        if not self.processed:
+            self.release.wait(timeout=2.0)
+        self.processed.append(cmp)
+
+    def _wait_for(self, count: int) -> None:
+        deadline = time.time() + 2.0
+        while len(self.processed) < count and time.time() < deadline:
+            time.sleep(0.005)
+
+    def test_push_synchronous_when_not_started(self):
+        intake = TickIntake(callback=self.processed.append)
+        intake.push(50_000.0)
+        intake.push(50_010.0)
+        self.assertEqual([50_000.0, 50_010.0], self.processed)
+        self.assertEqual(2, intake.processed_count)
+
+    def test_latest_only_merges_burst(self):
+        intake = TickIntake(callback=self.slow_callback, mode=TickIntakeMode.LATEST_ONLY)
+        intake.start()
+        intake.push(1.0)
+        self.first_started.wait(timeout=2.0)
+        # burst received while the first tick is being processed
+        for cmp in [2.0, 3.0, 4.0, 5.0]:
+            intake.push(cmp)
+        self.release.set()
+        self._wait_for(2)
+        intake.stop()
+        self.assertEqual([1.0, 5.0], self.processed)
+        self.assertEqual(3, intake.merged_count)
+        self.assertEqual(0, intake.dropped_count)
+
+    def test_every_tick_drops_oldest_when_full(self):
+        intake = TickIntake(callback=self.slow_callback, mode=TickIntakeMode.EVERY_TICK, max_queued=2)
+        intake.start()
+        intake.push(1.0)
+        self.first_started.wait(timeout=2.0)
+        for cmp in [2.0, 3.0, 4.0]:
+            intake.push(cmp)
+        self.release.set()
+        self._wait_for(3)
+        intake.stop()
+        self.assertEqual([1.0, 3.0, 4.0], self.processed)
+        self.assertEqual(1, intake.dropped_count)
+        self.assertEqual(0, intake.merged_count)
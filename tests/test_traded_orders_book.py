@@ -0,0 +1,87 @@
+# test_traded_orders_book.py
+
+import unittest
+from binance import enums as k_binance
+
+from src.pp_order import Order
+from src.pp_traded_orders_book import TradedOrdersBook
+from src.pp_traded_orders_archive import TradedOrdersArchive
+from tests.helpers import get_session, quiet
+
+
+def get_order(pt_id: str, k_side: str, price: float) -> Order:
+    return Order(
+        session_id='S_TEST',
+        order_id='OR_TEST',
+        pt_id=pt_id,
+        k_side=k_side,
+        price=price,
+        amount=0.01
+    )
+
+
+class TestTradedOrdersBook(unittest.TestCase):
+    def setUp(self) -> None:
+        self.archive = TradedOrdersArchive(file_name=':memory:')
+        self.tob = TradedOrdersBook(archive=self.archive, max_completed_orders=4, max_completed_age=60.0)
+
+    def tearDown(self) -> None:
+        self.archive.close()
+
+    def complete_pt(self, pt_id: str) -> None:
+        self.tob.add_pending(get_order(pt_id=pt_id, k_side=k_binance.SIDE_BUY, price=50_000.0))
+        self.tob.add_completed(get_order(pt_id=pt_id, k_side=k_binance.SIDE_SELL, price=50_100.0))
+
+    def test_add_completed_moves_pending_orders_of_pt(self):
+        self.tob.add_pending(get_order(pt_id='002', k_side=k_binance.SIDE_BUY, price=49_000.0))
+        self.complete_pt(pt_id='001')
+        self.assertEqual(2, len(self.tob.completed))
+        self.assertEqual(['002'], [o.pt_id for o in self.tob.pending])
+        self.assertEqual(['001'], self.tob.completed_pt_id)
+        summary = self.tob.completed_summary.to_dict()
+        self.assertEqual(1, summary['pt_count'])
+        self.assertAlmostEqual(1.0, summary['eur_balance'])
+        self.assertAlmostEqual(0.0, summary['btc_balance'])
+
+    def test_archive_by_count(self):
+        for i in range(3):
+            self.complete_pt(pt_id=f'{i:03}')
+        # 6 orders in 3 pt, limit 4: the oldest pt is archived
+        self.assertEqual(['001', '002'], self.tob.completed_pt_id)
+        self.assertEqual(4, len(self.tob.completed))
+        self.assertEqual(2, self.archive.count(session_id='S_TEST'))
+        self.assertEqual({'000'}, {d['pt_id'] for d in self.tob.get_archived_orders(session_id='S_TEST')})
+        # the summary keeps the archived pt
+        self.assertEqual(3, self.tob.completed_summary.pt_count)
+        self.assertAlmostEqual(3.0, self.tob.completed_summary.eur_balance)
+
+    def test_archive_by_age(self):
+        self.complete_pt(pt_id='001')
+        self.assertEqual(0, self.tob.archive_completed())
+        completion_time, _ = self.tob._completed_pt_info[0]
+        self.assertEqual(2, self.tob.archive_completed(now=completion_time + 61.0))
+        self.assertEqual([], self.tob.completed)
+        self.assertEqual([], self.tob.completed_pt_id)
+        records = self.tob.get_archived_orders(limit=1)
+        self.assertEqual(1, len(records))
+        self.assertEqual('SELL', records[0]['k_side'])
+
+    def test_no_archive(self):
+        tob = TradedOrdersBook(max_completed_orders=0)
+        tob.add_completed(get_order(pt_id='001', k_side=k_binance.SIDE_SELL, price=50_100.0))
+        self.assertEqual(1, len(tob.completed))
+        self.assertEqual([], tob.get_archived_orders())
+
+
+class TestSessionArchive(unittest.TestCase):
+    def test_archive_file_and_unique_session_id(self):
+        with quiet():
+            sessions = [get_session(), get_session(archive_file=':memory:'), get_session()]
+        self.assertIsNone(sessions[0].tob.archive)
+        self.assertEqual(':memory:', sessions[1].tob.archive.file_name)
+        # started in the same second: still one id each
+        self.assertEqual(3, len({session.session_id for session in sessions}))
+
+
+if __name__ == '__main__':
+    unittest.main()